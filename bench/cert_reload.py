@@ -0,0 +1,123 @@
+"""证书热更新基准: 替换服务器的证书和私钥文件，测量新握手换用新证书的耗时，
+并确认替换期间新握手没有失败、替换前建立的连接仍能收发数据
+
+signal模式写入新文件后发送SIGHUP，poll模式等待服务器按CERT_RELOAD_INTERVAL检查到文件变化。
+新证书未生效、出现握手失败或旧连接中断时返回非零
+
+用法: python bench/cert_reload.py --mode signal
+      python bench/cert_reload.py --mode poll --interval 1
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, client_ssl_context, generate_cert, percentile
+from cryptography.fernet import Fernet
+from utils.framing import FRAME_DATA, FRAME_HELLO, HEADER_SIZE, pack_frame, unpack_header
+
+def recv_exactly(sock, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+def read_frame(sock):
+    frame_type, length = unpack_header(recv_exactly(sock, HEADER_SIZE))
+    return frame_type, recv_exactly(sock, length)
+
+def open_tunnel(port: int, context):
+    """完成TLS和HELLO握手，返回(套接字, 服务器证书DER, 握手耗时秒)"""
+    started = time.perf_counter()
+    sock = context.wrap_socket(socket.create_connection(('127.0.0.1', port), timeout=5))
+    sock.sendall(pack_frame(FRAME_HELLO, b"CYS" + os.urandom(32)))
+    read_frame(sock)
+    return sock, sock.getpeercert(binary_form=True), time.perf_counter() - started
+
+def exchange(sock, cipher: Fernet) -> bool:
+    """发送一个数据帧并等待响应"""
+    try:
+        sock.sendall(pack_frame(FRAME_DATA, cipher.encrypt(b'ping')))
+        while True:
+            frame_type, payload = read_frame(sock)
+            if frame_type == FRAME_DATA:
+                return cipher.decrypt(payload) != b''
+    except (OSError, ConnectionError):
+        return False
+
+def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    cipher = Fernet(key_material)
+    context = client_ssl_context()
+    handshakes = []
+    failures = 0
+    with ServerProcess(workdir, key_material, cert_reload_interval=args.interval) as server:
+        old_sock, old_cert, elapsed = open_tunnel(server.port, context)
+        handshakes.append(elapsed)
+        old_alive_before = exchange(old_sock, cipher)
+
+        # 重写证书和私钥（非原子，两次写入之间的检查会看到不匹配的一对文件）
+        rotated = time.perf_counter()
+        generate_cert(workdir)
+        if args.mode == 'signal':
+            os.kill(server.proc.pid, signal.SIGHUP)
+        swap_seconds = None
+        deadline = rotated + args.timeout
+        while time.perf_counter() < deadline:
+            try:
+                sock, cert, elapsed = open_tunnel(server.port, context)
+            except (OSError, ConnectionError):
+                failures += 1
+                continue
+            handshakes.append(elapsed)
+            sock.close()
+            if cert != old_cert:
+                swap_seconds = time.perf_counter() - rotated
+                break
+            time.sleep(args.probe_interval)
+        old_alive_after = exchange(old_sock, cipher)
+        old_sock.close()
+    handshakes.sort()
+    report = {
+        'mode': args.mode,
+        'swapped': swap_seconds is not None,
+        'swap_seconds': swap_seconds,
+        'failed_handshakes': failures,
+        'old_connection_alive': old_alive_before and old_alive_after,
+        'handshake_ms': {
+            'count': len(handshakes),
+            'p50': percentile(handshakes, 0.50) * 1000,
+            'max': handshakes[-1] * 1000
+        },
+        'params': vars(args)
+    }
+    report['ok'] = report['swapped'] and not failures and report['old_connection_alive']
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('signal', 'poll'), default='signal')
+    parser.add_argument('--interval', type=float, help='服务器检查证书文件的间隔(秒)，默认signal模式为0（只响应SIGHUP），poll模式为1')
+    parser.add_argument('--probe-interval', type=float, default=0.02, help='探测新握手的间隔(秒)')
+    parser.add_argument('--timeout', type=float, default=10.0, help='等待新证书生效的时间(秒)')
+    args = parser.parse_args()
+    if args.interval is None:
+        args.interval = 0 if args.mode == 'signal' else 1.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args, Path(tmp))
+    print(json.dumps(report, indent=2))
+    return 0 if report['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""基准测试公共工具: 临时证书、回环服务器子进程、进程资源采样、延迟代理"""
+import asyncio
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER_DIR = ROOT / 'server'
+CLIENT_DIR = ROOT / 'client'
+
+if str(SERVER_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVER_DIR))
+
+SERVER_CODE = """
+import asyncio, sys
+sys.path.insert(0, {server_dir!r})
+from main import CysteriaServer
+server = CysteriaServer('127.0.0.1', {port}, certfile={cert!r}, keyfile={key!r},
+                        encryption_key={key_material!r}, **{options!r})
+
+async def main():
+{setup}
+    await server.start()
+
+asyncio.run(main())
+"""
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+def server_env(workdir: Path) -> dict:
+    """服务器子进程的环境变量: 日志、错误日志和分析结果写入临时目录，不留在源码树中"""
+    log_dir = Path(workdir) / 'logs'
+    log_dir.mkdir(exist_ok=True)
+    return dict(os.environ, LOG_DIR=str(log_dir))
+
+def generate_cert(directory: Path):
+    """生成临时自签名证书"""
+    from datetime import datetime, timedelta
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.utcnow()
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(minutes=1))
+            .not_valid_after(now + timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    cert_file = directory / 'cert.pem'
+    key_file = directory / 'key.pem'
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()
+    ))
+    return cert_file, key_file
+
+def free_port(kind: int = socket.SOCK_STREAM) -> int:
+    """获取一个空闲的回环端口"""
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def client_ssl_context() -> ssl.SSLContext:
+    """不校验证书的客户端SSL上下文"""
+    ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+def wait_for_port(port: int, timeout: float = 10.0, interval: float = 0.05) -> bool:
+    """等待端口开始监听，每interval秒尝试连接一次"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(interval)
+    return False
+
+def process_stats(pid: Optional[int] = None) -> dict:
+    """读取/proc中的CPU时间(秒)、常驻内存和常驻内存峰值(字节)"""
+    pid = pid or os.getpid()
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss = peak = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                peak = int(line.split()[1]) * 1024
+            elif line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) * 1024
+                break
+    return {'cpu_seconds': cpu, 'rss_bytes': rss, 'peak_rss_bytes': peak}
+
+def percentile(sorted_values: list, q: float) -> float:
+    """在已排序的数据上取百分位"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class ServerProcess:
+    """在子进程中运行CysteriaServer
+
+    setup为服务器启动前在事件循环中执行的代码（缩进4格），可访问变量server，用于向服务器注入故障；
+    server_dir指向另一份代码（如旧版本的git worktree）中的server目录时运行那个版本
+    """
+    def __init__(self, workdir: Path, key_material: bytes, port: Optional[int] = None,
+                 setup: str = '    pass', server_dir: Optional[Path] = None, **options):
+        self.workdir = Path(workdir)
+        self.server_dir = Path(server_dir) if server_dir else SERVER_DIR
+        self.key_material = key_material
+        self.port = port or free_port()
+        self.setup = setup
+        self.options = options
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self) -> 'ServerProcess':
+        cert = self.workdir / 'cert.pem'
+        key = self.workdir / 'key.pem'
+        if not cert.exists():
+            cert, key = generate_cert(self.workdir)
+        code = SERVER_CODE.format(server_dir=str(self.server_dir), port=self.port, cert=str(cert),
+                                  key=str(key), key_material=self.key_material, options=self.options,
+                                  setup=self.setup)
+        self.proc = subprocess.Popen([sys.executable, '-c', code], cwd=self.workdir, env=server_env(self.workdir),
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not wait_for_port(self.port):
+            self.stop()
+            raise RuntimeError("server did not start")
+        return self
+
+    def stats(self) -> dict:
+        return process_stats(self.proc.pid)
+
+    def kill(self):
+        """模拟服务器崩溃"""
+        if self.proc and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class DelayProxy:
+    """给每条连接加入固定延迟和在途字节上限的TCP代理
+
+    queue_limit限制代理两个方向接收的套接字缓冲，模拟上下行瓶颈处的有限队列；默认使用系统自动调整的缓冲
+    """
+    def __init__(self, target_port: int, delay: float, window: int, queue_limit: Optional[int] = None):
+        self.target_port = target_port
+        self.delay = delay
+        self.window = window
+        self.queue_limit = queue_limit
+        self.port = free_port()
+        self.server = None
+
+    async def start(self):
+        if self.queue_limit:
+            self.server = await asyncio.start_server(self._handle, '127.0.0.1', self.port,
+                                                     limit=self.queue_limit)
+        else:
+            self.server = await asyncio.start_server(self._handle, '127.0.0.1', self.port)
+
+    async def _pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        in_transit = 0
+        released = asyncio.Event()
+
+        def deliver(data: bytes):
+            if not writer.is_closing():
+                writer.write(data)
+
+        def ack(size: int):
+            nonlocal in_transit
+            in_transit -= size
+            released.set()
+
+        while True:
+            data = await reader.read(16384)
+            if not data:
+                break
+            while in_transit >= self.window:
+                released.clear()
+                await released.wait()
+            in_transit += len(data)
+            loop.call_later(self.delay, deliver, data)
+            loop.call_later(self.delay * 2, ack, len(data))
+        loop.call_later(self.delay, writer.close)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.queue_limit:
+            writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.queue_limit)
+        try:
+            if self.queue_limit:
+                up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port,
+                                                                     limit=self.queue_limit)
+                up_writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                                              self.queue_limit)
+            else:
+                up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+            await asyncio.gather(self._pump(reader, up_writer), self._pump(up_reader, writer),
+                                 return_exceptions=True)
+        except asyncio.CancelledError:
+            # 事件循环关闭时取消，无需报告
+            writer.close()
+
+    def close(self):
+        self.server.close()
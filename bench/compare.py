@@ -0,0 +1,45 @@
+"""比较两次基准测试的JSON结果，输出各项数值指标的变化百分比
+
+用法: python bench/compare.py before.json after.json
+"""
+import argparse
+import json
+from pathlib import Path
+
+def flatten(report: dict, prefix: str = '') -> dict:
+    """把嵌套的报告展开为 a.b.c -> 数值"""
+    values = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+def compare(before: dict, after: dict) -> dict:
+    """返回每个共同指标的(旧值, 新值, 变化百分比)"""
+    old, new = flatten(before), flatten(after)
+    rows = {}
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] * 100 if old[name] else 0.0
+        rows[name] = {'before': old[name], 'after': new[name], 'change_percent': change}
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = parser.parse_args()
+
+    rows = compare(json.loads(Path(args.before).read_text()), json.loads(Path(args.after).read_text()))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    width = max((len(name) for name in rows), default=10)
+    for name, row in rows.items():
+        print(f"{name:<{width}}  {row['before']:>14.3f}  {row['after']:>14.3f}  {row['change_percent']:>+8.1f}%")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""有丢包链路上的有效吞吐对比: TLS/TCP隧道 vs UDP数据报隧道
+
+UDP中继按概率丢弃数据报；TCP代理无法真正丢字节，改为按同样的概率给数据块
+加上一个重传超时(RTO)，并保持按序交付，从而模拟丢包重传造成的队头阻塞。
+客户端以固定速率发送帧，统计测试时间内收到的响应数。
+
+用法: python bench/datagram_loss.py --loss 0 0.01 0.05 --rate 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, ServerProcess, free_port, percentile
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+from datagram import DatagramTunnel
+
+class LossyUdpRelay(asyncio.DatagramProtocol):
+    """在单个客户端和服务器之间转发数据报，按概率丢包并加入单向延迟"""
+    def __init__(self, target_port: int, loss: float, delay: float):
+        self.target = ('127.0.0.1', target_port)
+        self.loss = loss
+        self.delay = delay
+        self.port = free_port(socket.SOCK_DGRAM)
+        self.client_addr = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if random.random() < self.loss:
+            return
+        destination = self.client_addr if addr == self.target else self.target
+        if addr != self.target:
+            self.client_addr = addr
+        if destination is not None:
+            asyncio.get_running_loop().call_later(self.delay, self._forward, data, destination)
+
+    def _forward(self, data: bytes, destination):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, destination)
+
+class LossyTcpProxy:
+    """按序交付的TCP代理，丢包表现为数据块额外延迟一个RTO"""
+    def __init__(self, target_port: int, loss: float, delay: float, rto: float):
+        self.target_port = target_port
+        self.loss = loss
+        self.delay = delay
+        self.rto = rto
+        self.port = free_port()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', self.port)
+
+    async def _deliver(self, queue: asyncio.Queue, writer):
+        """按入队顺序在各自的交付时间写出数据块"""
+        loop = asyncio.get_running_loop()
+        while True:
+            deliver_at, data = await queue.get()
+            if data is None:
+                break
+            delay = deliver_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if writer.is_closing():
+                break
+            writer.write(data)
+        writer.close()
+
+    async def _pump(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        delivery = asyncio.create_task(self._deliver(queue, writer))
+        last_delivery = 0.0
+        try:
+            while True:
+                data = await reader.read(1400)
+                if not data:
+                    break
+                deliver_at = loop.time() + self.delay
+                if random.random() < self.loss:
+                    deliver_at += self.rto
+                # 按序交付：后面的数据块不能越过被“重传”的数据块
+                last_delivery = max(last_delivery, deliver_at)
+                queue.put_nowait((last_delivery, data))
+        finally:
+            queue.put_nowait((last_delivery, None))
+            await delivery
+
+    async def _handle(self, reader, writer):
+        try:
+            up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+            await asyncio.gather(self._pump(reader, up_writer), self._pump(up_reader, writer),
+                                 return_exceptions=True)
+        except asyncio.CancelledError:
+            writer.close()
+
+    def close(self):
+        self.server.close()
+
+async def offered_load(send, rate: float, duration: float) -> int:
+    """按固定速率发送，返回发送的帧数"""
+    payload = os.urandom(1024)
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - started < duration:
+        await send(payload)
+        sent += 1
+        delay = started + sent * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return sent
+
+async def run_tcp(port: int, key: str, loss: float, args) -> dict:
+    proxy = LossyTcpProxy(port, loss, args.delay_ms / 1000, args.rto_ms / 1000)
+    await proxy.start()
+    send_times = []
+    latencies = []
+
+    def on_data(data):
+        latencies.append((time.perf_counter() - send_times[len(latencies)]) * 1000)
+
+    client = TunnelClient('127.0.0.1', proxy.port, key, on_data=on_data)
+    reader, writer = await client.connect()
+    serve = asyncio.create_task(client.serve(reader, writer))
+
+    async def send(payload):
+        send_times.append(time.perf_counter())
+        await client.send(payload)
+
+    try:
+        sent = await offered_load(send, args.rate, args.duration)
+    finally:
+        # 直接中断连接，不等待经过丢包代理的TLS关闭握手
+        writer.transport.abort()
+        await serve
+        proxy.close()
+    latencies.sort()
+    return {
+        'sent': sent,
+        'delivered': len(latencies),
+        'goodput_frames_per_sec': len(latencies) / args.duration,
+        'latency_ms': {'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99)}
+    }
+
+async def run_udp(port: int, key: str, loss: float, args) -> dict:
+    loop = asyncio.get_running_loop()
+    relay = LossyUdpRelay(port, loss, args.delay_ms / 1000)
+    relay_transport, _ = await loop.create_datagram_endpoint(lambda: relay, local_addr=('127.0.0.1', relay.port))
+    received = 0
+
+    def on_data(data):
+        nonlocal received
+        received += 1
+
+    client = TunnelClient('127.0.0.1', relay.port, key, on_data=on_data)
+    tunnel = DatagramTunnel(client)
+    await tunnel.open()
+
+    async def send(payload):
+        tunnel.send(payload)
+
+    try:
+        sent = await offered_load(send, args.rate, args.duration)
+    finally:
+        tunnel.stop()
+        relay_transport.close()
+    return {
+        'sent': sent,
+        'delivered': received,
+        'goodput_frames_per_sec': received / args.duration
+    }
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    results = []
+    with ServerProcess(workdir, key_material) as server:
+        for loss in args.loss:
+            results.append({
+                'loss': loss,
+                'tcp': await run_tcp(server.port, key_material.decode(), loss, args),
+                'udp': await run_udp(server.port, key_material.decode(), loss, args)
+            })
+    return {'rate': args.rate, 'delay_ms': args.delay_ms, 'rto_ms': args.rto_ms, 'results': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.01, 0.05])
+    parser.add_argument('--rate', type=float, default=500, help='每秒发送帧数')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--delay-ms', type=float, default=10)
+    parser.add_argument('--rto-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
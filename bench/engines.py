@@ -0,0 +1,29 @@
+"""对比stream引擎与protocol引擎在回环地址上的吞吐量和延迟
+
+用法: python bench/engines.py --clients 50 --size 4096 --duration 10
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import loadgen
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--rate', type=float, default=0)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    results = {
+        engine: loadgen.run(args.clients, args.size, args.rate, args.duration, engine=engine)
+        for engine in ('stream', 'protocol')
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
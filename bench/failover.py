@@ -0,0 +1,99 @@
+"""断线恢复基准: 杀掉回环服务器或重置连接，测量客户端恢复到可用所需的时间
+
+场景:
+  restart   杀掉服务器并在 --restart-delay 秒后重启，客户端按退避策略重连
+  standby   杀掉主服务器，客户端提升预热在另一台服务器上的备用连接
+  reset     只重置当前连接，客户端提升同一服务器上的备用连接
+
+用法: python bench/failover.py --scenario standby
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, ServerProcess
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import Backoff, ReconnectSupervisor, TunnelClient
+
+async def wait_until(predicate, timeout: float = 10.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("condition not reached")
+        await asyncio.sleep(0.01)
+
+async def probe_until_ok(client: TunnelClient, responses: asyncio.Queue, since: float) -> float:
+    """持续发送探测帧，返回从since到收到第一个响应的毫秒数"""
+    while True:
+        try:
+            while not responses.empty():
+                responses.get_nowait()
+            await client.send(b'probe')
+            await asyncio.wait_for(responses.get(), 0.05)
+            return (time.perf_counter() - since) * 1000
+        except Exception:
+            await asyncio.sleep(0.005)
+
+async def run_scenario(scenario: str, restart_delay: float, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    primary = ServerProcess(workdir, key_material).start()
+    secondary = ServerProcess(workdir, key_material).start() if scenario == 'standby' else None
+    responses = asyncio.Queue()
+    client = TunnelClient('127.0.0.1', primary.port, key_material.decode(),
+                          on_data=responses.put_nowait)
+    supervisor = ReconnectSupervisor(
+        client,
+        backoff=Backoff(base=0.05, cap=1.0),
+        standby=scenario != 'restart',
+        standby_target=('127.0.0.1', secondary.port) if secondary else None
+    )
+    task = asyncio.create_task(supervisor.run())
+    try:
+        await wait_until(lambda: client.writer is not None and not client.writer.is_closing())
+        if scenario != 'restart':
+            await wait_until(lambda: supervisor._standby is not None)
+        await probe_until_ok(client, responses, time.perf_counter())
+
+        failed_at = time.perf_counter()
+        if scenario == 'reset':
+            client.writer.transport.abort()
+        else:
+            primary.kill()
+            if scenario == 'restart':
+                await asyncio.sleep(restart_delay)
+                primary.start()
+        recovery_ms = await probe_until_ok(client, responses, failed_at)
+        return {
+            'scenario': scenario,
+            'recovery_ms': recovery_ms,
+            'supervisor_failover_ms': supervisor.last_failover_ms,
+            'restart_delay_ms': restart_delay * 1000 if scenario == 'restart' else 0
+        }
+    finally:
+        supervisor.stop()
+        await asyncio.wait_for(task, 5)
+        primary.stop()
+        if secondary:
+            secondary.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=('restart', 'standby', 'reset'), default='standby')
+    parser.add_argument('--restart-delay', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run_scenario(args.scenario, args.restart_delay, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
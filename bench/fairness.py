@@ -0,0 +1,78 @@
+"""公平调度基准: 几个不限速的大帧客户端与一组低速交互客户端同时运行，
+比较服务器不限速和开启每客户端限速时交互客户端的延迟
+
+用法: python bench/fairness.py --heavy 4 --heavy-size 65536 --interactive 20 --rate 20 --limit-fps 50 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, percentile
+from cryptography.fernet import Fernet
+from loadgen import simulated_client
+
+async def mixed_load(port: int, key_material: bytes, args) -> dict:
+    """同时运行大帧客户端和交互客户端，分别统计"""
+    cipher = Fernet(key_material)
+    deadline = time.perf_counter() + args.duration
+    groups = {
+        'heavy': (args.heavy, args.heavy_size, 0),
+        'interactive': (args.interactive, args.size, args.rate)
+    }
+    results = {name: ([], {'bytes': 0, 'errors': 0, 'connect_errors': 0}) for name in groups}
+    await asyncio.gather(*(
+        simulated_client(port, cipher, size, rate, deadline, *results[name])
+        for name, (count, size, rate) in groups.items()
+        for _ in range(count)
+    ))
+    report = {}
+    for name, (latencies, counters) in results.items():
+        latencies.sort()
+        report[name] = {
+            'frames': len(latencies),
+            'mbytes_per_sec': counters['bytes'] / args.duration / 1e6,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else 0.0
+            },
+            'errors': counters['errors'] + counters['connect_errors']
+        }
+    return report
+
+def run(args) -> dict:
+    key_material = Fernet.generate_key()
+    scenarios = {
+        'unlimited': {},
+        'limited': {'rate_limits': {'client_frames_rate': args.limit_fps,
+                                    'client_bytes_rate': args.limit_bps}}
+    }
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in scenarios.items():
+            with ServerProcess(Path(tmp), key_material, **options) as server:
+                report[label] = asyncio.run(mixed_load(server.port, key_material, args))
+    report['params'] = vars(args)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--heavy', type=int, default=4, help='不限速的大帧客户端数')
+    parser.add_argument('--heavy-size', type=int, default=65536, help='大帧负载大小(字节)')
+    parser.add_argument('--interactive', type=int, default=20, help='交互客户端数')
+    parser.add_argument('--size', type=int, default=256, help='交互帧负载大小(字节)')
+    parser.add_argument('--rate', type=float, default=20, help='交互客户端每秒发送帧数')
+    parser.add_argument('--limit-fps', type=float, default=50, help='限速场景中每客户端的帧/秒上限')
+    parser.add_argument('--limit-bps', type=float, default=0, help='限速场景中每客户端的字节/秒上限，0为不限制')
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+if __name__ == '__main__':
+    main()
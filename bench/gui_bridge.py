@@ -0,0 +1,165 @@
+"""界面日志基准: 后台线程高速产生日志时，比较逐条Qt信号追加到QTextEdit和LogBridge批量刷新到有界QPlainTextEdit
+
+在Qt的offscreen平台上运行，不需要显示器。界面线程上每10毫秒的定时器测量事件循环的卡顿，
+同时统计界面追上后台线程所需的时间、日志视图的行数和进程常驻内存峰值。
+LogBridge模式的最大卡顿超出预算或日志视图超出行数上限时返回非零
+
+用法: python bench/gui_bridge.py --messages 200000 --budget-ms 200
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, percentile, process_stats
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QPlainTextEdit, QTextEdit
+
+from log_bridge import MAX_LOG_LINES, LogBridge
+
+# 测量事件循环卡顿的定时器间隔(毫秒)
+TICK_MS = 10
+
+class Emitter(QObject):
+    """原来的VPNClient: 每条日志发出一个跨线程信号"""
+    log_message = pyqtSignal(str)
+
+class Producer(threading.Thread):
+    """模拟隧道引擎线程，按给定速率（0为不限速）产生日志，同时累加字节计数供统计快照读取"""
+    def __init__(self, log, count: int, rate: float):
+        super().__init__(daemon=True)
+        self.log = log
+        self.count = count
+        self.rate = rate
+        self.bytes_sent = 0
+        self.elapsed = 0.0
+
+    def stats(self) -> dict:
+        return {'connected': True, 'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_sent,
+                'rtt_ms': 1.0}
+
+    def run(self):
+        started = time.perf_counter()
+        for i in range(self.count):
+            self.log(f"转发数据 #{i}: 1024 字节")
+            self.bytes_sent += 1024
+            if self.rate > 0:
+                delay = started + (i + 1) / self.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        self.elapsed = time.perf_counter() - started
+
+def run(mode: str, args, app: QApplication) -> dict:
+    if mode == 'signal':
+        view = QTextEdit()
+        view.setReadOnly(True)
+        emitter = Emitter()
+        displayed = [0]
+
+        def append(message: str):
+            view.append(message)
+            displayed[0] += 1
+
+        emitter.log_message.connect(append)
+        producer = Producer(emitter.log_message.emit, args.messages, args.rate)
+        caught_up = lambda: displayed[0] >= args.messages
+        line_count = lambda: view.document().blockCount()
+    else:
+        view = QPlainTextEdit()
+        view.setReadOnly(True)
+        view.setUndoRedoEnabled(False)
+        view.setMaximumBlockCount(args.max_lines)
+        bridge = LogBridge(interval=args.interval)
+        bridge.messages_ready.connect(view.appendPlainText)
+        producer = Producer(bridge.log, args.messages, args.rate)
+        readouts = []
+        bridge.stats_updated.connect(readouts.append)
+        bridge.set_stats_source(producer.stats)
+
+        def caught_up():
+            bridge.flush()
+            return True
+
+        line_count = lambda: view.document().blockCount()
+    view.show()
+
+    gaps = []
+    state = {'last': time.perf_counter(), 'done': None}
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append((now - state['last']) * 1000)
+        state['last'] = now
+        if not producer.is_alive() and state['done'] is None and caught_up():
+            state['done'] = now
+            app.quit()
+
+    timer = QTimer()
+    timer.setInterval(TICK_MS)
+    timer.timeout.connect(tick)
+    timer.start()
+    started = time.perf_counter()
+    producer.start()
+    app.exec_()
+    timer.stop()
+    producer.join()
+    gaps.sort()
+    result = {
+        'produce_seconds': producer.elapsed,
+        'catch_up_seconds': state['done'] - started - producer.elapsed,
+        'stall_ms': {
+            'p50': percentile(gaps, 0.50),
+            'p99': percentile(gaps, 0.99),
+            'max': gaps[-1] if gaps else 0.0
+        },
+        'log_lines': line_count(),
+        'peak_rss_bytes': process_stats()['peak_rss_bytes']
+    }
+    if mode == 'bridge':
+        bridge.stop()
+        result['stats_readouts'] = len(readouts)
+    view.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--rate', type=float, default=0, help='每秒产生的日志条数，0为不限速')
+    parser.add_argument('--interval', type=int, default=100, help='LogBridge的刷新间隔(毫秒)')
+    parser.add_argument('--max-lines', type=int, default=MAX_LOG_LINES, help='日志视图保留的行数')
+    parser.add_argument('--budget-ms', type=float, default=200.0, help='LogBridge模式事件循环最大卡顿的预算')
+    parser.add_argument('--mode', choices=('signal', 'bridge'),
+                        help='只运行一种模式；两种都运行时各自在单独的进程中测量内存峰值')
+    args = parser.parse_args()
+
+    if args.mode is None:
+        import subprocess
+        report = {}
+        for mode in ('signal', 'bridge'):
+            output = subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:],
+                                    capture_output=True, text=True)
+            report[mode] = json.loads(output.stdout)[mode]
+        ok = report['bridge']['ok']
+    else:
+        app = QApplication(sys.argv[:1])
+        result = run(args.mode, args, app)
+        if args.mode == 'bridge':
+            result['ok'] = result['stall_ms']['max'] <= args.budget_ms and result['log_lines'] <= args.max_lines
+        report = {args.mode: result}
+        ok = result.get('ok', True)
+    report['params'] = vars(args)
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""上游连接竞速基准: 双栈目标的IPv6地址被黑洞时，比较顺序连接和Happy Eyeballs的建连耗时
+
+黑洞端口是accept队列已满的监听套接字，新的SYN会被内核丢弃，连接一直挂起直到超时。
+解析器被替换为固定返回 [黑洞的::1, 可用的127.0.0.1]。
+
+用法: python bench/happy_eyeballs.py --attempt-delay-ms 250 --naive-timeout 3
+"""
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import common  # noqa: F401  (把server目录加入sys.path)
+from utils.happy_eyeballs import UpstreamConnector
+
+def blackhole_listener():
+    """返回(监听套接字, 占满队列的连接)，之后对该端口的连接都会挂起"""
+    listener = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    listener.bind(('::1', 0))
+    listener.listen(0)
+    filler = socket.create_connection(('::1', listener.getsockname()[1]))
+    return listener, [filler]
+
+async def naive_connect(addresses, timeout: float) -> float:
+    """按顺序逐个尝试，每个地址等待完整的连接超时"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    for family, sockaddr in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, sockaddr), timeout)
+            sock.close()
+            return (time.perf_counter() - started) * 1000
+        except (OSError, asyncio.TimeoutError):
+            sock.close()
+    raise OSError("all addresses failed")
+
+async def run(args) -> dict:
+    listener, fillers = blackhole_listener()
+    good = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+    good_port = good.sockets[0].getsockname()[1]
+    addresses = [
+        (socket.AF_INET6, ('::1', listener.getsockname()[1], 0, 0)),
+        (socket.AF_INET, ('127.0.0.1', good_port))
+    ]
+
+    async def resolver(host, port):
+        return addresses
+
+    connector = UpstreamConnector(resolver, attempt_delay=args.attempt_delay_ms / 1000)
+    report = {'naive_ms': await naive_connect(addresses, args.naive_timeout)}
+    for label in ('happy_eyeballs_first_ms', 'happy_eyeballs_remembered_ms'):
+        started = time.perf_counter()
+        _, writer = await connector.open_connection('dual.test', 443)
+        report[label] = (time.perf_counter() - started) * 1000
+        writer.close()
+    report['stats'] = connector.stats
+
+    good.close()
+    listener.close()
+    for filler in fillers:
+        filler.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--attempt-delay-ms', type=float, default=250)
+    parser.add_argument('--naive-timeout', type=float, default=3.0, help='顺序连接时每个地址的超时(秒)')
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""心跳失效检测基准: 连接经过的代理突然静默丢弃所有数据（模拟NAT映射丢失或对端断电），
+测量客户端和服务端各自发现连接失效并关闭它所用的时间
+
+用法: python bench/heartbeat.py --interval 0.5 --misses 3
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, ServerProcess, free_port
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+
+class BlackholeProxy:
+    """转发TCP连接，冻结后丢弃两个方向的数据但不关闭连接"""
+    def __init__(self, target_port: int):
+        self.target_port = target_port
+        self.port = free_port()
+        self.frozen = False
+        # 服务端关闭上游连接的时间
+        self.upstream_closed_at: Optional[float] = None
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', self.port)
+
+    async def _pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, upstream: bool):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if not self.frozen:
+                    writer.write(data)
+        except OSError:
+            pass
+        if upstream and self.upstream_closed_at is None:
+            self.upstream_closed_at = time.perf_counter()
+        if not self.frozen:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+        await asyncio.gather(self._pump(reader, up_writer, False), self._pump(up_reader, writer, True))
+        writer.close()
+        up_writer.close()
+
+    def close(self):
+        self.server.close()
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    with ServerProcess(workdir, key_material, heartbeat_interval=args.interval,
+                       heartbeat_misses=args.misses) as server:
+        proxy = BlackholeProxy(server.port)
+        await proxy.start()
+        client = TunnelClient('127.0.0.1', proxy.port, key_material.decode(),
+                              heartbeat_interval=args.interval, heartbeat_misses=args.misses)
+        reader, writer = await client.connect()
+        serve = asyncio.create_task(client.serve(reader, writer))
+        try:
+            # 双方各完成至少一次心跳后再冻结
+            started = time.perf_counter()
+            while client.rtt is None:
+                if time.perf_counter() - started > args.interval * 4:
+                    raise TimeoutError("no heartbeat response")
+                await asyncio.sleep(0.01)
+            rtt_ms = client.rtt
+            await asyncio.sleep(args.interval * 1.5)
+            proxy.frozen = True
+            frozen_at = time.perf_counter()
+            timeout = args.interval * (args.misses + 3)
+            await asyncio.wait_for(serve, timeout)
+            client_detect = time.perf_counter() - frozen_at
+            while proxy.upstream_closed_at is None and time.perf_counter() - frozen_at < timeout:
+                await asyncio.sleep(0.01)
+        finally:
+            proxy.close()
+    return {
+        'heartbeat_rtt_ms': rtt_ms,
+        'client_detect_ms': client_detect * 1000,
+        'server_detect_ms': (proxy.upstream_closed_at - frozen_at) * 1000 if proxy.upstream_closed_at else None,
+        'bound_ms': args.interval * (args.misses + 1) * 1000,
+        'params': vars(args)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interval', type=float, default=0.5, help='心跳间隔(秒)')
+    parser.add_argument('--misses', type=int, default=3, help='判定失效的连续未响应次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""空闲连接内存基准: 建立N条完成TLS和协议握手后不再发送数据的连接，测量服务器每条空闲连接占用的常驻内存
+
+超出--budget-bytes时返回非零，可用于CI中防止回退；默认按面向大量连接的low-memory档位测量
+
+用法: python bench/idle_connections.py --connections 2000 --engine stream --socket-profile low-memory --budget-bytes 49152
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, client_ssl_context
+from cryptography.fernet import Fernet
+from utils.framing import FRAME_HELLO, HEADER_SIZE, pack_frame, unpack_header
+from utils.session import SESSION_RESUMABLE
+
+def recv_exactly(sock, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed during handshake")
+        data += chunk
+    return data
+
+def open_idle(port: int, context, count: int) -> list:
+    """用阻塞套接字依次完成TLS和HELLO握手，客户端一侧不经过asyncio，减少自身的内存占用"""
+    connections = []
+    for _ in range(count):
+        sock = context.wrap_socket(socket.create_connection(('127.0.0.1', port)))
+        # 与客户端一致：魔数 + 会话密钥 + 不压缩 + 可恢复会话
+        sock.sendall(pack_frame(FRAME_HELLO, b"CYS" + os.urandom(32) + bytes([0, SESSION_RESUMABLE])))
+        _, length = unpack_header(recv_exactly(sock, HEADER_SIZE))
+        recv_exactly(sock, length)
+        connections.append(sock)
+    return connections
+
+def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    context = client_ssl_context()
+    options = {'engine': args.engine, 'socket_profile': args.socket_profile, 'read_limit': args.read_limit,
+               'max_connections': args.connections + args.warmup}
+    with ServerProcess(workdir, key_material, **options) as server:
+        # 先建立少量连接，让惰性导入、缓冲池和TLS会话缓存等一次性开销计入基线
+        warmup = open_idle(server.port, context, args.warmup)
+        time.sleep(args.settle)
+        before = server.stats()['rss_bytes']
+        started = time.perf_counter()
+        connections = open_idle(server.port, context, args.connections)
+        connect_seconds = time.perf_counter() - started
+        time.sleep(args.settle)
+        after = server.stats()['rss_bytes']
+        for sock in warmup + connections:
+            sock.close()
+    per_connection = (after - before) / args.connections
+    return {
+        'connections': args.connections,
+        'server_rss_before': before,
+        'server_rss_after': after,
+        'bytes_per_connection': per_connection,
+        'connects_per_sec': args.connections / connect_seconds,
+        'budget_bytes': args.budget_bytes,
+        'within_budget': args.budget_bytes <= 0 or per_connection <= args.budget_bytes,
+        'params': vars(args)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=50, help='计入基线的预热连接数')
+    parser.add_argument('--engine', default='stream', help='服务器引擎')
+    parser.add_argument('--socket-profile', default='low-memory', help='套接字调优档位')
+    parser.add_argument('--read-limit', type=int, default=0, help='每条连接的读缓冲上限，0为使用调优档位的值')
+    parser.add_argument('--settle', type=float, default=1.0, help='测量前等待的秒数')
+    parser.add_argument('--budget-bytes', type=int, default=48 * 1024, help='每条连接的内存预算，0为不检查')
+    args = parser.parse_args()
+
+    # 客户端和服务端各需要一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.connections + args.warmup + 256:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args, Path(tmp))
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""回环负载生成器: 启动服务器并用N个模拟客户端施压，以JSON输出结果
+
+用法: python bench/loadgen.py --clients 100 --size 1024 --rate 50 --duration 10 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, client_ssl_context, percentile, process_stats
+from cryptography.fernet import Fernet
+from utils.framing import FRAME_DATA, HEADER_SIZE, pack_frame, unpack_header
+
+async def simulated_client(port: int, cipher: Fernet, size: int, rate: float,
+                           deadline: float, latencies: list, counters: dict):
+    """单个模拟客户端: 按固定速率发送帧并等待响应，rate为0时不限速"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, ssl=client_ssl_context())
+    except OSError:
+        counters['connect_errors'] += 1
+        return
+    frame = pack_frame(FRAME_DATA, cipher.encrypt(os.urandom(size)))
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_send = time.perf_counter()
+    try:
+        while time.perf_counter() < deadline:
+            if interval:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_send += interval
+            sent = time.perf_counter()
+            writer.write(frame)
+            await writer.drain()
+            _, length = unpack_header(await reader.readexactly(HEADER_SIZE))
+            await reader.readexactly(length)
+            latencies.append((time.perf_counter() - sent) * 1000)
+            counters['bytes'] += size
+    except (OSError, asyncio.IncompleteReadError):
+        counters['errors'] += 1
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+async def generate_load(port: int, key_material: bytes, clients: int, size: int,
+                        rate: float, duration: float) -> dict:
+    """运行一轮负载并汇总客户端侧的指标"""
+    cipher = Fernet(key_material)
+    latencies = []
+    counters = {'bytes': 0, 'errors': 0, 'connect_errors': 0}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        simulated_client(port, cipher, size, rate, deadline, latencies, counters)
+        for _ in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'frames': len(latencies),
+        'elapsed_seconds': elapsed,
+        'frames_per_sec': len(latencies) / elapsed,
+        'mbytes_per_sec': counters['bytes'] / elapsed / 1e6,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0
+        },
+        'errors': counters['errors'],
+        'connect_errors': counters['connect_errors']
+    }
+
+def run(clients: int, size: int, rate: float, duration: float, **server_options) -> dict:
+    """启动回环服务器，施加负载，返回包含服务器CPU/RSS的完整报告"""
+    key_material = Fernet.generate_key()
+    with tempfile.TemporaryDirectory() as tmp:
+        with ServerProcess(Path(tmp), key_material, **server_options) as server:
+            server_before = server.stats()
+            client_before = process_stats()
+            result = asyncio.run(generate_load(server.port, key_material, clients, size, rate, duration))
+            server_after = server.stats()
+            client_after = process_stats()
+    elapsed = result['elapsed_seconds']
+    result['server'] = {
+        'cpu_seconds': server_after['cpu_seconds'] - server_before['cpu_seconds'],
+        'cpu_percent': (server_after['cpu_seconds'] - server_before['cpu_seconds']) / elapsed * 100,
+        'rss_bytes': server_after['rss_bytes']
+    }
+    result['client'] = {
+        'cpu_seconds': client_after['cpu_seconds'] - client_before['cpu_seconds'],
+        'rss_bytes': client_after['rss_bytes']
+    }
+    result['params'] = {'clients': clients, 'size': size, 'rate': rate,
+                        'duration': duration, **server_options}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=50, help='并发客户端数')
+    parser.add_argument('--size', type=int, default=1024, help='帧负载大小(字节)')
+    parser.add_argument('--rate', type=float, default=0, help='每个客户端每秒发送帧数，0为不限速')
+    parser.add_argument('--duration', type=float, default=10, help='持续时间(秒)')
+    parser.add_argument('--engine', default='stream', help='服务器引擎')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    report = run(args.clients, args.size, args.rate, args.duration, engine=args.engine)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+if __name__ == '__main__':
+    main()
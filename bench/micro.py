@@ -0,0 +1,103 @@
+"""微基准: 加密、混淆、压缩和PerformanceMonitor的单次调用开销
+
+用法: python bench/micro.py --output micro.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import common  # noqa: F401  (把server目录加入sys.path)
+from cryptography.fernet import Fernet
+from utils.compression import AdaptiveCompressor, decompress_frame
+from utils.obfuscator import TrafficObfuscator
+from utils.performance import PerformanceMonitor
+
+SIZES = (64, 1024, 16 * 1024)
+
+def measure(func, number: int) -> dict:
+    """返回每次调用的平均耗时(微秒)，取多轮中的最小值"""
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return {'us_per_call': best / number * 1e6, 'calls': number}
+
+def bench_cipher() -> dict:
+    cipher = Fernet(Fernet.generate_key())
+    results = {}
+    for size in SIZES:
+        data = os.urandom(size)
+        token = cipher.encrypt(data)
+        results[f'fernet_encrypt_{size}'] = measure(lambda: cipher.encrypt(data), 2000)
+        results[f'fernet_decrypt_{size}'] = measure(lambda: cipher.decrypt(token), 2000)
+    return results
+
+def bench_obfuscator() -> dict:
+    obfuscator = TrafficObfuscator()
+    results = {}
+    for size in SIZES:
+        data = os.urandom(size)
+        obfuscated, marker = obfuscator.obfuscate(data)
+        results[f'obfuscate_{size}'] = measure(lambda: obfuscator.obfuscate(data), 5000)
+        results[f'deobfuscate_{size}'] = measure(lambda: obfuscator.deobfuscate(obfuscated, marker), 5000)
+    return results
+
+def compressible_payload(size: int) -> bytes:
+    """类似HTTP头/JSON的可压缩负载"""
+    rng = random.Random(size)
+    records = []
+    while sum(len(r) for r in records) < size:
+        records.append(json.dumps({'id': rng.randrange(10 ** 6), 'path': f'/api/v1/items/{rng.randrange(1000)}',
+                                   'status': rng.choice(['ok', 'pending', 'failed'])}))
+    return '\n'.join(records).encode()[:size]
+
+def bench_compression() -> dict:
+    results = {}
+    for kind, make in (('text', compressible_payload), ('random', os.urandom)):
+        for size in SIZES[1:]:
+            data = make(size)
+            compressor = AdaptiveCompressor()
+            framed = compressor.compress(data)
+            results[f'compress_{kind}_{size}'] = measure(lambda: compressor.compress(data), 2000)
+            results[f'compress_{kind}_{size}']['ratio'] = len(framed) / len(data)
+            results[f'decompress_{kind}_{size}'] = measure(lambda: decompress_frame(framed), 2000)
+    return results
+
+def bench_performance_monitor() -> dict:
+    monitor = PerformanceMonitor()
+    clients = [f'10.0.{i // 256}.{i % 256}:443' for i in range(1000)]
+    for client_id in clients:
+        monitor.record_latency(client_id, 1.0)
+        monitor.record_throughput(client_id, 1024)
+    return {
+        'record_latency': measure(lambda: monitor.record_latency(clients[7], 1.5), 100000),
+        'record_throughput': measure(lambda: monitor.record_throughput(clients[7], 4096), 100000),
+        'get_client_stats': measure(lambda: monitor.get_client_stats(clients[7]), 2000),
+        'get_global_stats_1000_clients': measure(monitor.get_global_stats, 20)
+    }
+
+BENCHMARKS = {
+    'cipher': bench_cipher,
+    'obfuscator': bench_obfuscator,
+    'compression': bench_compression,
+    'performance_monitor': bench_performance_monitor
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), help='只运行指定的基准')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    names = [args.only] if args.only else list(BENCHMARKS)
+    report = {name: BENCHMARKS[name]() for name in names}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+if __name__ == '__main__':
+    main()
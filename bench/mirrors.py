@@ -0,0 +1,76 @@
+"""客户端副本一致性检查: client/ 下与服务端 utils/ 保持一致的模块逐个比较共有的顶层定义，
+任何一个副本与服务端版本不一致或缺少定义时返回非零
+
+比较的是语法树而不是文本：忽略行号、导入和日志消息的文字（服务端日志为英文，客户端为中文），
+客户端副本额外的定义（如 priority.PrioritySender）不参与比较。
+
+用法: python bench/mirrors.py
+"""
+import argparse
+import ast
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, SERVER_DIR
+
+# 客户端副本 -> 服务端模块
+MIRRORS = (
+    ('compression.py', 'utils/compression.py'),
+    ('streaming.py', 'utils/streaming.py'),
+    ('socket_tuning.py', 'utils/socket_tuning.py'),
+    ('priority.py', 'utils/priority.py')
+)
+
+class _StripLogMessages(ast.NodeTransformer):
+    """去掉 logger.xxx(...) 调用的参数，两端的日志文字不同"""
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'logger':
+            node.args = []
+            node.keywords = []
+        return node
+
+def definitions(path: Path) -> Dict[str, str]:
+    """模块的顶层定义: 名称 -> 规范化后的语法树"""
+    tree = _StripLogMessages().visit(ast.parse(path.read_text(encoding='utf-8')))
+    result = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [node.name]
+        elif isinstance(node, ast.Assign):
+            names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names = [node.target.id]
+        else:
+            continue
+        for name in names:
+            result[name] = ast.dump(node)
+    return result
+
+def check(client_file: Path, server_file: Path) -> dict:
+    client = definitions(client_file)
+    server = definitions(server_file)
+    return {
+        'shared': sorted(name for name in server if name in client),
+        'missing': sorted(name for name in server if name not in client),
+        'diverged': sorted(name for name in server if name in client and client[name] != server[name])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    report = {client: check(CLIENT_DIR / client, SERVER_DIR / server) for client, server in MIRRORS}
+    print(json.dumps(report, indent=2))
+    failed = [client for client, result in report.items() if result['missing'] or result['diverged']]
+    if failed:
+        print(f"与服务端不一致的副本: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""过载保护基准: 向服务器事件循环注入阻塞调用（模拟内联加密或同步写文件），
+同时保持一组长连接客户端并不断有新连接到达，比较关闭和开启过载保护时长连接的延迟、新连接的结果和恢复时间
+
+阻塞分两种：每个新连接注册时阻塞connect-block-ms（过载由新连接引起，拒绝新连接可以缓解），
+以及每period-ms周期性阻塞block-ms（与负载无关的背景阻塞）
+
+用法: python bench/overload.py --clients 10 --arrival-rate 40 --connect-block-ms 30 --block-ms 0 --block-for 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, client_ssl_context, percentile
+from cryptography.fernet import Fernet
+from utils.framing import FRAME_DATA, HEADER_SIZE, pack_frame, unpack_header
+
+# 工作目录中存在block文件时，每period秒阻塞事件循环block秒，每个新连接注册时阻塞connect_block秒
+BLOCKER = """
+    import os, time
+    loop = asyncio.get_running_loop()
+    def block():
+        if os.path.exists('block'):
+            time.sleep({block})
+        loop.call_later({period}, block)
+    if {block}:
+        loop.call_later({period}, block)
+    register = server.register_client
+    async def slow_register(*args):
+        if os.path.exists('block'):
+            time.sleep({connect_block})
+        return await register(*args)
+    server.register_client = slow_register
+"""
+
+# 创建SSL上下文要加载系统证书，所有连接共用一个
+SSL_CONTEXT = client_ssl_context()
+
+async def round_trip(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, frame: bytes):
+    writer.write(frame)
+    await writer.drain()
+    _, length = unpack_header(await reader.readexactly(HEADER_SIZE))
+    await reader.readexactly(length)
+
+async def existing_client(port: int, frame: bytes, rate: float, deadline: float, samples: list):
+    """长连接客户端，记录(发送时间, 延迟)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, ssl=SSL_CONTEXT)
+    try:
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            await round_trip(reader, writer, frame)
+            samples.append((sent, (time.perf_counter() - sent) * 1000))
+            await asyncio.sleep(max(0.0, 1.0 / rate - (time.perf_counter() - sent)))
+    finally:
+        writer.transport.abort()
+
+async def arrival(port: int, frame: bytes, timeout: float, outcomes: list):
+    """新连接：完成TLS握手和一次往返，记录(开始时间, 结果, 耗时)"""
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection('127.0.0.1', port, ssl=SSL_CONTEXT), timeout)
+        await asyncio.wait_for(round_trip(reader, writer, frame), timeout)
+        outcome = 'ok'
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+    except (OSError, ssl.SSLError, asyncio.IncompleteReadError):
+        outcome = 'rejected'
+    finally:
+        if writer is not None:
+            writer.transport.abort()
+    outcomes.append((started, outcome, (time.perf_counter() - started) * 1000))
+
+def phase_report(samples: list, outcomes: list, start: float, end: float) -> dict:
+    latencies = sorted(latency for sent, latency in samples if start <= sent < end)
+    results = [(outcome, elapsed) for started, outcome, elapsed in outcomes if start <= started < end]
+    times = sorted(elapsed for _, elapsed in results)
+    return {
+        'existing_latency_ms': {'p50': percentile(latencies, 0.50), 'p99': percentile(latencies, 0.99)},
+        'arrivals': {name: sum(1 for outcome, _ in results if outcome == name)
+                     for name in ('ok', 'rejected', 'timeout')},
+        'arrival_time_ms': {'p50': percentile(times, 0.50), 'p99': percentile(times, 0.99)}
+    }
+
+async def measure(port: int, key_material: bytes, workdir: Path, args) -> dict:
+    frame = pack_frame(FRAME_DATA, Fernet(key_material).encrypt(os.urandom(args.size)))
+    samples, outcomes = [], []
+    started = time.perf_counter()
+    block_at = started + args.warmup
+    unblock_at = block_at + args.block_for
+    deadline = unblock_at + args.recovery
+    clients = [asyncio.create_task(existing_client(port, frame, args.rate, deadline, samples))
+               for _ in range(args.clients)]
+    arrivals = []
+    blocked = False
+    while time.perf_counter() < deadline:
+        now = time.perf_counter()
+        if not blocked and now >= block_at and now < unblock_at:
+            (workdir / 'block').touch()
+            blocked = True
+        elif blocked and now >= unblock_at:
+            (workdir / 'block').unlink()
+            blocked = False
+        arrivals.append(asyncio.create_task(arrival(port, frame, args.timeout, outcomes)))
+        await asyncio.sleep(1.0 / args.arrival_rate)
+    await asyncio.gather(*clients, *arrivals, return_exceptions=True)
+
+    # 解除阻塞后发起的新连接中第一个完成往返的时间
+    recovered = [s + elapsed / 1000 for s, outcome, elapsed in outcomes if s >= unblock_at and outcome == 'ok']
+    return {
+        'warmup': phase_report(samples, outcomes, started, block_at),
+        'blocked': phase_report(samples, outcomes, block_at, unblock_at),
+        'recovery': phase_report(samples, outcomes, unblock_at, deadline),
+        'recovered_ms': (min(recovered) - unblock_at) * 1000 if recovered else None
+    }
+
+async def run(args) -> dict:
+    report = {}
+    setup = BLOCKER.format(block=args.block_ms / 1000, period=args.period_ms / 1000,
+                           connect_block=args.connect_block_ms / 1000)
+    for label, overload in (('unprotected', {'interval': 0}), ('protected', {})):
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            key_material = Fernet.generate_key()
+            with ServerProcess(workdir, key_material, setup=setup, overload=overload) as server:
+                report[label] = await measure(server.port, key_material, workdir, args)
+    report['params'] = vars(args)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10, help='长连接客户端数')
+    parser.add_argument('--rate', type=float, default=20, help='每个长连接客户端每秒发送帧数')
+    parser.add_argument('--size', type=int, default=1024, help='帧负载大小(字节)')
+    parser.add_argument('--arrival-rate', type=float, default=40, help='每秒到达的新连接数')
+    parser.add_argument('--connect-block-ms', type=float, default=30, help='每个新连接注册时的阻塞时长')
+    parser.add_argument('--block-ms', type=float, default=0, help='周期性阻塞的时长，0为不注入')
+    parser.add_argument('--period-ms', type=float, default=50, help='两次周期性阻塞之间的间隔')
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--block-for', type=float, default=3.0, help='注入阻塞的持续时间(秒)')
+    parser.add_argument('--recovery', type=float, default=3.0, help='解除阻塞后继续观察的时间(秒)')
+    parser.add_argument('--timeout', type=float, default=3.0, help='新连接的超时时间(秒)')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""连接内优先级基准: 大块传输占满模拟链路时，测量同一连接上交互帧的往返延迟
+
+代理限制在途字节数，使链路成为瓶颈。服务端回显请求，大块请求的响应放大若干倍（类似下载）时下行成为瓶颈；
+比较客户端先进先出和按流提示优先发送两种情况。
+服务端按请求顺序响应，客户端只在交互和大块两个级别之间重排、级别内先进先出，
+所以按响应大小区分两个级别后，在级别内按发送顺序匹配响应是准确的。
+
+用法: python bench/priority.py --bulk-streams 4 --bulk-size 65536 --rate 20 --delay-ms 10 --window-kb 64 --queue-kb 64 --response-factor 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, DelayProxy, ServerProcess, percentile
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+
+# 交互帧的负载大小，混淆后的响应仍远小于这个界限
+INTERACTIVE_SIZE = 64
+INTERACTIVE_MAX_RESPONSE = 1024
+
+# 服务端回显，大块请求的响应放大factor倍，让下行承载更多的大块传输
+ECHO = """
+    async def echo(data):
+        return data * {factor} if len(data) > 1024 else data
+    server.process_client_data = echo
+"""
+
+# 情况名 -> 客户端按优先级发送
+CASES = (
+    ('fifo', False),
+    ('priority', True)
+)
+
+async def measure(port: int, key: str, priority: bool, args) -> dict:
+    interactive_sent = deque()
+    latencies = []
+    bulk_bytes = 0
+    deadline = time.perf_counter() + args.duration
+
+    # 限制未收到响应的大块请求数，None为不等待响应一直发送
+    window = asyncio.Semaphore(args.bulk_window) if args.bulk_window > 0 else None
+
+    def on_data(data: bytes):
+        nonlocal bulk_bytes
+        if len(data) < INTERACTIVE_MAX_RESPONSE:
+            latencies.append((time.perf_counter() - interactive_sent.popleft()) * 1000)
+            return
+        if window is not None:
+            window.release()
+        if time.perf_counter() < deadline:
+            # 只统计测量期内回显的大块帧，不计入结束后排空的积压
+            bulk_bytes += len(data)
+
+    client = TunnelClient('127.0.0.1', port, key, on_data=on_data, compression=False, priority=priority,
+                          resumable=False)
+    reader, writer = await client.connect()
+    serve = asyncio.create_task(client.serve(reader, writer))
+
+    async def bulk():
+        payload = os.urandom(args.bulk_size)
+        while time.perf_counter() < deadline:
+            if window is not None:
+                await window.acquire()
+            await client.send(payload, 'bulk')
+
+    async def interactive():
+        payload = os.urandom(INTERACTIVE_SIZE)
+        interval = 1.0 / args.rate
+        # 等大块传输占满链路后再开始测量
+        await asyncio.sleep(0.5)
+        while time.perf_counter() < deadline:
+            interactive_sent.append(time.perf_counter())
+            await client.send(payload, 'ssh')
+            await asyncio.sleep(interval)
+
+    try:
+        await asyncio.gather(interactive(), *(bulk() for _ in range(args.bulk_streams)))
+        # 等待已发出的交互帧的响应
+        await asyncio.sleep(1.0)
+    finally:
+        writer.transport.abort()
+        await serve
+    latencies.sort()
+    return {
+        'interactive_frames': len(latencies),
+        'interactive_latency_ms': {
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0
+        },
+        'bulk_mbytes_per_sec': bulk_bytes / args.duration / 1e6
+    }
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    report = {}
+    setup = ECHO.format(factor=args.response_factor)
+    for label, priority in CASES:
+        with ServerProcess(workdir, key_material, setup=setup) as server:
+            proxy = DelayProxy(server.port, args.delay_ms / 1000, args.window_kb * 1024, args.queue_kb * 1024)
+            await proxy.start()
+            try:
+                report[label] = await measure(proxy.port, key_material.decode(), priority, args)
+            finally:
+                proxy.close()
+    report['params'] = vars(args)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bulk-streams', type=int, default=4, help='并发的大块传输数')
+    parser.add_argument('--bulk-size', type=int, default=65536, help='大块帧负载大小(字节)')
+    parser.add_argument('--rate', type=float, default=20, help='交互帧每秒发送数')
+    parser.add_argument('--delay-ms', type=float, default=10, help='代理单向延迟')
+    parser.add_argument('--window-kb', type=int, default=64, help='代理每个方向的在途字节上限')
+    parser.add_argument('--queue-kb', type=int, default=64, help='代理接收缓冲，模拟瓶颈处的队列长度')
+    parser.add_argument('--response-factor', type=int, default=1, help='大块请求的响应相对请求的放大倍数')
+    parser.add_argument('--bulk-window', type=int, default=0,
+                        help='最多有多少个大块请求未收到响应，0为不等待响应')
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
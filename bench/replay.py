@@ -0,0 +1,221 @@
+"""轨迹重放: 按服务器录制的轨迹（TRACE_FILE）在回环服务器上以原时序或加速重放每条连接的帧，
+报告延迟、吞吐和调度滞后；指定两个server目录时分别重放并比较两个版本
+
+轨迹只有帧大小，重放时发送大小相近的随机数据帧；HELLO按不协商压缩和会话恢复重放，
+PING/PONG/ACK/RESUME与服务端状态相关，不重放。record子命令用负载生成器录制一段示例轨迹
+
+用法: python bench/replay.py record --clients 20 --rate 20 --duration 5 --trace trace.bin
+      python bench/replay.py replay --trace trace.bin --speed 2 --output after.json
+      python bench/replay.py replay --trace trace.bin --builds /tmp/old/server server
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ServerProcess, client_ssl_context, percentile, process_stats
+from compare import compare
+from cryptography.fernet import Fernet
+from loadgen import generate_load
+from utils.framing import FRAME_DATA, FRAME_HELLO, FRAME_STRIPE, HEADER_SIZE, pack_frame, unpack_header
+from utils.trace import HEADER_SIZE as HEADER_SIZE_TRACE
+from utils.trace import EVENT_CLOSE, EVENT_IN, EVENT_OPEN, RECORD, read_trace
+
+# 所有连接共用一个客户端SSL上下文
+SSL_CONTEXT = client_ssl_context()
+
+# Fernet令牌: 版本(1) + 时间戳(8) + IV(16) + 按16字节填充的密文 + HMAC(32)，再做base64
+FERNET_OVERHEAD = 1 + 8 + 16 + 16 + 32
+
+def plaintext_size(frame_size: int) -> int:
+    """加密后帧负载约为frame_size字节的明文长度"""
+    return max(0, frame_size * 3 // 4 - FERNET_OVERHEAD)
+
+def load_connections(path: Path) -> list:
+    """按连接分组，返回[(建立时间, [(时间, 事件, 帧类型, 大小), ...]), ...]"""
+    connections = defaultdict(list)
+    for elapsed, connection, event, frame_type, size in read_trace(path):
+        connections[connection].append((elapsed, event, frame_type, size))
+    return sorted((events[0][0], events) for events in connections.values()
+                  if events[0][1] == EVENT_OPEN)
+
+class Replay:
+    """一次重放的状态和结果"""
+    def __init__(self, port: int, key_material: bytes, speed: float, timeout: float):
+        self.port = port
+        self.cipher = Fernet(key_material)
+        self.speed = speed
+        self.timeout = timeout
+        self.frames = {}
+        self.latencies = []
+        self.lags = []
+        self.counters = {'bytes': 0, 'errors': 0, 'connect_errors': 0, 'skipped_frames': 0}
+        self.started = 0.0
+
+    def frame(self, size: int) -> bytes:
+        """同样大小的帧只加密一次"""
+        frame = self.frames.get(size)
+        if frame is None:
+            frame = self.frames[size] = pack_frame(FRAME_DATA, self.cipher.encrypt(bytes(plaintext_size(size))))
+        return frame
+
+    async def wait_until(self, elapsed: float):
+        """等到轨迹中的时间点，记录实际滞后"""
+        target = self.started + elapsed / self.speed
+        delay = target - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.lags.append(max(0.0, time.perf_counter() - target) * 1000)
+
+    async def read_responses(self, reader: asyncio.StreamReader, pending: deque):
+        """按发送顺序匹配数据帧的响应，其余帧（HELLO回复、PING、ACK）直接丢弃"""
+        while True:
+            frame_type, length = unpack_header(await reader.readexactly(HEADER_SIZE))
+            await reader.readexactly(length)
+            if frame_type == FRAME_DATA and pending:
+                self.latencies.append((time.perf_counter() - pending.popleft()) * 1000)
+
+    async def connection(self, events: list):
+        await self.wait_until(events[0][0])
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', self.port, ssl=SSL_CONTEXT), self.timeout)
+        except (OSError, ssl.SSLError, asyncio.TimeoutError):
+            self.counters['connect_errors'] += 1
+            return
+        pending = deque()
+        responses = asyncio.create_task(self.read_responses(reader, pending))
+        try:
+            for elapsed, event, frame_type, size in events[1:]:
+                if event == EVENT_CLOSE:
+                    await self.wait_until(elapsed)
+                    break
+                if event != EVENT_IN:
+                    continue
+                if frame_type == FRAME_HELLO:
+                    frame = pack_frame(FRAME_HELLO, b"CYS" + bytes(32) + bytes([0, 0]))
+                elif frame_type in (FRAME_DATA, FRAME_STRIPE):
+                    frame = self.frame(size)
+                else:
+                    self.counters['skipped_frames'] += 1
+                    continue
+                await self.wait_until(elapsed)
+                if responses.done():
+                    break
+                if frame_type != FRAME_HELLO:
+                    pending.append(time.perf_counter())
+                    self.counters['bytes'] += size
+                writer.write(frame)
+                await writer.drain()
+            # 等待剩余的响应
+            deadline = time.perf_counter() + self.timeout
+            while pending and not responses.done() and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+            if pending:
+                self.counters['errors'] += 1
+        except OSError:
+            self.counters['errors'] += 1
+        finally:
+            if responses.done() and not responses.cancelled() and responses.exception() is not None:
+                self.counters['errors'] += 1
+            responses.cancel()
+            writer.transport.abort()
+
+    async def run(self, connections: list) -> dict:
+        self.started = time.perf_counter()
+        await asyncio.gather(*(self.connection(events) for _, events in connections))
+        elapsed = time.perf_counter() - self.started
+        self.latencies.sort()
+        self.lags.sort()
+        return {
+            'frames': len(self.latencies),
+            'elapsed_seconds': elapsed,
+            'frames_per_sec': len(self.latencies) / elapsed,
+            'mbytes_per_sec': self.counters['bytes'] / elapsed / 1e6,
+            'latency_ms': {
+                'p50': percentile(self.latencies, 0.50),
+                'p99': percentile(self.latencies, 0.99),
+                'max': self.latencies[-1] if self.latencies else 0.0
+            },
+            # 重放端实际发送比计划晚的时间，过大说明重放本身跟不上加速后的速率
+            'schedule_lag_ms': {
+                'p50': percentile(self.lags, 0.50),
+                'p99': percentile(self.lags, 0.99)
+            },
+            **self.counters
+        }
+
+def replay(trace: Path, speed: float, timeout: float, server_dir=None, **server_options) -> dict:
+    connections = load_connections(trace)
+    key_material = Fernet.generate_key()
+    with tempfile.TemporaryDirectory() as tmp:
+        with ServerProcess(Path(tmp), key_material, server_dir=server_dir, **server_options) as server:
+            before = server.stats()
+            result = asyncio.run(Replay(server.port, key_material, speed, timeout).run(connections))
+            after = server.stats()
+    result['server'] = {
+        'cpu_seconds': after['cpu_seconds'] - before['cpu_seconds'],
+        'cpu_percent': (after['cpu_seconds'] - before['cpu_seconds']) / result['elapsed_seconds'] * 100,
+        'rss_bytes': after['rss_bytes']
+    }
+    result['client'] = process_stats()
+    result['params'] = {'trace': str(trace), 'connections': len(connections), 'speed': speed,
+                        'server_dir': str(server_dir or ''), **server_options}
+    return result
+
+def record(args):
+    """在回环服务器上开启录制，用负载生成器产生一段轨迹"""
+    key_material = Fernet.generate_key()
+    trace = Path(args.trace).resolve()
+    with tempfile.TemporaryDirectory() as tmp:
+        with ServerProcess(Path(tmp), key_material, trace_file=str(trace)) as server:
+            result = asyncio.run(generate_load(server.port, key_material, args.clients, args.size,
+                                               args.rate, args.duration))
+    # 服务器被终止时来不及截断预分配的文件，按文件头中的记录数截断
+    records = sum(1 for _ in read_trace(trace))
+    os.truncate(trace, HEADER_SIZE_TRACE + records * RECORD.size)
+    return {'trace': str(trace), 'records': records, 'frames': result['frames'], 'params': vars(args)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    recorder = commands.add_parser('record', help='录制一段示例轨迹')
+    recorder.add_argument('--trace', required=True, help='轨迹文件')
+    recorder.add_argument('--clients', type=int, default=20)
+    recorder.add_argument('--size', type=int, default=1024)
+    recorder.add_argument('--rate', type=float, default=20, help='每个客户端每秒发送帧数')
+    recorder.add_argument('--duration', type=float, default=5)
+    recorder.add_argument('--output', help='结果JSON文件')
+    player = commands.add_parser('replay', help='重放轨迹')
+    player.add_argument('--trace', required=True, help='轨迹文件')
+    player.add_argument('--speed', type=float, default=1.0, help='重放速度倍数')
+    player.add_argument('--timeout', type=float, default=10.0, help='连接和等待响应的超时时间(秒)')
+    player.add_argument('--engine', default='stream', help='服务器引擎')
+    player.add_argument('--builds', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='两个版本的server目录，分别重放并比较')
+    player.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        report = record(args)
+    elif args.builds:
+        before, after = (replay(Path(args.trace), args.speed, args.timeout, server_dir=Path(build).resolve(),
+                                engine=args.engine) for build in args.builds)
+        report = {'before': before, 'after': after, 'comparison': compare(before, after)}
+    else:
+        report = replay(Path(args.trace), args.speed, args.timeout, engine=args.engine)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+if __name__ == '__main__':
+    main()
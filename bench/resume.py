@@ -0,0 +1,127 @@
+"""会话恢复基准: 持续发送时切断客户端一侧的连接（服务端看到的旧连接仍然挂着，模拟Wi-Fi切换到蜂窝网络），
+比较开启和关闭会话恢复时的恢复耗时和丢失的帧数
+
+用法: python bench/resume.py --rate 200 --size 1024 --cut-at 1.0 --duration 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, ServerProcess, free_port
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import Backoff, ReconnectSupervisor, TunnelClient
+
+class CuttableProxy:
+    """TCP代理，cut()中断所有客户端一侧的连接，服务端一侧保持打开但不再有数据"""
+    def __init__(self, target_port: int):
+        self.target_port = target_port
+        self.port = free_port()
+        self.client_writers: List[asyncio.StreamWriter] = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', self.port)
+
+    async def _pump(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+        except OSError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+            self.client_writers.append(writer)
+            await asyncio.gather(self._pump(reader, up_writer), self._pump(up_reader, writer))
+        except asyncio.CancelledError:
+            # 事件循环关闭时取消，无需报告
+            writer.close()
+
+    def cut(self):
+        for writer in self.client_writers:
+            writer.transport.abort()
+        self.client_writers = []
+
+    def close(self):
+        self.server.close()
+
+async def measure(port: int, key: str, resumable: bool, args) -> dict:
+    responses = []
+    client = TunnelClient('127.0.0.1', port, key, on_data=lambda data: responses.append(time.perf_counter()),
+                          resumable=resumable)
+    supervisor = ReconnectSupervisor(client, backoff=Backoff(base=0.05, cap=1.0), standby=False)
+    task = asyncio.create_task(supervisor.run())
+    while client.writer is None or not client._attached:
+        await asyncio.sleep(0.01)
+
+    payload = os.urandom(args.size)
+    offered = 0
+    started = time.perf_counter()
+    cut_at = None
+    while time.perf_counter() - started < args.duration:
+        if cut_at is None and time.perf_counter() - started >= args.cut_at:
+            args.proxy.cut()
+            cut_at = time.perf_counter()
+        offered += 1
+        try:
+            await client.send(payload)
+        except (OSError, ConnectionError, AttributeError):
+            pass
+        await asyncio.sleep(1.0 / args.rate)
+    # 等待补发和在途的响应
+    await asyncio.sleep(1.0)
+    supervisor.stop()
+    await task
+    after_cut = [t for t in responses if t > cut_at]
+    return {
+        'offered': offered,
+        'responses': len(responses),
+        'lost': offered - len(responses),
+        'recovery_ms': (after_cut[0] - cut_at) * 1000 if after_cut else None,
+        'reconnect_ms': supervisor.last_failover_ms
+    }
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    report = {}
+    with ServerProcess(workdir, key_material) as server:
+        args.proxy = CuttableProxy(server.port)
+        await args.proxy.start()
+        try:
+            for label, resumable in (('no_resume', False), ('resume', True)):
+                report[label] = await measure(args.proxy.port, key_material.decode(), resumable, args)
+        finally:
+            args.proxy.close()
+    del args.proxy
+    report['params'] = vars(args)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=200, help='每秒发送帧数')
+    parser.add_argument('--size', type=int, default=1024, help='帧负载大小(字节)')
+    parser.add_argument('--cut-at', type=float, default=1.0, help='开始发送后多少秒切断连接')
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""多服务器测速选择基准: 通过不同延迟的代理和不可达节点，检查是否选中最快节点以及缓存命中时的启动耗时
+
+用法: python bench/server_select.py --delays-ms 2 30 --timeout 2
+"""
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, DelayProxy, ServerProcess, free_port
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+from servers import ServerPool, ServerProber
+
+async def blackhole(port: int):
+    """接受连接但从不回应，模拟TLS握手卡住的节点"""
+    connections = []
+
+    async def hold(reader, writer):
+        connections.append(writer)
+
+    return await asyncio.start_server(hold, '127.0.0.1', port)
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    with ServerProcess(workdir, key_material) as server:
+        proxies = [DelayProxy(server.port, delay_ms / 1000, 1 << 20) for delay_ms in args.delays_ms]
+        for proxy in proxies:
+            await proxy.start()
+        stalled_port, refused_port = free_port(), free_port(socket.SOCK_STREAM)
+        stalled = await blackhole(stalled_port)
+        # 列表中把最快的节点放在最后，避免“恰好选中第一个”
+        servers = [('127.0.0.1', refused_port), ('127.0.0.1', stalled_port)]
+        servers += [('127.0.0.1', proxy.port) for proxy in reversed(proxies)]
+        expected = ('127.0.0.1', proxies[args.delays_ms.index(min(args.delays_ms))].port)
+
+        cache_file = workdir / 'servers_cache.json'
+        client = TunnelClient('127.0.0.1', server.port, key_material.decode())
+        report = {}
+        try:
+            for label in ('cold', 'cached'):
+                pool = ServerPool(client, servers, cache_file, prober=ServerProber(client, timeout=args.timeout))
+                started = time.perf_counter()
+                chosen = await pool.select()
+                report[label] = {
+                    'select_ms': (time.perf_counter() - started) * 1000,
+                    'chosen_fastest': chosen == expected
+                }
+            report['nodes'] = [
+                {key: result.get(key) for key in ('port', 'ok', 'connect_ms', 'throughput_kbps', 'error')}
+                for result in pool.results
+            ]
+        finally:
+            stalled.close()
+            for proxy in proxies:
+                proxy.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--delays-ms', type=float, nargs='+', default=[2, 30])
+    parser.add_argument('--timeout', type=float, default=2.0, help='单个节点的测速超时')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""共享内存指标基准: 多个进程同时通过PerformanceMonitor写入各自的槽位，主进程在写入期间不断汇总，
+报告写入端每次记录的额外开销、汇总耗时，并核对汇总结果与写入次数一致。
+写入结束后像run_workers那样退役一个槽位并由新进程重新占用，核对重生前的累计值仍在汇总中
+
+用法: python bench/shared_metrics.py --workers 4 --frames 200000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import common  # noqa: F401  (把server目录加入sys.path)
+from utils.performance import PerformanceMonitor
+from utils.shared_metrics import SharedMetrics
+
+def record(monitor: PerformanceMonitor, frames: int, client_id: str = '10.0.0.1:443'):
+    """与服务器处理一帧时相同的两次记录"""
+    for i in range(frames):
+        monitor.record_latency(client_id, (i % 50) / 10)
+        monitor.record_throughput(client_id, 1024)
+
+def per_call_us(metrics=None, frames: int = 20000) -> float:
+    monitor = PerformanceMonitor(metrics=metrics)
+    return min(timeit.repeat(lambda: record(monitor, frames), number=1, repeat=5)) / frames * 1e6
+
+def spawn(metrics: SharedMetrics, index: int, frames: int) -> int:
+    """在子进程中占用槽位并记录frames帧"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            record(PerformanceMonitor(metrics=metrics.slot(index)), frames)
+        finally:
+            os._exit(0)
+    return pid
+
+def run(args, path: Path) -> dict:
+    baseline_us = per_call_us()
+    # 单次记录的开销在单独的区域中测量，不计入下面核对的汇总
+    scratch = SharedMetrics.create(path.with_suffix('.scratch'), 1)
+    shared_us = per_call_us(scratch.slot(0))
+    scratch.close()
+
+    metrics = SharedMetrics.create(path, args.workers)
+    pids = [spawn(metrics, index, args.frames) for index in range(args.workers)]
+
+    # 写入期间持续汇总，测量读取方的耗时
+    aggregate_times = []
+    remaining = set(pids)
+    while remaining:
+        started = time.perf_counter()
+        metrics.aggregate()
+        aggregate_times.append((time.perf_counter() - started) * 1e6)
+        for pid in list(remaining):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                remaining.discard(pid)
+        time.sleep(0.001)
+
+    # 工作进程退出后重生：退役槽位0，新进程占用同一槽位并继续记录
+    before_respawn = metrics.aggregate()
+    metrics.retire(0)
+    os.waitpid(spawn(metrics, 0, args.frames), 0)
+    stats = metrics.aggregate()
+    metrics.close()
+    aggregate_times.sort()
+    frames_expected = (args.workers + 1) * args.frames
+    return {
+        'record_frame_us': {'local_only': baseline_us, 'with_shared_slot': shared_us,
+                            'overhead': shared_us - baseline_us},
+        'aggregate_us': {'p50': aggregate_times[len(aggregate_times) // 2], 'max': aggregate_times[-1],
+                         'samples': len(aggregate_times)},
+        'frames_before_respawn': before_respawn['frames'],
+        'frames_expected': frames_expected,
+        'frames_aggregated': stats['frames'],
+        'bytes_aggregated': stats['bytes'],
+        'consistent': (before_respawn['frames'] == args.workers * args.frames
+                       and stats['frames'] == frames_expected and stats['bytes'] == frames_expected * 1024),
+        'params': vars(args)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='写入进程数')
+    parser.add_argument('--frames', type=int, default=200000, help='每个进程记录的帧数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args, Path(tmp) / 'metrics.mmap')
+    print(json.dumps(report, indent=2))
+    return 0 if report['consistent'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
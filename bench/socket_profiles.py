@@ -0,0 +1,52 @@
+"""套接字调优档位基准: 对每个档位分别运行交互负载（大量小帧客户端）和大块负载（少量大帧客户端），
+比较延迟、吞吐和服务器常驻内存
+
+用法: python bench/socket_profiles.py --profiles latency throughput low-memory --duration 5
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loadgen import run as run_load
+
+def summarize(report: dict) -> dict:
+    return {
+        'frames_per_sec': report['frames_per_sec'],
+        'mbytes_per_sec': report['mbytes_per_sec'],
+        'latency_ms': report['latency_ms'],
+        'server_cpu_percent': report['server']['cpu_percent'],
+        'server_rss_bytes': report['server']['rss_bytes'],
+        'errors': report['errors'] + report['connect_errors']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['latency', 'throughput', 'low-memory'])
+    parser.add_argument('--engine', default='stream', help='服务器引擎')
+    parser.add_argument('--interactive-clients', type=int, default=100)
+    parser.add_argument('--interactive-size', type=int, default=256, help='交互帧负载大小(字节)')
+    parser.add_argument('--interactive-rate', type=float, default=50, help='每个交互客户端每秒发送帧数')
+    parser.add_argument('--bulk-clients', type=int, default=4)
+    parser.add_argument('--bulk-size', type=int, default=256 * 1024, help='大块帧负载大小(字节)')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    report = {'params': vars(args)}
+    for profile in args.profiles:
+        options = {'engine': args.engine, 'socket_profile': profile}
+        report[profile] = {
+            'interactive': summarize(run_load(args.interactive_clients, args.interactive_size,
+                                              args.interactive_rate, args.duration, **options)),
+            'bulk': summarize(run_load(args.bulk_clients, args.bulk_size, 0, args.duration, **options))
+        }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""冷启动时间基准: 测量入口相对于空解释器的额外启动开销和 -X importtime 统计的导入耗时，超出预算时返回非零
+
+服务端还会检查导入config/main没有副作用（不绑定端口、不配置日志、不在服务端目录中创建文件），
+并测量从启动进程到开始accept的时间，即工作进程重启时不能服务的时长
+
+用法: python bench/startup.py --runs 20 --budget-ms 150
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, SERVER_CODE, SERVER_DIR, free_port, generate_cert, server_env, wait_for_port
+
+SERVER_IMPORT = f"import sys; sys.path.insert(0, {str(SERVER_DIR)!r}); import main"
+SERVER_CONFIG = f"import sys; sys.path.insert(0, {str(SERVER_DIR)!r}); import config"
+
+# 入口名 -> (命令行参数, 入口脚本, 冷启动时不允许出现的模块, 是否检查导入的副作用, 导入耗时预算(毫秒),
+#           允许在冷启动时导入的重量级模块 -> 包含子模块的导入耗时预算(毫秒))
+# 导入耗时为 -X importtime 统计值减去空解释器的统计值，计时本身有开销，数值比实际的导入时间偏大
+#
+# 服务端的cryptography.fernet留在main的顶层导入: 每条连接都用它解密，CysteriaServer构造时就要创建Fernet，
+# 推迟导入只会把同样的开销挪到开始accept之前；它连带加载的cryptography Rust绑定也被AESGCM/HKDF共用，
+# 所以单独给出预算。只在开启UDP传输或收到流式消息时才需要的utils.datagram和utils.streaming按需导入
+TARGETS = {
+    'client_cli': ([str(CLIENT_DIR / 'cli.py'), '--help'], CLIENT_DIR / 'cli.py',
+                   ('PyQt5', 'winreg', 'cryptography'), False, 150.0, {}),
+    'server_config': (['-c', SERVER_CONFIG], SERVER_DIR / 'config.py',
+                      ('dotenv', 'cryptography', 'OpenSSL'), True, 60.0, {}),
+    'server_import': (['-c', SERVER_IMPORT], SERVER_DIR / 'main.py',
+                      ('jwt', 'daemon', 'dotenv', 'OpenSSL', 'cryptography.x509', 'cProfile', 'tracemalloc',
+                       'statistics', 'utils.datagram', 'utils.streaming'), True, 180.0,
+                      {'cryptography.fernet': 25.0}),
+}
+
+def time_command(args, runs: int) -> float:
+    """多次运行取中位数(毫秒)"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def import_times(args, runs: int, top: int, watched=()):
+    """用 -X importtime 统计导入总耗时的中位数(毫秒)、自身耗时最多的模块，以及watched中各模块包含子模块的耗时"""
+    totals = []
+    slowest = {}
+    cumulative = {name: [] for name in watched}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-X', 'importtime'] + args, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, check=True).stderr
+        total = 0
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            total += int(self_us)
+            slowest.setdefault(name, []).append(int(self_us) / 1000)
+            if name in cumulative:
+                cumulative[name].append(int(cumulative_us) / 1000)
+        totals.append(total / 1000)
+    modules = sorted(((name, statistics.median(times)) for name, times in slowest.items()),
+                     key=lambda item: item[1], reverse=True)[:top]
+    watched_times = {name: statistics.median(times) if times else 0.0 for name, times in cumulative.items()}
+    return statistics.median(totals), dict(modules), watched_times
+
+def inspect_import(script: Path, forbidden) -> dict:
+    """导入入口模块后检查加载了哪些重量级模块，以及是否绑定了端口、配置了日志或创建了文件"""
+    code = (
+        "import json, logging, socket, sys, runpy\n"
+        "binds = []\n"
+        "_bind = socket.socket.bind\n"
+        "def bind(self, address):\n"
+        "    binds.append(address)\n"
+        "    return _bind(self, address)\n"
+        "socket.socket.bind = bind\n"
+        f"sys.path.insert(0, {str(script.parent)!r})\n"
+        f"runpy.run_path({str(script)!r}, run_name='not_main')\n"
+        "print(json.dumps({\n"
+        f"    'modules': [m for m in {tuple(forbidden)!r} if m in sys.modules],\n"
+        "    'binds': len(binds),\n"
+        "    'log_handlers': len(logging.getLogger().handlers)\n"
+        "}))"
+    )
+    before = set(path.name for path in script.parent.iterdir())
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=tmp)
+    created = sorted(path.name for path in script.parent.iterdir()
+                     if path.name not in before and path.name != '__pycache__')
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['created_files'] = created
+    result['stderr'] = output.stderr.strip()
+    return result
+
+def time_server_ready(runs: int) -> float:
+    """从启动服务器进程到开始accept的中位数(毫秒)，证书预先生成"""
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        cert, key = generate_cert(workdir)
+        for _ in range(runs):
+            port = free_port()
+            code = SERVER_CODE.format(server_dir=str(SERVER_DIR), port=port, cert=str(cert), key=str(key),
+                                      key_material=b'', options={}, setup='    pass')
+            started = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, '-c', code], cwd=workdir, env=server_env(workdir),
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                if not wait_for_port(port, interval=0.002):
+                    raise RuntimeError("server did not start")
+                samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                proc.terminate()
+                proc.wait()
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=150.0, help='相对空解释器的启动时间预算')
+    parser.add_argument('--ready-runs', type=int, default=5, help='测量服务器开始accept时间的次数，0为跳过')
+    parser.add_argument('--ready-budget-ms', type=float, default=400.0, help='服务器开始accept的时间预算')
+    parser.add_argument('--top', type=int, default=10, help='报告自身导入耗时最多的模块数')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    baseline = time_command(['-c', 'pass'], args.runs)
+    import_baseline, _, _ = import_times(['-c', 'pass'], args.runs, 0)
+    report = {'interpreter_ms': baseline, 'interpreter_import_ms': import_baseline, 'budget_ms': args.budget_ms,
+              'targets': {}}
+    failed = False
+    for name, (command, script, forbidden, pure, import_budget, module_budgets) in TARGETS.items():
+        elapsed = time_command(command, args.runs)
+        imported, slowest, watched = import_times(command, args.runs, args.top, module_budgets)
+        inspected = inspect_import(script, forbidden)
+        side_effects = pure and bool(inspected['binds'] or inspected['log_handlers'] or
+                                     inspected['created_files'] or inspected['stderr'])
+        modules_over = [module for module, budget in module_budgets.items() if watched[module] > budget]
+        over = (elapsed - baseline > args.budget_ms or imported - import_baseline > import_budget or
+                bool(inspected['modules']) or side_effects or bool(modules_over))
+        failed = failed or over
+        report['targets'][name] = {
+            'median_ms': elapsed,
+            'overhead_ms': elapsed - baseline,
+            'import_ms': imported,
+            'import_overhead_ms': imported - import_baseline,
+            'import_budget_ms': import_budget,
+            'slowest_imports_ms': slowest,
+            'heavy_modules': inspected['modules'],
+            'allowed_modules_ms': {module: {'import_ms': watched[module], 'budget_ms': budget}
+                                   for module, budget in module_budgets.items()},
+            'allowed_over_budget': modules_over,
+            'side_effects': {key: inspected[key] for key in ('binds', 'log_handlers', 'created_files', 'stderr')}
+                            if pure else None,
+            'within_budget': not over
+        }
+
+    if args.ready_runs > 0:
+        ready = time_server_ready(args.ready_runs)
+        over = ready > args.ready_budget_ms
+        failed = failed or over
+        report['server_ready'] = {'median_ms': ready, 'budget_ms': args.ready_budget_ms, 'within_budget': not over}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
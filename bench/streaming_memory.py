@@ -0,0 +1,142 @@
+"""流式加密内存基准: 比较整帧Fernet和分段流式AEAD处理大消息时的内存峰值
+
+进程内用tracemalloc测量加密+解密流水线的分配峰值；端到端时每种情况启动一个新的服务器，
+由客户端发送一条消息，测量服务器常驻内存峰值的增长。流式路径的峰值超出预算时返回非零，
+可用于CI中确认内存占用与消息大小无关
+
+用法: python bench/streaming_memory.py --sizes-mb 1 16 64 --fernet-sizes-mb 1 4 8 --budget-bytes 524288
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, ServerProcess
+from cryptography.fernet import Fernet
+from utils.streaming import SEGMENT_SIZE, decrypt_stream, encrypt_stream
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+
+# 生成消息的块大小，与分段大小错开以覆盖跨块拼接
+CHUNK_SIZE = 48 * 1024
+
+def message_chunks(size: int, block: bytes):
+    """按块产出size字节的消息，不在内存中构造整条消息"""
+    view = memoryview(block)
+    while size > 0:
+        yield view[:min(size, len(view))]
+        size -= len(view)
+
+def measure_streaming(key: bytes, size: int, segment_size: int, block: bytes) -> dict:
+    """加密分段直接送入解密，统计明文总量和分配峰值"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    received = 0
+    for data in decrypt_stream(key, encrypt_stream(key, message_chunks(size, block), segment_size)):
+        received += len(data)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if received != size:
+        raise RuntimeError(f"stream returned {received} of {size} bytes")
+    return {'peak_bytes': peak, 'mbytes_per_sec': size / elapsed / 1e6}
+
+def measure_fernet(key: bytes, size: int, block: bytes) -> dict:
+    """整帧路径: 拼出整条消息，加密得到base64令牌，再解密"""
+    cipher = Fernet(key)
+    tracemalloc.start()
+    started = time.perf_counter()
+    message = b''.join(message_chunks(size, block))
+    received = len(cipher.decrypt(cipher.encrypt(message)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if received != size:
+        raise RuntimeError(f"Fernet returned {received} of {size} bytes")
+    return {'peak_bytes': peak, 'mbytes_per_sec': size / elapsed / 1e6}
+
+async def send_message(port: int, key: str, size: int, streaming: bool, segment_size: int,
+                       block: bytes, timeout: float):
+    responses = asyncio.Queue()
+    client = TunnelClient('127.0.0.1', port, key, on_data=responses.put_nowait, compression=False,
+                          resumable=False, heartbeat_interval=0)
+    reader, writer = await client.connect()
+    serve = asyncio.create_task(client.serve(reader, writer))
+    # 让serve()接管连接并启动发送队列
+    await asyncio.sleep(0)
+    try:
+        if streaming:
+            await client.send_stream(message_chunks(size, block), segment_size=segment_size)
+        else:
+            await client.send(b''.join(message_chunks(size, block)), 'bulk')
+        await asyncio.wait_for(responses.get(), timeout)
+    finally:
+        writer.transport.abort()
+        await serve
+
+def measure_server(workdir: Path, size: int, streaming: bool, args, block: bytes) -> dict:
+    """在新的服务器上发送一条消息，返回服务器常驻内存峰值的增长"""
+    key_material = Fernet.generate_key()
+    with ServerProcess(workdir, key_material, engine=args.engine, compression=False) as server:
+        # 先发一条小消息，让连接建立和惰性导入计入基线
+        asyncio.run(send_message(server.port, key_material.decode(), 1024, streaming, args.segment_size,
+                                 block, args.timeout))
+        before = server.stats()['peak_rss_bytes']
+        started = time.perf_counter()
+        asyncio.run(send_message(server.port, key_material.decode(), size, streaming, args.segment_size,
+                                 block, args.timeout))
+        elapsed = time.perf_counter() - started
+        after = server.stats()['peak_rss_bytes']
+    return {'peak_rss_growth_bytes': after - before, 'mbytes_per_sec': size / elapsed / 1e6}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 16, 64], help='流式路径的消息大小')
+    parser.add_argument('--fernet-sizes-mb', type=int, nargs='+', default=[1, 4, 8],
+                        help='整帧Fernet路径的消息大小，令牌不能超过单帧上限16MB')
+    parser.add_argument('--segment-size', type=int, default=SEGMENT_SIZE)
+    parser.add_argument('--engine', default='stream', help='服务器引擎')
+    parser.add_argument('--timeout', type=float, default=60.0, help='等待响应的超时时间(秒)')
+    parser.add_argument('--budget-bytes', type=int, default=512 * 1024,
+                        help='流式路径进程内分配峰值的预算，0为不检查')
+    parser.add_argument('--server-budget-bytes', type=int, default=4 * 1024 * 1024,
+                        help='流式路径服务器常驻内存峰值增长的预算，0为不检查')
+    parser.add_argument('--skip-server', action='store_true', help='只运行进程内测量')
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    block = os.urandom(CHUNK_SIZE)
+    report = {'in_process': {'streaming': {}, 'fernet': {}}, 'server': {'streaming': {}, 'fernet': {}}}
+    for size_mb in args.sizes_mb:
+        report['in_process']['streaming'][f'{size_mb}MB'] = measure_streaming(
+            key, size_mb * 1024 * 1024, args.segment_size, block)
+    for size_mb in args.fernet_sizes_mb:
+        report['in_process']['fernet'][f'{size_mb}MB'] = measure_fernet(key, size_mb * 1024 * 1024, block)
+    if not args.skip_server:
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, streaming, sizes in (('streaming', True, args.sizes_mb),
+                                            ('fernet', False, args.fernet_sizes_mb)):
+                for size_mb in sizes:
+                    report['server'][label][f'{size_mb}MB'] = measure_server(
+                        Path(tmp), size_mb * 1024 * 1024, streaming, args, block)
+
+    worst = max(result['peak_bytes'] for result in report['in_process']['streaming'].values())
+    worst_server = max((result['peak_rss_growth_bytes'] for result in report['server']['streaming'].values()),
+                       default=0)
+    report['within_budget'] = ((args.budget_bytes <= 0 or worst <= args.budget_bytes) and
+                               (args.server_budget_bytes <= 0 or worst_server <= args.server_budget_bytes))
+    report['params'] = vars(args)
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
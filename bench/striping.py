@@ -0,0 +1,163 @@
+"""条带化吞吐量基准: 经过模拟高BDP链路的回环代理，比较不同并行连接数的吞吐量
+
+代理给每条TCP连接加上单向延迟，并限制每个方向在途字节数（模拟拥塞窗口），
+单条连接的吞吐上限约为 window / (2 * delay)。
+--lane-loss 改为检查连接丢失：服务端缩短心跳间隔并回显请求，发送途中切断一条连接，
+核对隧道继续工作、响应按序交付且不重复、断开的连接重连回来，不满足时返回非零
+
+用法: python bench/striping.py --connections 1 4 --delay-ms 25 --window-kb 64
+      python bench/striping.py --lane-loss --connections 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import CLIENT_DIR, DelayProxy, ServerProcess
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, str(CLIENT_DIR))
+
+from core import TunnelClient
+from striping import StripedTunnel
+
+async def measure(port: int, key: str, connections: int, size: int, duration: float) -> dict:
+    received = 0
+
+    def on_data(data: bytes):
+        nonlocal received
+        received += 1
+
+    client = TunnelClient('127.0.0.1', port, key, on_data=on_data)
+    tunnel = StripedTunnel(client, connections)
+    await tunnel.open()
+    payload = os.urandom(size)
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < duration:
+            await tunnel.send(payload)
+        elapsed = time.perf_counter() - started
+    finally:
+        await tunnel.close()
+    return {
+        'connections': connections,
+        'frames_acked': received,
+        'mbytes_per_sec': received * size / elapsed / 1e6
+    }
+
+# 服务端原样回显，响应中带着请求的编号；客户端的请求没有混淆，跳过服务端去混淆以保留编号
+ECHO = """
+    async def echo(data):
+        return data
+    server.process_client_data = echo
+    server.obfuscator.deobfuscate = lambda data, marker: data
+"""
+
+async def lane_loss(port: int, key: str, connections: int, rate: float, duration: float) -> dict:
+    """发送途中切断一条连接，统计交付、放弃的帧和连接数"""
+    delivered = []
+
+    def on_data(data: bytes):
+        # 服务端在响应前后加上等长的随机填充，编号在正中间
+        offset = (len(data) - 8) // 2
+        delivered.append(int.from_bytes(data[offset:offset + 8], 'big'))
+
+    client = TunnelClient('127.0.0.1', port, key, on_data=on_data)
+    tunnel = StripedTunnel(client, connections)
+    runner = asyncio.create_task(tunnel.run())
+    while len(tunnel.lanes) < connections and not runner.done():
+        await asyncio.sleep(0.01)
+    sent = send_errors = 0
+    delivered_at_loss = None
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < duration and not runner.done():
+            if delivered_at_loss is None and time.perf_counter() - started >= duration / 3:
+                delivered_at_loss = len(delivered)
+                tunnel.lanes[0].writer.transport.abort()
+            try:
+                await tunnel.send(sent.to_bytes(8, 'big'))
+            except ConnectionError:
+                send_errors += 1
+            sent += 1
+            await asyncio.sleep(1 / rate)
+        # 等待剩余的响应
+        await asyncio.sleep(1.0)
+        running = not runner.done()
+        lanes = len(tunnel.lanes)
+    finally:
+        tunnel.stop()
+        await asyncio.gather(runner, return_exceptions=True)
+    in_order = all(a < b for a, b in zip(delivered, delivered[1:]))
+    return {
+        'connections': connections,
+        'frames_sent': sent,
+        'frames_delivered': len(delivered),
+        'frames_lost': sent - len(delivered),
+        'send_errors': send_errors,
+        'delivered_after_loss': len(delivered) - (delivered_at_loss or 0),
+        'lanes_at_end': lanes,
+        'in_order': in_order,
+        'ok': running and in_order and lanes == connections and len(delivered) > (delivered_at_loss or 0)
+    }
+
+async def run_lane_loss(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    # 心跳间隔远小于测量时长：条带连接不回应PING时会被服务端当作失效连接关闭
+    with ServerProcess(workdir, key_material, setup=ECHO, engine=args.engine,
+                       heartbeat_interval=0.2, heartbeat_misses=3) as server:
+        # 经过代理的延迟让切断时连接上有尚未收到响应的帧
+        proxy = DelayProxy(server.port, args.delay_ms / 1000, args.window_kb * 1024)
+        await proxy.start()
+        try:
+            results = [await lane_loss(proxy.port, key_material.decode(), connections, args.rate, args.duration)
+                       for connections in args.connections if connections > 1]
+        finally:
+            proxy.close()
+    return {'delay_ms': args.delay_ms, 'results': results}
+
+async def run(args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    with ServerProcess(workdir, key_material, engine=args.engine) as server:
+        proxy = DelayProxy(server.port, args.delay_ms / 1000, args.window_kb * 1024)
+        await proxy.start()
+        try:
+            results = []
+            for connections in args.connections:
+                results.append(await measure(proxy.port, key_material.decode(), connections,
+                                             args.size, args.duration))
+        finally:
+            proxy.close()
+    return {
+        'delay_ms': args.delay_ms,
+        'window_kb': args.window_kb,
+        'frame_size': args.size,
+        'results': results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--delay-ms', type=float, default=25)
+    parser.add_argument('--window-kb', type=int, default=64)
+    parser.add_argument('--size', type=int, default=16384)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--engine', default='stream')
+    parser.add_argument('--lane-loss', action='store_true', help='检查发送途中丢失一条连接后的恢复')
+    parser.add_argument('--rate', type=float, default=200, help='--lane-loss时每秒发送的帧数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run((run_lane_loss if args.lane_loss else run)(args, Path(tmp)))
+    print(json.dumps(report, indent=2))
+    if args.lane_loss and not all(result['ok'] for result in report['results']):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
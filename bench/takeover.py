@@ -0,0 +1,169 @@
+"""平滑重启基准: N个客户端持续收发时升级服务器，比较直接重启和接管监听套接字两种方式
+
+restart: 终止旧进程后在同一端口启动新进程，所有客户端同时断开并在同一时刻重连；
+takeover: 新进程通过交接套接字接过监听套接字，旧进程停止accept并在--drain秒内逐步关闭现有连接。
+报告重连被拒绝的次数、客户端断开的时长、每100毫秒内新TLS握手数的峰值（握手尖峰）和连接关闭时未得到响应的请求
+
+用法: python bench/takeover.py --clients 200 --drain 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import SERVER_DIR, ServerProcess, client_ssl_context, percentile, server_env
+from cryptography.fernet import Fernet
+from utils.framing import FRAME_DATA, FRAME_HELLO, HEADER_SIZE, pack_frame, unpack_header
+
+TAKEOVER_CODE = """
+import asyncio, sys
+sys.path.insert(0, {server_dir!r})
+from main import CysteriaServer
+from utils.handover import take_over
+handover = take_over({path!r})
+if handover is None:
+    sys.exit(2)
+server = CysteriaServer('127.0.0.1', handover.port, certfile={cert!r}, keyfile={key!r},
+                        encryption_key={key_material!r}, handover=handover, **{options!r})
+asyncio.run(server.start())
+"""
+
+# 握手尖峰的统计窗口(秒)
+BUCKET = 0.1
+
+SSL_CONTEXT = client_ssl_context()
+
+class Clients:
+    """持续发送请求的客户端，连接断开后立即重连"""
+    def __init__(self, port: int, key_material: bytes, interval: float):
+        self.port = port
+        self.cipher = Fernet(key_material)
+        self.request = pack_frame(FRAME_DATA, self.cipher.encrypt(b'ping'))
+        self.interval = interval
+        self.running = True
+        self.handshakes = []
+        self.gaps = []
+        self.counters = {'requests': 0, 'responses': 0, 'interrupted': 0, 'refused': 0, 'reconnects': 0}
+
+    async def connect(self):
+        while self.running:
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', self.port, ssl=SSL_CONTEXT)
+                writer.write(pack_frame(FRAME_HELLO, b"CYS" + os.urandom(32)))
+                _, length = unpack_header(await reader.readexactly(HEADER_SIZE))
+                await reader.readexactly(length)
+            except (OSError, ssl.SSLError, asyncio.IncompleteReadError):
+                self.counters['refused'] += 1
+                await asyncio.sleep(0.05)
+                continue
+            self.handshakes.append(time.perf_counter())
+            return reader, writer
+        return None
+
+    async def client(self):
+        connection = await self.connect()
+        while connection is not None:
+            reader, writer = connection
+            try:
+                while self.running:
+                    self.counters['requests'] += 1
+                    writer.write(self.request)
+                    while True:
+                        frame_type, length = unpack_header(await reader.readexactly(HEADER_SIZE))
+                        await reader.readexactly(length)
+                        if frame_type == FRAME_DATA:
+                            break
+                    self.counters['responses'] += 1
+                    await asyncio.sleep(self.interval)
+                writer.transport.abort()
+                return
+            except (OSError, ssl.SSLError, asyncio.IncompleteReadError):
+                self.counters['interrupted'] += 1
+                writer.transport.abort()
+            disconnected = time.perf_counter()
+            self.counters['reconnects'] += 1
+            connection = await self.connect()
+            if connection is not None:
+                self.gaps.append((time.perf_counter() - disconnected) * 1000)
+
+def spawn_takeover(workdir: Path, key_material: bytes, path: Path, options: dict) -> subprocess.Popen:
+    code = TAKEOVER_CODE.format(server_dir=str(SERVER_DIR), path=str(path), cert=str(workdir / 'cert.pem'),
+                                key=str(workdir / 'key.pem'), key_material=key_material, options=options)
+    return subprocess.Popen([sys.executable, '-c', code], cwd=workdir, env=server_env(workdir),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def upgrade(mode: str, args, workdir: Path) -> dict:
+    key_material = Fernet.generate_key()
+    path = workdir / 'handover.sock'
+    options = {'handover_socket': str(path), 'drain_timeout': args.drain}
+    old = ServerProcess(workdir, key_material, **options).start()
+    new = None
+    clients = Clients(old.port, key_material, args.interval)
+    tasks = [asyncio.create_task(clients.client()) for _ in range(args.clients)]
+    try:
+        await asyncio.sleep(args.warmup)
+        started = time.perf_counter()
+        baseline = len(clients.handshakes)
+        if mode == 'restart':
+            old.stop()
+            new = ServerProcess(workdir, key_material, port=old.port, **options)
+            await asyncio.get_running_loop().run_in_executor(None, new.start)
+        else:
+            proc = spawn_takeover(workdir, key_material, path, options)
+            # 旧进程排空全部连接后退出
+            while old.proc.poll() is None and time.perf_counter() - started < args.drain + 10:
+                await asyncio.sleep(0.1)
+            new = ServerProcess(workdir, key_material, port=old.port)
+            new.proc = proc
+        # 等所有客户端重新连上
+        await asyncio.sleep(args.settle)
+        upgraded = time.perf_counter() - started
+    finally:
+        clients.running = False
+        await asyncio.gather(*tasks)
+        old.stop()
+        if new is not None:
+            new.stop()
+    reconnects = [at - started for at in clients.handshakes[baseline:]]
+    buckets = Counter(int(at / BUCKET) for at in reconnects)
+    clients.gaps.sort()
+    return {
+        'upgrade_seconds': upgraded,
+        'handshakes': len(reconnects),
+        'peak_handshakes_per_100ms': max(buckets.values(), default=0),
+        'disconnected_ms': {
+            'p50': percentile(clients.gaps, 0.50),
+            'p99': percentile(clients.gaps, 0.99),
+            'max': clients.gaps[-1] if clients.gaps else 0.0
+        },
+        **clients.counters
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.2, help='每个客户端的请求间隔(秒)')
+    parser.add_argument('--drain', type=float, default=5.0, help='旧进程排空连接的时限(秒)')
+    parser.add_argument('--warmup', type=float, default=2.0, help='升级前稳定运行的秒数')
+    parser.add_argument('--settle', type=float, default=2.0, help='升级完成后继续观察的秒数')
+    parser.add_argument('--modes', nargs='+', default=['restart', 'takeover'], choices=('restart', 'takeover'))
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            report[mode] = asyncio.run(upgrade(mode, args, Path(tmp)))
+    report['params'] = vars(args)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
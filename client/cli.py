@@ -0,0 +1,134 @@
+"""Cysteria命令行客户端，不加载任何GUI模块
+
+用法: python client/cli.py --server 1.2.3.4 --port 443 --key <ENCRYPTION_KEY>
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+from core import Config, ReconnectSupervisor, TunnelClient, setup_logging
+
+logger = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    """解析命令行参数，未指定的项依次从环境变量和配置文件中读取"""
+    parser = argparse.ArgumentParser(description='Cysteria VPN 命令行客户端')
+    parser.add_argument('--server', help='服务器地址')
+    parser.add_argument('--servers', help='多个服务器 host[:port],host[:port]，启动时测速选择最快的节点')
+    parser.add_argument('--port', type=int, help='服务器端口')
+    parser.add_argument('--key', help='加密密钥（与服务端的ENCRYPTION_KEY相同）')
+    parser.add_argument('--once', action='store_true', help='完成握手后立即退出，用于检查连通性')
+    parser.add_argument('--no-reconnect', action='store_true', help='连接断开后不自动重连')
+    parser.add_argument('--no-standby', action='store_true', help='不预热备用连接')
+    parser.add_argument('--connections', type=int, default=1, help='并行连接数，大于1时启用条带化')
+    parser.add_argument('--udp', action='store_true', help='使用UDP数据报隧道代替TLS连接')
+    parser.add_argument('--no-compression', action='store_true', help='不协商逐帧压缩')
+    parser.add_argument('--heartbeat', type=float, default=15.0, metavar='SECONDS',
+                        help='心跳间隔，连续3次未响应时断开重连，0为关闭')
+    parser.add_argument('--no-resume', action='store_true', help='断线重连后不恢复原会话')
+    parser.add_argument('--socket-profile', choices=('latency', 'throughput', 'low-memory'), default='latency',
+                        help='套接字调优档位：交互延迟优先、高带宽时延积链路或节省内存')
+    parser.add_argument('--no-priority', action='store_true', help='按先进先出发送，不区分交互和大块传输')
+    parser.add_argument('--rules', help='分流规则文件（DOMAIN-SUFFIX/IP-CIDR,值,DIRECT|TUNNEL）')
+    parser.add_argument('--export-pac', metavar='FILE', help='按分流规则导出PAC文件后退出')
+    parser.add_argument('--pac-proxy', metavar='HOST:PORT', help='PAC中走隧道的连接使用的HTTP代理地址')
+    parser.add_argument('--route', metavar='HOST', help='显示指定主机的分流结果后退出')
+    return parser.parse_args(argv)
+
+def resolve_settings(args) -> dict:
+    """合并命令行、环境变量和配置文件"""
+    config = Config()
+    settings = {
+        'host': args.server or os.getenv('SERVER_HOST') or config.config.get('server'),
+        'port': args.port or int(os.getenv('SERVER_PORT') or config.config.get('port') or 443),
+        'encryption_key': args.key or os.getenv('ENCRYPTION_KEY') or config.config.get('encryption_key'),
+        'cache_file': config.config_dir / 'servers_cache.json'
+    }
+    servers_text = args.servers or os.getenv('SERVERS')
+    if servers_text:
+        from servers import parse_servers
+        settings['servers'] = parse_servers(servers_text, settings['port'])
+    elif args.server or os.getenv('SERVER_HOST'):
+        settings['servers'] = [(settings['host'], settings['port'])]
+    else:
+        settings['servers'] = config.server_list()
+    if settings['servers']:
+        settings['host'], settings['port'] = settings['servers'][0]
+    return settings
+
+async def run_client(client: TunnelClient, args, servers=None, cache_file=None):
+    """运行客户端直到连接断开或收到退出信号"""
+    pool = None
+    if servers and len(servers) > 1:
+        from servers import ServerPool
+        pool = ServerPool(client, servers, cache_file)
+        await pool.select()
+    if args.once:
+        _, writer = await client.connect()
+        writer.close()
+        return
+    if args.udp:
+        from datagram import DatagramTunnel
+        runner = DatagramTunnel(client)
+    elif args.connections > 1:
+        from striping import StripedTunnel
+        runner = StripedTunnel(client, args.connections)
+    elif args.no_reconnect:
+        runner = client
+    else:
+        runner = ReconnectSupervisor(client, standby=not args.no_standby)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, runner.stop)
+        except NotImplementedError:
+            # Windows的事件循环不支持信号处理器
+            pass
+    if pool is not None and isinstance(runner, ReconnectSupervisor):
+        await pool.supervise(runner)
+    else:
+        await runner.run()
+
+def run_routing(args, settings) -> int:
+    """分流规则相关的离线命令"""
+    from routing import Router
+    router = Router()
+    if args.rules:
+        router.load_file(args.rules)
+    if args.route:
+        print(f"{args.route}: {router.route(args.route)}")
+    if args.export_pac:
+        # 隧道服务器不是HTTP代理，PAC只能指向用户自己提供的代理
+        if not args.pac_proxy:
+            logger.error("导出PAC需要用 --pac-proxy 指定HTTP代理地址")
+            return 2
+        router.write_pac(args.export_pac, args.pac_proxy)
+    return 0
+
+def main(argv=None) -> int:
+    """命令行入口"""
+    args = parse_args(argv)
+    setup_logging()
+    settings = resolve_settings(args)
+    if args.route or args.export_pac:
+        return run_routing(args, settings)
+    if not settings['host'] or not settings['encryption_key']:
+        logger.error("缺少服务器地址或加密密钥")
+        return 2
+
+    client = TunnelClient(settings['host'], settings['port'], settings['encryption_key'],
+                          compression=not args.no_compression, priority=not args.no_priority,
+                          heartbeat_interval=args.heartbeat, resumable=not args.no_resume,
+                          socket_profile=args.socket_profile)
+    try:
+        asyncio.run(run_client(client, args, settings['servers'], settings['cache_file']))
+    except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+        logger.error(f"连接错误: {str(e)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
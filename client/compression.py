@@ -0,0 +1,152 @@
+"""逐帧自适应压缩，与服务端 utils/compression.py 保持一致"""
+import logging
+import math
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 每帧明文前的1字节编码标记
+CODEC_NONE = 0x00
+CODEC_ZLIB = 0x01
+CODEC_ZSTD = 0x02
+
+CODEC_NAMES = {CODEC_NONE: 'none', CODEC_ZLIB: 'zlib', CODEC_ZSTD: 'zstd'}
+
+# 解压后的大小上限，防止解压炸弹
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+def supported_codecs() -> int:
+    """本端支持的压缩算法位掩码，握手时发送给对端"""
+    mask = 1 << CODEC_ZLIB
+    if zstandard is not None:
+        mask |= 1 << CODEC_ZSTD
+    return mask
+
+def choose_codec(peer_mask: int) -> int:
+    """从双方都支持的算法中选择最优的一个"""
+    common = peer_mask & supported_codecs()
+    for codec in (CODEC_ZSTD, CODEC_ZLIB):
+        if common & (1 << codec):
+            return codec
+    return CODEC_NONE
+
+ENTROPY_SAMPLE_SIZE = 512
+# c*log2(c) 查表，避免每次探测都做上百次对数运算
+_C_LOG_C = [0.0] + [c * math.log2(c) for c in range(1, ENTROPY_SAMPLE_SIZE + 1)]
+
+def estimate_entropy(data, sample_size: int = ENTROPY_SAMPLE_SIZE) -> float:
+    """估算数据开头sample_size字节的香农熵（比特/字节）"""
+    sample = bytes(data[:min(sample_size, ENTROPY_SAMPLE_SIZE)])
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return math.log2(total) - sum(map(_C_LOG_C.__getitem__, Counter(sample).values())) / total
+
+def decompress_frame(data) -> bytes:
+    """按帧首的编码标记解压，与压缩端的状态无关"""
+    if not data:
+        raise ValueError("Empty compressed frame")
+    codec = data[0]
+    body = bytes(data[1:])
+    if codec == CODEC_NONE:
+        return body
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Decompressed frame too large")
+        return result
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(body, max_output_size=MAX_DECOMPRESSED_SIZE)
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+class AdaptiveCompressor:
+    """单条连接单个方向的自适应压缩
+
+    先用熵估计跳过明显不可压缩的帧，再按压缩率的指数移动平均判断整条流是否值得压缩；
+    压缩率持续过高时暂停压缩，跳过backoff帧后重新探测
+    """
+    def __init__(self, codec: int = CODEC_ZLIB, level: Optional[int] = None, min_size: int = 256,
+                 entropy_threshold: float = 7.5, ratio_threshold: float = 0.9,
+                 probe_frames: int = 8, backoff: int = 256):
+        self.codec = codec
+        self.min_size = min_size
+        self.entropy_threshold = entropy_threshold
+        self.ratio_threshold = ratio_threshold
+        self.probe_frames = probe_frames
+        self.backoff = backoff
+        if codec == CODEC_ZSTD:
+            self._compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            self._compress = self._compressor.compress
+        else:
+            compress_level = 1 if level is None else level
+            self._compress = lambda data: zlib.compress(data, compress_level)
+        self.ratio = 1.0
+        self.enabled = codec != CODEC_NONE
+        self._probed = 0
+        self._skip = 0
+        # 统计
+        self.frames = 0
+        self.compressed_frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, data: bytes) -> bytes:
+        """压缩一帧，返回带编码标记的数据"""
+        self.frames += 1
+        self.bytes_in += len(data)
+        framed = self._encode(data)
+        self.bytes_out += len(framed)
+        return framed
+
+    def _encode(self, data: bytes) -> bytes:
+        if not self.enabled or len(data) < self.min_size:
+            return bytes([CODEC_NONE]) + data
+        if self._skip:
+            self._skip -= 1
+            return bytes([CODEC_NONE]) + data
+
+        start = time.thread_time()
+        if estimate_entropy(data) > self.entropy_threshold:
+            # 已压缩或加密的数据，不值得再压缩
+            self.cpu_time += time.thread_time() - start
+            self._observe(1.0)
+            return bytes([CODEC_NONE]) + data
+        compressed = self._compress(data)
+        self.cpu_time += time.thread_time() - start
+
+        self._observe(len(compressed) / len(data))
+        if len(compressed) >= len(data):
+            return bytes([CODEC_NONE]) + data
+        self.compressed_frames += 1
+        return bytes([self.codec]) + compressed
+
+    def _observe(self, ratio: float):
+        """更新压缩率的移动平均，流整体不可压缩时进入退避"""
+        self.ratio = 0.8 * self.ratio + 0.2 * ratio if self._probed else ratio
+        self._probed += 1
+        if self._probed >= self.probe_frames and self.ratio > self.ratio_threshold:
+            self._skip = self.backoff
+            self._probed = 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """压缩节省的字节数和CPU开销"""
+        return {
+            'codec': CODEC_NAMES[self.codec],
+            'frames': self.frames,
+            'compressed_frames': self.compressed_frames,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'saved_bytes': self.bytes_in - self.bytes_out,
+            'ratio': self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+            'cpu_ms': self.cpu_time * 1000
+        }
@@ -16,6 +16,7 @@ load_dotenv()
 # 客户端配置
 DEFAULT_SERVER_HOST = os.getenv('SERVER_HOST', 'localhost')
 DEFAULT_SERVER_PORT = int(os.getenv('SERVER_PORT', 443))
+ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', '')
 
 # 创建日志目录
 log_dir = Path(__file__).parent / 'logs'
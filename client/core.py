@@ -0,0 +1,717 @@
+"""客户端隧道引擎，不依赖任何GUI模块，可在无界面环境下运行"""
+import sys
+import os
+import json
+import asyncio
+import ssl
+import struct
+import logging
+import random
+import time
+import weakref
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Optional, Tuple
+
+from socket_tuning import get_profile, tune_connection
+
+logger = logging.getLogger(__name__)
+
+# 帧头: 1字节类型 + 4字节负载长度，与服务端 utils/framing.py 保持一致
+FRAME_HEADER = struct.Struct('!BI')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# 帧类型
+FRAME_DATA = 0x00
+FRAME_HELLO = 0x01
+FRAME_STRIPE = 0x02
+FRAME_PING = 0x03
+FRAME_PONG = 0x04
+
+FRAME_RESUME = 0x05
+FRAME_ACK = 0x06
+# 流式加密的分段，一条消息的首帧为流头
+FRAME_SEGMENT = 0x07
+
+# PING/PONG负载: 发送方的单调时钟（纳秒），对端原样回显
+PING_PAYLOAD = struct.Struct('!Q')
+
+# 可恢复会话，与服务端 utils/session.py 保持一致
+SESSION_RESUMABLE = 0x01
+ACK_PAYLOAD = struct.Struct('!Q')
+RESUME_REQUEST = struct.Struct('!32sQ')
+RESUME_REPLY = struct.Struct('!BQ')
+RESUME_TIMEOUT = 5.0
+ACK_EVERY = 16
+
+def setup_logging():
+    """配置日志"""
+    # 获取程序运行目录
+    if getattr(sys, 'frozen', False):
+        # 如果是打包后的exe
+        app_dir = Path(sys._MEIPASS)
+    else:
+        # 如果是开发环境
+        app_dir = Path(__file__).parent
+
+    # 创建日志目录
+    log_dir = app_dir / 'logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_dir / 'client.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+class CysteriaProtocol:
+    """Cysteria协议实现"""
+    def __init__(self):
+        self.version = "1.0"
+        self.magic = b"CYS"  # 协议魔数
+        
+    def generate_handshake(self, key: Optional[bytes] = None):
+        """生成握手数据，指定key时复用已有的会话密钥"""
+        # 生成随机密钥
+        key = key or os.urandom(32)
+        # 生成握手数据
+        handshake = self.magic + key
+        return handshake, key
+        
+    def encrypt_data(self, data, key):
+        """加密数据"""
+        return b''.join(self.encrypt_chunks([data], key))
+
+    def encrypt_chunks(self, chunks, key):
+        """逐块XOR加密，密钥位置跨块连续，每次只生成当前块的输出"""
+        offset = 0
+        for chunk in chunks:
+            size = len(chunk)
+            if not size:
+                continue
+            start = offset % len(key)
+            pad = (key[start:] + key * (size // len(key) + 1))[:size]
+            yield (int.from_bytes(chunk, 'big') ^ int.from_bytes(pad, 'big')).to_bytes(size, 'big')
+            offset += size
+        
+    def decrypt_data(self, data, key):
+        """解密数据"""
+        # XOR解密
+        return self.encrypt_data(data, key)
+        
+    def obfuscate_traffic(self, data):
+        """混淆流量"""
+        # 添加随机填充
+        padding = os.urandom(random.randint(1, 10))
+        return padding + data
+
+class Config:
+    """配置管理器"""
+    def __init__(self):
+        if getattr(sys, 'frozen', False):
+            # 如果是打包后的exe
+            self.config_dir = Path(os.environ['APPDATA']) / 'Cysteria'
+        else:
+            # 如果是开发环境
+            self.config_dir = Path(__file__).parent / 'config'
+        
+        self.config_dir.mkdir(parents=True, exist_ok=True)
+        self.config_file = self.config_dir / 'config.json'
+        self.load_config()
+    
+    def load_config(self):
+        """加载配置"""
+        try:
+            if self.config_file.exists():
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    self.config = json.load(f)
+            else:
+                self.config = {
+                    'server': '',
+                    'port': '',
+                    'encryption_key': '',
+                    'servers': [],
+                    'last_connected': False
+                }
+                self.save_config()
+        except Exception as e:
+            logger.error(f"加载配置失败: {str(e)}")
+            self.config = {
+                'server': '',
+                'port': '',
+                'encryption_key': '',
+                'servers': [],
+                'last_connected': False
+            }
+    
+    def server_list(self) -> list:
+        """配置中的所有服务器，servers列表为空时退回到单个server/port"""
+        from servers import parse_servers
+        servers = parse_servers(','.join(self.config.get('servers') or []))
+        if not servers and self.config.get('server'):
+            servers = parse_servers(self.config['server'], int(self.config.get('port') or 443))
+        return servers
+
+    def save_config(self):
+        """保存配置"""
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(self.config, f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"保存配置失败: {str(e)}")
+
+class TunnelClient:
+    """隧道客户端引擎
+
+    通过回调而不是Qt信号报告状态，GUI和命令行都只是它的驱动者
+    """
+    def __init__(self, host: str, port: int, encryption_key: str,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 on_log: Optional[Callable[[str], None]] = None,
+                 on_data: Optional[Callable[[bytes], None]] = None,
+                 compression: bool = True, priority: bool = True,
+                 heartbeat_interval: float = 15.0, heartbeat_misses: int = 3,
+                 resumable: bool = True, max_replay_frames: int = 256,
+                 max_replay_bytes: int = 1024 * 1024, socket_profile: str = 'latency'):
+        self.host = host
+        self.port = port
+        self.encryption_key = encryption_key
+        self.on_status = on_status
+        self.on_log = on_log
+        self.on_data = on_data
+        self.compression = compression
+        # 握手时服务端选定了压缩算法才会创建
+        self.compressor = None
+        self.priority = priority
+        # 套接字选项和读缓冲大小
+        self.socket_profile = get_profile(socket_profile)
+        # serve()期间的优先级发送队列
+        self.sender = None
+        # 每条连接一个，send_stream()在整条流发送期间持有，不同流的分段不会交错
+        self._stream_lock: Optional[asyncio.Lock] = None
+        # 心跳间隔为0时不发送PING
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_misses = heartbeat_misses
+        # 最近一次心跳测得的RTT(毫秒)
+        self.rtt: Optional[float] = None
+        # 提交发送和收到的帧字节数（含帧头），供界面计算吞吐量
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._last_seen = 0.0
+        self._server_responsive = False
+        # 可恢复会话：会话ID、两个方向的数据帧计数和未确认帧的重放缓冲
+        self.resumable = resumable
+        self.max_replay_frames = max_replay_frames
+        self.max_replay_bytes = max_replay_bytes
+        self.session_id: Optional[bytes] = None
+        self.sent_frames = 0
+        self.received_frames = 0
+        self.replay: Deque[Tuple[int, bytes]] = deque()
+        self._replay_bytes = 0
+        # serve()期间连接已接入会话
+        self._attached = False
+        # 服务端接受了会话恢复的连接 -> 握手使用的会话ID
+        self._session_keys = weakref.WeakKeyDictionary()
+        self.protocol = CysteriaProtocol()
+        self.running = False
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._cipher = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _status(self, status: str):
+        if self.on_status:
+            self.on_status(status)
+
+    def _log(self, message: str):
+        logger.info(message)
+        if self.on_log:
+            self.on_log(message)
+
+    @property
+    def cipher(self):
+        """延迟加载cryptography，缩短冷启动时间"""
+        if self._cipher is None:
+            from cryptography.fernet import Fernet
+            self._cipher = Fernet(self.encryption_key)
+        return self._cipher
+
+    async def open_connection(self, host: Optional[str] = None, port: Optional[int] = None,
+                              session_key: Optional[bytes] = None):
+        """建立TLS连接并完成握手，返回(reader, writer)，不替换当前连接
+
+        多条连接使用相同的session_key握手时，服务端把它们归入同一会话
+        """
+        # 创建SSL上下文
+        ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        
+        # 连接到服务器
+        reader, writer = await asyncio.open_connection(
+            host or self.host, port or self.port, ssl=ssl_context, limit=self.socket_profile.read_size
+        )
+        
+        try:
+            # 连接建立后才能设置收发缓冲，Linux按tcp_rmem上限通告窗口扩大因子，之后调大缓冲仍然有效
+            tune_connection(writer.get_extra_info('socket'), self.socket_profile)
+            
+            # 发送握手数据，会话密钥后附加本端支持的压缩算法和会话标志
+            handshake, key = self.protocol.generate_handshake(session_key)
+            # 条带连接共用会话密钥，不参与会话恢复
+            resumable = self.resumable and session_key is None
+            if self.compression or resumable:
+                codecs = 0
+                if self.compression:
+                    from compression import supported_codecs
+                    codecs = supported_codecs()
+                handshake += bytes([codecs])
+                if resumable:
+                    handshake += bytes([SESSION_RESUMABLE])
+            writer.write(FRAME_HEADER.pack(FRAME_HELLO, len(handshake)) + handshake)
+            await writer.drain()
+            
+            # 等待服务器响应
+            frame_type, response = await self.read_frame(reader)
+            if frame_type != FRAME_HELLO or response[:2] != b"OK":
+                raise ConnectionError("服务器握手失败")
+            self._setup_compression(response[2:3])
+            if resumable and len(response) >= 4 and response[3] & SESSION_RESUMABLE:
+                self._session_keys[writer] = key
+        except BaseException:
+            writer.close()
+            raise
+            
+        return reader, writer
+
+    def _setup_compression(self, codec: bytes):
+        """按服务端的握手回复启用或关闭压缩"""
+        if not codec or codec[0] == 0:
+            self.compressor = None
+        elif self.compressor is None or self.compressor.codec != codec[0]:
+            from compression import AdaptiveCompressor
+            self.compressor = AdaptiveCompressor(codec[0])
+
+    def encode(self, data: bytes) -> bytes:
+        """压缩（如已协商）并加密一帧"""
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        return self.cipher.encrypt(data)
+
+    def decode(self, token: bytes) -> bytes:
+        """解密并解压一帧"""
+        data = self.cipher.decrypt(token)
+        if self.compressor is not None:
+            from compression import decompress_frame
+            data = decompress_frame(data)
+        return data
+
+    async def connect(self):
+        """连接到VPN服务器并完成握手"""
+        self.reader, self.writer = await self.open_connection()
+        return self.reader, self.writer
+
+    async def read_frame(self, reader: asyncio.StreamReader):
+        """读取一帧，返回(类型, 负载)"""
+        header = await reader.readexactly(FRAME_HEADER.size)
+        frame_type, length = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise ConnectionError(f"帧过大: {length}")
+        return frame_type, await reader.readexactly(length)
+
+    async def send(self, data: bytes, hint: Optional[str] = None):
+        """加密并发送一帧数据
+
+        hint为流提示（如 "ssh"、"dns"、"bulk"），没有提示的帧按先进先出发送
+        """
+        token = self.encode(data)
+        frame = FRAME_HEADER.pack(FRAME_DATA, len(token)) + token
+        self.bytes_sent += len(frame)
+        if self.session_id is not None and not self._attached:
+            # 可恢复会话断线期间，帧进入重放缓冲，恢复后随未确认的帧一起补发
+            self._record_sent(frame)
+            return
+        if self.sender is not None:
+            from priority import classify
+            await self.sender.send(frame, classify(hint))
+            return
+        self._record_sent(frame)
+        self.writer.write(frame)
+        await self.writer.drain()
+
+    async def send_stream(self, chunks: Iterable[bytes], hint: Optional[str] = 'bulk',
+                          segment_size: Optional[int] = None):
+        """把任意大小的消息按固定大小的认证分段流式加密并发送，内存占用与消息大小无关
+
+        chunks可以是生成器，每个分段交给transport后才取下一块数据；分段不进入会话重放缓冲，
+        连接在发送途中断开时整条消息需要重新发送。服务端每条连接只有一个流解密器，
+        同一连接上的多条流依次发送，数据帧单独解密，可以插在分段之间
+        """
+        from streaming import SEGMENT_SIZE, encrypt_stream
+        if self.writer is None or not self._attached:
+            raise ConnectionError("未连接到服务器")
+        key = self.encryption_key.encode() if isinstance(self.encryption_key, str) else self.encryption_key
+        segment_size = segment_size or SEGMENT_SIZE
+        sender, writer = self.sender, self.writer
+        if sender is not None:
+            # 同一条流的所有分段使用同一优先级，保证按序到达
+            from priority import classify
+            priority = classify(hint)
+        async with self._stream_lock:
+            # 等待前一条流期间连接可能已经断开或被替换
+            if self.writer is not writer or not self._attached:
+                raise ConnectionError("连接已断开")
+            for segment in encrypt_stream(key, chunks, segment_size):
+                frame = FRAME_HEADER.pack(FRAME_SEGMENT, len(segment)) + segment
+                self.bytes_sent += len(frame)
+                if sender is not None:
+                    await sender.send(frame, priority)
+                else:
+                    writer.write(frame)
+                    await writer.drain()
+
+    def _record_sent(self, frame: bytes):
+        """按写出顺序给数据帧编号并保留到服务端确认"""
+        if self.session_id is None or frame[0] != FRAME_DATA:
+            return
+        self.sent_frames += 1
+        self.replay.append((self.sent_frames, frame))
+        self._replay_bytes += len(frame)
+        while len(self.replay) > self.max_replay_frames or self._replay_bytes > self.max_replay_bytes:
+            _, dropped = self.replay.popleft()
+            self._replay_bytes -= len(dropped)
+
+    def stats(self) -> dict:
+        """统计快照，只读取几个计数器，可以从其他线程定期调用"""
+        return {
+            'connected': self._attached,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'rtt_ms': self.rtt
+        }
+
+    def _acknowledge(self, count: int):
+        """丢弃服务端已确认的帧"""
+        while self.replay and self.replay[0][0] <= count:
+            _, frame = self.replay.popleft()
+            self._replay_bytes -= len(frame)
+
+    def _start_session(self, session_id: bytes):
+        self.session_id = session_id
+        self.sent_frames = 0
+        self.received_frames = 0
+        self.replay.clear()
+        self._replay_bytes = 0
+
+    async def _attach_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: bytes):
+        """新连接接入会话：首次连接建立会话，重连时请求服务端恢复原会话并补发未确认的帧"""
+        if self.session_id is None:
+            self._start_session(key)
+            return
+        request = RESUME_REQUEST.pack(self.session_id, self.received_frames)
+        writer.write(FRAME_HEADER.pack(FRAME_RESUME, len(request)) + request)
+        while True:
+            frame_type, payload = await self.read_frame(reader)
+            if frame_type == FRAME_RESUME:
+                break
+            self._handle_control(writer, frame_type, payload)
+        resumed, server_received = RESUME_REPLY.unpack(payload)
+        if not resumed:
+            if self.replay:
+                self._log(f"会话已过期，{len(self.replay)} 帧未确认的数据可能丢失")
+            self._start_session(key)
+            return
+        self._acknowledge(server_received)
+        if self.replay and self.replay[0][0] != server_received + 1:
+            self._log(f"重放缓冲已溢出，{self.replay[0][0] - server_received - 1} 帧数据丢失")
+        # 同步写出，期间不会插入新的数据帧
+        for _, frame in self.replay:
+            writer.write(frame)
+        self._log(f"会话已恢复，补发 {len(self.replay)} 帧")
+
+    def _handle_control(self, writer: asyncio.StreamWriter, frame_type: int, payload: bytes):
+        """处理服务端的控制帧"""
+        if frame_type == FRAME_PING:
+            writer.write(FRAME_HEADER.pack(FRAME_PONG, len(payload)) + payload)
+        elif frame_type == FRAME_PONG and len(payload) == PING_PAYLOAD.size:
+            (sent,) = PING_PAYLOAD.unpack(payload)
+            self.rtt = (time.monotonic_ns() - sent) / 1e6
+            self._server_responsive = True
+            logger.debug(f"心跳RTT: {self.rtt:.1f}ms")
+        elif frame_type == FRAME_ACK and len(payload) == ACK_PAYLOAD.size:
+            self._acknowledge(ACK_PAYLOAD.unpack(payload)[0])
+
+    async def _heartbeat(self, writer: asyncio.StreamWriter):
+        """定期发送PING，回应过PONG的服务器连续heartbeat_misses个间隔没有任何数据时断开连接"""
+        deadline = self.heartbeat_interval * self.heartbeat_misses
+        while not writer.is_closing():
+            await asyncio.sleep(self.heartbeat_interval)
+            if self._server_responsive and time.monotonic() - self._last_seen > deadline:
+                self._log(f"服务器 {self.heartbeat_misses} 次心跳未响应，断开连接")
+                # 对端已失联，不等待TLS关闭握手
+                writer.transport.abort()
+                return
+            payload = PING_PAYLOAD.pack(time.monotonic_ns())
+            writer.write(FRAME_HEADER.pack(FRAME_PING, len(payload)) + payload)
+
+    async def run(self):
+        """连接服务器并处理数据，直到连接断开或调用stop()"""
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        self._status("正在连接...")
+        self._log(f"正在连接到服务器 {self.host}:{self.port}")
+        try:
+            reader, writer = await self.connect()
+        except Exception as e:
+            self.running = False
+            self._log(f"连接错误: {str(e)}")
+            self._status("连接失败")
+            raise
+        
+        await self.serve(reader, writer)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """在已握手的连接上处理数据，直到连接断开或调用stop()"""
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        key = self._session_keys.pop(writer, None)
+        if key is not None:
+            try:
+                await asyncio.wait_for(self._attach_session(reader, writer, key), RESUME_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError, ssl.SSLError) as e:
+                self._log(f"会话恢复失败: {str(e) or type(e).__name__}")
+                writer.close()
+                return
+        # 从这里到发送队列启动之间没有await，补发的帧一定在新数据帧之前
+        self.reader, self.writer = reader, writer
+        self._attached = True
+        self._stream_lock = asyncio.Lock()
+        if self.priority:
+            from priority import PrioritySender
+            self.sender = PrioritySender(writer, on_write=self._record_sent)
+            self.sender.start()
+        self._last_seen = time.monotonic()
+        self._server_responsive = False
+        heartbeat = asyncio.create_task(self._heartbeat(writer)) if self.heartbeat_interval > 0 else None
+        self._status("已连接")
+        self._log("成功连接到服务器")
+        
+        try:
+            while self.running:
+                try:
+                    frame_type, payload = await self.read_frame(reader)
+                except (asyncio.IncompleteReadError, OSError, ssl.SSLError):
+                    # OSError包括连接错误和SSL关闭超时
+                    break
+                self._last_seen = time.monotonic()
+                self.bytes_received += FRAME_HEADER.size + len(payload)
+                if frame_type != FRAME_DATA:
+                    self._handle_control(writer, frame_type, payload)
+                    continue
+                if self.session_id is not None:
+                    self.received_frames += 1
+                    if self.received_frames % ACK_EVERY == 0:
+                        ack = ACK_PAYLOAD.pack(self.received_frames)
+                        writer.write(FRAME_HEADER.pack(FRAME_ACK, len(ack)) + ack)
+                    
+                # 解密数据
+                decrypted = self.decode(payload)
+                
+                # 处理数据
+                if self.on_data:
+                    self.on_data(decrypted)
+        finally:
+            self._attached = False
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if self.sender is not None:
+                if self.session_id is not None:
+                    # 还没写出的帧留到会话恢复后发送
+                    for frame in self.sender.take_pending():
+                        self._record_sent(frame)
+                await self.sender.close()
+                self.sender = None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+            self._status("已断开")
+            self._log("已断开连接")
+            if self.compressor is not None and self.compressor.frames:
+                stats = self.compressor.get_stats()
+                self._log(f"压缩({stats['codec']})节省 {stats['saved_bytes']}/{stats['bytes_in']} 字节，"
+                          f"CPU {stats['cpu_ms']:.1f}ms")
+
+    def stop(self):
+        """停止客户端，可以从其他线程调用"""
+        self.running = False
+        if self._loop is None or self.writer is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self.writer.close)
+        except RuntimeError:
+            # 事件循环已经结束
+            pass
+
+class Backoff:
+    """带抖动的指数退避，每次等待时间在 [d/2, d] 之间随机，d按倍数增长到上限"""
+    def __init__(self, base: float = 0.5, cap: float = 30.0, factor: float = 2.0):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        """返回下一次重试前的等待秒数"""
+        delay = min(self.cap, self.base * self.factor ** self.attempts)
+        self.attempts += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        """连接成功后重置"""
+        self.attempts = 0
+
+CONNECT_ERRORS = (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+class ReconnectSupervisor:
+    """连接监督器：断线后按退避策略自动重连
+
+    启用standby时在后台维持一条已完成TLS握手的备用连接，
+    主连接断开后直接提升备用连接，省去TCP+TLS+握手的等待
+    """
+    def __init__(self, client: TunnelClient, backoff: Optional[Backoff] = None,
+                 standby: bool = True, standby_target: Optional[Tuple[str, int]] = None):
+        self.client = client
+        self.backoff = backoff or Backoff()
+        self.standby_enabled = standby
+        self.standby_target = standby_target
+        self.failovers = 0
+        self.last_failover_ms: Optional[float] = None
+        self._standby: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._standby_task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def run(self):
+        """保持隧道在线，直到调用stop()"""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.client._status("正在连接...")
+        self.client._log(f"正在连接到服务器 {self.client.host}:{self.client.port}")
+        dropped_at = None
+        try:
+            while not self._stop_event.is_set():
+                conn = await self._take_standby()
+                if conn is None:
+                    conn = await self._connect_with_backoff()
+                    if conn is None:
+                        break
+                if self._stop_event.is_set():
+                    conn[1].close()
+                    break
+                if dropped_at is not None:
+                    self.last_failover_ms = (time.perf_counter() - dropped_at) * 1000
+                    self.failovers += 1
+                    self.client._log(f"连接已恢复，耗时 {self.last_failover_ms:.1f}ms")
+                self.backoff.reset()
+                self._ensure_standby()
+                await self.client.serve(*conn)
+                if self._stop_event.is_set():
+                    break
+                dropped_at = time.perf_counter()
+                self.client._status("重新连接中...")
+        finally:
+            await self._close_standby()
+
+    async def _wait_or_stop(self, delay: float) -> bool:
+        """等待delay秒，期间被stop()打断时返回True"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _connect_with_backoff(self):
+        """重试直到连接成功，被停止时返回None"""
+        while not self._stop_event.is_set():
+            try:
+                return await self.client.open_connection()
+            except CONNECT_ERRORS as e:
+                delay = self.backoff.next_delay()
+                self.client._log(f"连接失败: {str(e)}，{delay:.1f}秒后重试")
+                if await self._wait_or_stop(delay):
+                    return None
+        return None
+
+    def _ensure_standby(self):
+        if self.standby_enabled and self._standby_task is None:
+            self._standby_task = asyncio.create_task(self._keep_standby())
+
+    async def _keep_standby(self):
+        """在后台维持一条已握手的备用连接，被服务器关闭后重新预热"""
+        backoff = Backoff(self.backoff.base, self.backoff.cap, self.backoff.factor)
+        while not self._stop_event.is_set():
+            if self._standby is None:
+                host, port = self.standby_target or (None, None)
+                try:
+                    self._standby = await self.client.open_connection(host, port)
+                    backoff.reset()
+                except CONNECT_ERRORS:
+                    if await self._wait_or_stop(backoff.next_delay()):
+                        return
+                    continue
+            # 备用连接上只有服务端的心跳，按帧读取并回应，读到EOF说明连接已失效；
+            # 心跳帧在一个TLS记录中到达，被取出时不会停在半帧上
+            reader, writer = self._standby
+            try:
+                while True:
+                    frame_type, payload = await self.client.read_frame(reader)
+                    self.client._handle_control(writer, frame_type, payload)
+            except CONNECT_ERRORS:
+                pass
+            writer.close()
+            self._standby = None
+            if await self._wait_or_stop(backoff.next_delay()):
+                return
+
+    def set_standby_target(self, target: Optional[Tuple[str, int]]):
+        """切换备用连接的目标，已预热的旧目标连接会被关闭并重新预热"""
+        if target == self.standby_target:
+            return
+        self.standby_target = target
+        if self._standby is not None:
+            # 关闭后_keep_standby读到EOF，按新目标重新建立
+            self._standby[1].close()
+
+    async def _take_standby(self):
+        """取出可用的备用连接"""
+        if self._standby_task is not None:
+            self._standby_task.cancel()
+            try:
+                await self._standby_task
+            except asyncio.CancelledError:
+                pass
+            self._standby_task = None
+        conn, self._standby = self._standby, None
+        if conn is not None and not conn[1].is_closing():
+            return conn
+        return None
+
+    async def _close_standby(self):
+        conn = await self._take_standby()
+        if conn is not None:
+            conn[1].close()
+
+    def stop(self):
+        """停止监督器和当前连接，可以从其他线程调用"""
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass
+        self.client.stop()
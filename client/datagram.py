@@ -0,0 +1,345 @@
+"""UDP数据报隧道，避免在有丢包的链路上出现TCP-over-TCP的重传叠加"""
+import asyncio
+import errno
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from core import TunnelClient
+
+logger = logging.getLogger(__name__)
+
+# 以下编解码部分与服务端 utils/datagram.py 保持一致
+# 数据报头: 8字节会话ID + 8字节包序号 + 4字节消息ID + 分片序号 + 分片总数，整体作为AEAD附加数据
+PACKET_HEADER = struct.Struct('!8sQIBB')
+TAG_SIZE = 16
+# IPv6(40) + UDP(8)，按较大的IP头计算，IPv4下会多留出20字节余量
+IP_UDP_OVERHEAD = 48
+DEFAULT_MTU = 1400
+MIN_MTU = 576
+MAX_FRAGMENTS = 255
+
+# 方向前缀，保证同一会话两个方向的nonce不会重复
+CLIENT_TO_SERVER = b'C2S\x00'
+SERVER_TO_CLIENT = b'S2C\x00'
+
+# 控制数据报的分片总数为0，分片序号区分类型，数据报末尾是截断的HMAC
+# HELLO: 客户端随机数; WELCOME: 客户端随机数 + 服务端随机数; RESET: 服务端不认识该会话，包序号为被丢弃的数据报的序号
+PACKET_HELLO = 0
+PACKET_WELCOME = 1
+PACKET_RESET = 2
+HANDSHAKE_NONCE_SIZE = 16
+MAC_SIZE = 16
+
+# Linux下的PMTU相关选项
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+
+def derive_session_key(master_key: bytes, session_id: bytes, client_nonce: bytes, server_nonce: bytes) -> bytes:
+    """从主密钥、会话ID和握手双方的随机数派生每个会话独立的AEAD密钥
+
+    服务端随机数保证服务端每次建立会话（包括重启、交接或清理后）都使用新的密钥，包序号从0开始也不会重用nonce
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=session_id + client_nonce + server_nonce,
+        info=b'cysteria datagram'
+    ).derive(master_key)
+
+def derive_control_key(master_key: bytes) -> bytes:
+    """控制数据报的HMAC密钥"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'cysteria datagram control'
+    ).derive(master_key)
+
+def pack_control(key: bytes, session_id: bytes, kind: int, body: bytes = b'', seq: int = 0) -> bytes:
+    """构造控制数据报"""
+    header = PACKET_HEADER.pack(session_id, seq, 0, kind, 0)
+    return header + body + hmac.new(key, header + body, hashlib.sha256).digest()[:MAC_SIZE]
+
+def unpack_control(key: bytes, packet: bytes) -> Optional[Tuple[bytes, int, int, bytes]]:
+    """校验控制数据报，返回(会话ID, 类型, 包序号, 内容)，不是控制数据报或校验失败时返回None"""
+    if len(packet) < PACKET_HEADER.size + MAC_SIZE:
+        return None
+    session_id, seq, _, kind, count = PACKET_HEADER.unpack_from(packet)
+    if count != 0:
+        return None
+    expected = hmac.new(key, packet[:-MAC_SIZE], hashlib.sha256).digest()[:MAC_SIZE]
+    if not hmac.compare_digest(expected, packet[-MAC_SIZE:]):
+        return None
+    return session_id, kind, seq, packet[PACKET_HEADER.size:-MAC_SIZE]
+
+def max_fragment_payload(mtu: int) -> int:
+    """给定路径MTU时单个数据报可携带的明文字节数"""
+    return mtu - IP_UDP_OVERHEAD - PACKET_HEADER.size - TAG_SIZE
+
+def enable_pmtu_discovery(sock: socket.socket):
+    """设置DF位，超过路径MTU的发送会报EMSGSIZE而不是被分片"""
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+    except OSError:
+        pass
+
+def query_path_mtu(sock: socket.socket, default: int = DEFAULT_MTU) -> int:
+    """读取已connect的UDP套接字上内核记录的路径MTU，不支持时返回default"""
+    try:
+        return min(default, sock.getsockopt(socket.IPPROTO_IP, IP_MTU))
+    except OSError:
+        return default
+
+class ReplayWindow:
+    """滑动窗口防重放，用整数位图记录最近window个序号"""
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.highest = -1
+        self.bitmap = 0
+
+    def check_and_update(self, seq: int) -> bool:
+        """序号首次出现且未落到窗口之外时返回True并记录"""
+        if seq > self.highest:
+            shift = seq - self.highest
+            if shift >= self.window:
+                self.bitmap = 1
+            else:
+                self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.window) - 1)
+            self.highest = seq
+            return True
+        offset = self.highest - seq
+        if offset >= self.window:
+            return False
+        mask = 1 << offset
+        if self.bitmap & mask:
+            return False
+        self.bitmap |= mask
+        return True
+
+class PacketCodec:
+    """一个会话单方向的分片、加密与另一方向的解密、重组"""
+    def __init__(self, key: bytes, session_id: bytes, send_prefix: bytes, recv_prefix: bytes,
+                 mtu: int = DEFAULT_MTU, reassembly_timeout: float = 5.0):
+        self.aead = AESGCM(key)
+        self.session_id = session_id
+        self.send_prefix = send_prefix
+        self.recv_prefix = recv_prefix
+        self.mtu = mtu
+        self.reassembly_timeout = reassembly_timeout
+        self.send_seq = 0
+        self.next_message_id = 0
+        self.replay = ReplayWindow()
+        self.accepted = 0
+        # 消息ID -> (首个分片到达时间, 分片列表)
+        self.partial: Dict[int, Tuple[float, List[Optional[bytes]]]] = {}
+
+    def encode(self, message: bytes) -> List[bytes]:
+        """把一条消息切成不超过路径MTU的加密数据报"""
+        chunk = max_fragment_payload(self.mtu)
+        count = max(1, -(-len(message) // chunk))
+        if count > MAX_FRAGMENTS:
+            raise ValueError(f"Message too large for datagram transport: {len(message)}")
+        message_id = self.next_message_id
+        self.next_message_id = (self.next_message_id + 1) & 0xFFFFFFFF
+        view = memoryview(message)
+        packets = []
+        for index in range(count):
+            header = PACKET_HEADER.pack(self.session_id, self.send_seq, message_id, index, count)
+            nonce = self.send_prefix + self.send_seq.to_bytes(8, 'big')
+            self.send_seq += 1
+            packets.append(header + self.aead.encrypt(nonce, view[index * chunk:(index + 1) * chunk], header))
+        return packets
+
+    def decode(self, packet: bytes) -> Optional[bytes]:
+        """解密一个数据报，消息的最后一个分片到达时返回完整消息
+
+        认证失败或重放的数据报被丢弃并返回None
+        """
+        if len(packet) < PACKET_HEADER.size + TAG_SIZE:
+            return None
+        header = packet[:PACKET_HEADER.size]
+        session_id, seq, message_id, index, count = PACKET_HEADER.unpack(header)
+        if session_id != self.session_id or index >= count:
+            return None
+        nonce = self.recv_prefix + seq.to_bytes(8, 'big')
+        try:
+            plaintext = self.aead.decrypt(nonce, packet[PACKET_HEADER.size:], header)
+        except Exception:
+            return None
+        # 认证通过后再更新防重放窗口，伪造的数据报不能推动窗口
+        if not self.replay.check_and_update(seq):
+            return None
+        self.accepted += 1
+        if count == 1:
+            return plaintext
+        now = time.monotonic()
+        started, fragments = self.partial.setdefault(message_id, (now, [None] * count))
+        fragments[index] = plaintext
+        if all(fragment is not None for fragment in fragments):
+            del self.partial[message_id]
+            return b''.join(fragments)
+        self._expire(now)
+        return None
+
+    def _expire(self, now: float):
+        """丢弃超时仍未重组完成的消息"""
+        for message_id, (started, _) in list(self.partial.items()):
+            if now - started > self.reassembly_timeout:
+                del self.partial[message_id]
+
+    def lower_mtu(self):
+        """收到EMSGSIZE时降低路径MTU"""
+        self.mtu = max(MIN_MTU, self.mtu - 128)
+
+# 握手: 每次尝试等待WELCOME的时间(秒)和尝试次数
+HANDSHAKE_TIMEOUT = 1.0
+HANDSHAKE_ATTEMPTS = 5
+
+class DatagramTunnel(asyncio.DatagramProtocol):
+    """客户端UDP隧道：每个消息按路径MTU分片后独立加密发送
+
+    数据报传输不重传丢失的消息，可靠性交给隧道内部的应用层TCP。
+    会话由HELLO/WELCOME握手建立，服务端回复RESET（重启、交接或清理了空闲会话）时用新的会话ID重新握手
+    """
+    def __init__(self, client: TunnelClient, mtu: int = DEFAULT_MTU):
+        self.client = client
+        self.max_mtu = mtu
+        self.mtu = mtu
+        master_key = client.encryption_key
+        if isinstance(master_key, str):
+            master_key = master_key.encode()
+        self.master_key = master_key
+        self.control_key = derive_control_key(master_key)
+        self.session_id: Optional[bytes] = None
+        self.codec: Optional[PacketCodec] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._closed: Optional[asyncio.Future] = None
+        # 正在进行的握手: (会话ID, 客户端随机数, 等待WELCOME的future)
+        self._hello: Optional[Tuple[bytes, bytes, asyncio.Future]] = None
+        self._rehandshake: Optional[asyncio.Task] = None
+
+    async def open(self):
+        """创建已connect的UDP套接字，按内核记录的路径MTU设置分片大小，并完成握手"""
+        loop = asyncio.get_running_loop()
+        self._closed = loop.create_future()
+        await loop.create_datagram_endpoint(lambda: self, remote_addr=(self.client.host, self.client.port))
+        try:
+            await self.handshake()
+        except ConnectionError:
+            self.stop()
+            raise
+
+    async def handshake(self):
+        """用新的会话ID和随机数握手，超时重发HELLO，全部失败时抛出ConnectionError"""
+        loop = asyncio.get_running_loop()
+        session_id = os.urandom(8)
+        client_nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+        hello = pack_control(self.control_key, session_id, PACKET_HELLO, client_nonce)
+        try:
+            for _ in range(HANDSHAKE_ATTEMPTS):
+                waiter = loop.create_future()
+                self._hello = (session_id, client_nonce, waiter)
+                self.transport.sendto(hello)
+                try:
+                    server_nonce = await asyncio.wait_for(waiter, HANDSHAKE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    continue
+                key = derive_session_key(self.master_key, session_id, client_nonce, server_nonce)
+                self.session_id = session_id
+                self.codec = PacketCodec(key, session_id, CLIENT_TO_SERVER, SERVER_TO_CLIENT, self.mtu)
+                return
+        finally:
+            self._hello = None
+        raise ConnectionError("UDP握手超时")
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            enable_pmtu_discovery(sock)
+            self.mtu = query_path_mtu(sock, self.max_mtu)
+
+    def send(self, data: bytes):
+        """加密并发送一条消息，重新握手期间的消息被丢弃"""
+        if self.codec is None or self._rehandshake is not None:
+            return
+        for packet in self.codec.encode(data):
+            self.transport.sendto(packet)
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) >= PACKET_HEADER.size and PACKET_HEADER.unpack_from(data)[4] == 0:
+            self._handle_control(data)
+            return
+        if self.codec is None:
+            return
+        message = self.codec.decode(data)
+        if message is not None and self.client.on_data:
+            self.client.on_data(message)
+
+    def _handle_control(self, data: bytes):
+        control = unpack_control(self.control_key, data)
+        if control is None:
+            return
+        session_id, kind, seq, body = control
+        if kind == PACKET_WELCOME and self._hello is not None:
+            expected_id, client_nonce, waiter = self._hello
+            if (session_id == expected_id and body[:HANDSHAKE_NONCE_SIZE] == client_nonce and
+                    len(body) == 2 * HANDSHAKE_NONCE_SIZE and not waiter.done()):
+                waiter.set_result(body[HANDSHAKE_NONCE_SIZE:])
+        elif (kind == PACKET_RESET and self.codec is not None and session_id == self.session_id and
+              seq < self.codec.send_seq and self._rehandshake is None):
+            # 只响应针对本会话已发出的数据报的RESET
+            self.client._log("服务端已不认识当前UDP会话，重新握手")
+            self._rehandshake = asyncio.ensure_future(self._redo_handshake())
+
+    async def _redo_handshake(self):
+        try:
+            await self.handshake()
+        except ConnectionError as e:
+            self.client._log(f"UDP重新握手失败: {str(e)}")
+            self.stop()
+        finally:
+            self._rehandshake = None
+
+    def error_received(self, exc: Exception):
+        if isinstance(exc, OSError) and exc.errno == errno.EMSGSIZE:
+            if self.codec is None:
+                return
+            sock = self.transport.get_extra_info('socket')
+            self.codec.lower_mtu()
+            if sock is not None:
+                self.codec.mtu = min(self.codec.mtu, query_path_mtu(sock, self.max_mtu))
+            self.mtu = self.codec.mtu
+            logger.warning(f"数据报超过路径MTU，调整为 {self.codec.mtu}")
+        else:
+            logger.debug(f"数据报错误: {str(exc)}")
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    async def run(self):
+        """打开UDP隧道并等待停止"""
+        await self.open()
+        self.client._status("已连接")
+        self.client._log(f"UDP隧道已就绪，MTU {self.mtu}")
+        try:
+            await self._closed
+        finally:
+            self.client._status("已断开")
+
+    def stop(self):
+        """关闭UDP隧道"""
+        if self.transport is not None:
+            self.transport.close()
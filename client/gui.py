@@ -0,0 +1,249 @@
+"""Cysteria图形界面，只通过信号驱动 core.TunnelClient"""
+import sys
+import asyncio
+import logging
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                           QHBoxLayout, QPushButton, QLabel, QLineEdit,
+                           QPlainTextEdit, QSystemTrayIcon, QMenu, QAction,
+                           QMessageBox)
+from PyQt5.QtCore import Qt, QThread
+from PyQt5.QtGui import QIcon
+
+from core import Config, ReconnectSupervisor, TunnelClient
+from log_bridge import MAX_LOG_LINES, LogBridge, format_rate
+
+logger = logging.getLogger(__name__)
+
+class VPNClient(QThread):
+    """VPN客户端线程，隧道引擎的日志和状态交给LogBridge，由界面线程批量刷新"""
+    def __init__(self, host, port, encryption_key, bridge, servers=None, cache_file=None):
+        super().__init__()
+        self.bridge = bridge
+        self.host = host
+        self.port = port
+        self.servers = servers or []
+        self.cache_file = cache_file
+        self.running = False
+        self.system_proxy = None
+        self.tunnel = TunnelClient(host, port, encryption_key,
+                                   on_status=bridge.status,
+                                   on_log=bridge.log)
+        self.supervisor = ReconnectSupervisor(self.tunnel)
+        
+    def run(self):
+        """运行VPN客户端"""
+        try:
+            self.running = True
+            
+            # 系统代理（仅Windows）在选定节点后设置
+            from system_proxy import SystemProxy
+            self.system_proxy = SystemProxy()
+            
+            # 连接到VPN服务器，断线后自动重连
+            asyncio.run(self.run_tunnel())
+            
+        except Exception as e:
+            self.bridge.log(f"连接错误: {str(e)}")
+            self.bridge.status("连接失败")
+            # 清除系统代理
+            if self.system_proxy:
+                self.system_proxy.clear_proxy()
+        finally:
+            self.running = False
+            
+    def apply_proxy(self, server) -> bool:
+        """为当前节点设置系统代理，节点切换时重新设置"""
+        host, port = server
+        proxy_set = self.system_proxy.set_proxy(host, port)
+        if proxy_set:
+            self.bridge.log("系统代理设置成功")
+        else:
+            self.bridge.log("系统代理设置失败")
+        return proxy_set
+        
+    async def run_tunnel(self):
+        """多个服务器时先选择最快节点，设置系统代理后运行监督器，节点切换时更新系统代理"""
+        if len(self.servers) < 2:
+            if not self.apply_proxy((self.host, self.port)):
+                raise Exception("系统代理设置失败")
+            await self.supervisor.run()
+            return
+        from servers import ServerPool
+        pool = ServerPool(self.tunnel, self.servers, self.cache_file)
+        if not self.apply_proxy(await pool.select()):
+            raise Exception("系统代理设置失败")
+        pool.on_switch = self.apply_proxy
+        await pool.supervise(self.supervisor)
+
+    def stop(self):
+        """停止VPN客户端"""
+        self.running = False
+        self.supervisor.stop()
+        # 清除系统代理
+        if self.system_proxy is None:
+            return
+        if self.system_proxy.clear_proxy():
+            self.bridge.log("系统代理已清除")
+        else:
+            self.bridge.log("系统代理清除失败")
+
+class MainWindow(QMainWindow):
+    """主窗口"""
+    def __init__(self):
+        super().__init__()
+        self.vpn_client = None
+        self.config = Config()
+        self.init_ui()
+        
+    def init_ui(self):
+        """初始化用户界面"""
+        self.setWindowTitle('Cysteria VPN')
+        self.setFixedSize(400, 300)
+        
+        # 创建中央部件
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        
+        # 创建布局
+        layout = QVBoxLayout(central_widget)
+        
+        # 服务器设置
+        server_layout = QHBoxLayout()
+        server_label = QLabel('服务器地址:')
+        self.server_input = QLineEdit()
+        self.server_input.setPlaceholderText('输入服务器地址，多个用逗号分隔')
+        self.server_input.setText(self.config.config['server'])
+        server_layout.addWidget(server_label)
+        server_layout.addWidget(self.server_input)
+        layout.addLayout(server_layout)
+        
+        # 端口设置
+        port_layout = QHBoxLayout()
+        port_label = QLabel('端口:')
+        self.port_input = QLineEdit()
+        self.port_input.setPlaceholderText('输入端口号')
+        self.port_input.setText(self.config.config['port'])
+        port_layout.addWidget(port_label)
+        port_layout.addWidget(self.port_input)
+        layout.addLayout(port_layout)
+        
+        # 密钥设置
+        key_layout = QHBoxLayout()
+        key_label = QLabel('密钥:')
+        self.key_input = QLineEdit()
+        self.key_input.setPlaceholderText('与服务端相同的ENCRYPTION_KEY')
+        self.key_input.setEchoMode(QLineEdit.Password)
+        self.key_input.setText(self.config.config.get('encryption_key', ''))
+        key_layout.addWidget(key_label)
+        key_layout.addWidget(self.key_input)
+        layout.addLayout(key_layout)
+        
+        # 连接按钮
+        self.connect_button = QPushButton('连接')
+        self.connect_button.clicked.connect(self.toggle_connection)
+        layout.addWidget(self.connect_button)
+        
+        # 状态和实时吞吐量/延迟
+        self.stats_label = QLabel('未连接')
+        layout.addWidget(self.stats_label)
+        
+        # 日志显示，只保留最近MAX_LOG_LINES行
+        self.log_display = QPlainTextEdit()
+        self.log_display.setReadOnly(True)
+        self.log_display.setUndoRedoEnabled(False)
+        self.log_display.setMaximumBlockCount(MAX_LOG_LINES)
+        layout.addWidget(self.log_display)
+        
+        # 日志、状态和统计由LogBridge合并后定期刷新
+        self.bridge = LogBridge(parent=self)
+        self.bridge.messages_ready.connect(self.log_display.appendPlainText)
+        self.bridge.stats_updated.connect(self.update_stats)
+        
+        # 创建系统托盘图标，提示文字显示最新状态
+        self.create_tray_icon()
+        self.bridge.status_changed.connect(self.update_status)
+        
+        # 如果上次是连接状态，自动连接
+        if self.config.config['last_connected']:
+            self.toggle_connection()
+        
+    def create_tray_icon(self):
+        """创建系统托盘图标"""
+        self.tray_icon = QSystemTrayIcon(self)
+        self.tray_icon.setIcon(QIcon('client/assets/icon.ico'))
+        
+        # 创建托盘菜单
+        tray_menu = QMenu()
+        show_action = QAction('显示', self)
+        show_action.triggered.connect(self.show)
+        quit_action = QAction('退出', self)
+        quit_action.triggered.connect(self.close)
+        
+        tray_menu.addAction(show_action)
+        tray_menu.addAction(quit_action)
+        self.tray_icon.setContextMenu(tray_menu)
+        self.tray_icon.show()
+        
+    def toggle_connection(self):
+        """切换连接状态"""
+        if self.vpn_client and self.vpn_client.running:
+            self.vpn_client.stop()
+            self.connect_button.setText('连接')
+            self.config.config['last_connected'] = False
+            self.config.save_config()
+        else:
+            from servers import parse_servers
+            try:
+                port = int(self.port_input.text())
+                # 服务器地址可以填写多个，用逗号分隔，每个可以带 :端口
+                servers = parse_servers(self.server_input.text(), port)
+            except ValueError:
+                self.log_display.appendPlainText("错误：端口必须是数字")
+                return
+            if not servers:
+                self.log_display.appendPlainText("错误：请输入服务器地址")
+                return
+            host, port = servers[0]
+                
+            # 保存配置
+            self.config.config['server'] = self.server_input.text()
+            self.config.config['port'] = str(self.port_input.text())
+            self.config.config['servers'] = [f"{h}:{p}" for h, p in servers] if len(servers) > 1 else []
+            self.config.config['encryption_key'] = self.key_input.text()
+            self.config.config['last_connected'] = True
+            self.config.save_config()
+                
+            self.vpn_client = VPNClient(host, port, self.key_input.text(), self.bridge, servers,
+                                        self.config.config_dir / 'servers_cache.json')
+            self.bridge.set_stats_source(self.vpn_client.tunnel.stats)
+            self.vpn_client.start()
+            self.connect_button.setText('断开')
+            
+    def update_status(self, status):
+        """更新托盘图标的状态提示"""
+        self.tray_icon.setToolTip(f"Cysteria VPN - {status}")
+        
+    def update_stats(self, stats):
+        """更新吞吐量和延迟显示"""
+        if not stats['connected']:
+            self.stats_label.setText('未连接')
+            return
+        rtt = f"{stats['rtt_ms']:.0f}ms" if stats['rtt_ms'] is not None else '-'
+        self.stats_label.setText(f"上行 {format_rate(stats['send_rate'])}  "
+                                 f"下行 {format_rate(stats['recv_rate'])}  RTT {rtt}")
+        
+    def closeEvent(self, event):
+        """关闭窗口事件"""
+        if self.vpn_client and self.vpn_client.running:
+            self.vpn_client.stop()
+            self.config.config['last_connected'] = False
+            self.config.save_config()
+        self.bridge.stop()
+        event.accept()
+
+def main():
+    """启动图形界面"""
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    sys.exit(app.exec_())
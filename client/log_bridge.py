@@ -0,0 +1,120 @@
+"""隧道引擎到Qt界面的桥: 在任意线程收集日志和状态，由界面线程按固定间隔批量刷新"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# 刷新间隔(毫秒)，在察觉不到的延迟内合并这段时间的所有消息
+FLUSH_INTERVAL_MS = 100
+# 两次刷新之间最多积累的消息数，超出时丢弃最早的消息
+MAX_PENDING = 500
+# 日志视图最多保留的行数
+MAX_LOG_LINES = 1000
+# 读取统计快照的间隔(毫秒)
+STATS_INTERVAL_MS = 1000
+
+def format_rate(bytes_per_sec: float) -> str:
+    """把字节/秒格式化为便于阅读的速率"""
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bytes_per_sec < 1024:
+            return f"{bytes_per_sec:.0f} {unit}" if unit == 'B/s' else f"{bytes_per_sec:.1f} {unit}"
+        bytes_per_sec /= 1024
+    return f"{bytes_per_sec:.1f} GB/s"
+
+class LogBridge(QObject):
+    """批量、限速的日志和状态桥
+
+    log()和status()可以从任何线程调用，只在锁内追加到有界队列，不产生Qt事件；界面线程的定时器每interval毫秒
+    把积累的消息合并成一次messages_ready，状态只发出最新的一个，队列满时丢弃最早的消息并在下次刷新时注明条数。
+    设置了统计来源时每stats_interval毫秒读取一次快照，换算成上下行速率后发出stats_updated
+    """
+    messages_ready = pyqtSignal(str)
+    status_changed = pyqtSignal(str)
+    stats_updated = pyqtSignal(dict)
+
+    def __init__(self, interval: int = FLUSH_INTERVAL_MS, max_pending: int = MAX_PENDING,
+                 stats_interval: int = STATS_INTERVAL_MS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._pending: Deque[str] = deque(maxlen=max_pending)
+        self._dropped = 0
+        self._status: Optional[str] = None
+        self._stats_source: Optional[Callable[[], dict]] = None
+        self._last_stats = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(stats_interval)
+        self.stats_timer.timeout.connect(self.sample_stats)
+
+    def log(self, message: str):
+        """记录一条日志，可以从任何线程调用"""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(message)
+
+    def status(self, status: str):
+        """更新状态并记入日志，可以从任何线程调用"""
+        with self._lock:
+            self._status = status
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(f"状态: {status}")
+
+    def flush(self):
+        """在界面线程中发出积累的消息和最新状态"""
+        with self._lock:
+            if not self._pending and self._status is None:
+                return
+            messages = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+            status, self._status = self._status, None
+        if dropped:
+            messages.insert(0, f"（日志过多，省略了 {dropped} 条）")
+        if messages:
+            self.messages_ready.emit('\n'.join(messages))
+        if status is not None:
+            self.status_changed.emit(status)
+
+    def set_stats_source(self, source: Optional[Callable[[], dict]]):
+        """设置返回统计快照的函数（如TunnelClient.stats），None为停止读取"""
+        self._stats_source = source
+        self._last_stats = None
+        if source is None:
+            self.stats_timer.stop()
+        else:
+            self.stats_timer.start()
+            self.sample_stats()
+
+    def sample_stats(self):
+        """读取统计快照，与上一次比较得到上下行速率"""
+        if self._stats_source is None:
+            return
+        snapshot = self._stats_source()
+        now = time.monotonic()
+        send_rate = recv_rate = 0.0
+        if self._last_stats is not None:
+            last_time, last = self._last_stats
+            elapsed = now - last_time
+            if elapsed > 0:
+                send_rate = max(0, snapshot['bytes_sent'] - last['bytes_sent']) / elapsed
+                recv_rate = max(0, snapshot['bytes_received'] - last['bytes_received']) / elapsed
+        self._last_stats = (now, snapshot)
+        self.stats_updated.emit({
+            'connected': snapshot.get('connected', False),
+            'send_rate': send_rate,
+            'recv_rate': recv_rate,
+            'rtt_ms': snapshot.get('rtt_ms')
+        })
+
+    def stop(self):
+        """停止定时器并发出剩余的消息"""
+        self.timer.stop()
+        self.stats_timer.stop()
+        self.flush()
@@ -0,0 +1,187 @@
+"""连接内的优先级发送队列，队列与服务端 utils/priority.py 保持一致；流提示只在客户端使用，不随帧发送"""
+import asyncio
+import logging
+import socket
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 连接内的优先级：交互流量（按键、DNS等）严格优先，普通和大块传输按权重分享剩余带宽
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = ('interactive', 'normal', 'bulk')
+
+# 流提示到优先级的映射
+PRIORITY_HINTS = {
+    'interactive': PRIORITY_INTERACTIVE,
+    'ssh': PRIORITY_INTERACTIVE,
+    'dns': PRIORITY_INTERACTIVE,
+    'normal': PRIORITY_NORMAL,
+    'bulk': PRIORITY_BULK
+}
+
+# 普通和大块两级的字节权重，交互级不参与加权
+DEFAULT_WEIGHTS = {PRIORITY_NORMAL: 4, PRIORITY_BULK: 1}
+
+def classify(hint: Optional[str] = None) -> int:
+    """按流提示确定优先级
+
+    数据帧不携带流标识，没有提示的帧都归入普通级别并按先进先出发送；
+    只有调用方明确标注的流才会越过其他帧，对端按到达顺序响应
+    """
+    if hint is not None:
+        try:
+            return PRIORITY_HINTS[hint]
+        except KeyError:
+            logger.debug(f"未知的优先级提示: {hint}")
+    return PRIORITY_NORMAL
+
+class PriorityQueues:
+    """严格优先 + 加权的多级发送队列
+
+    交互级非空时总是先出队；普通和大块两级按字节赤字轮转，每轮各得 quantum*权重 字节的额度。
+    每条连接都有一个，空闲连接多时占用不可忽视，各级队列在第一次入队时才创建
+    """
+    __slots__ = ('weights', 'quantum', 'queues', 'deficits', 'weighted', '_current', '_length')
+
+    def __init__(self, weights: Optional[Dict[int, int]] = None, quantum: int = 16384):
+        self.weights = weights or DEFAULT_WEIGHTS
+        self.quantum = quantum
+        # 每级一个 (帧大小, 元素) 队列，未用过的级别为None
+        self.queues: List[Optional[Deque[Tuple[int, Any]]]] = [None] * len(PRIORITY_NAMES)
+        self.deficits = [0] * len(PRIORITY_NAMES)
+        self.weighted = sorted(self.weights)
+        self._current = len(self.weighted) - 1
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def push(self, item: Any, size: int, priority: int = PRIORITY_NORMAL):
+        queue = self.queues[priority]
+        if queue is None:
+            queue = self.queues[priority] = deque()
+        queue.append((size, item))
+        self._length += 1
+
+    def _select(self) -> int:
+        """下一个出队的级别，未出队前重复调用结果不变"""
+        if self.queues[PRIORITY_INTERACTIVE]:
+            return PRIORITY_INTERACTIVE
+        while True:
+            priority = self.weighted[self._current]
+            queue = self.queues[priority]
+            if queue and queue[0][0] <= self.deficits[priority]:
+                return priority
+            if not queue:
+                self.deficits[priority] = 0
+            # 额度不足，轮到下一级并给它补充额度
+            self._current = (self._current + 1) % len(self.weighted)
+            priority = self.weighted[self._current]
+            if self.queues[priority]:
+                self.deficits[priority] += self.quantum * self.weights[priority]
+
+    def peek(self) -> Any:
+        """队首元素，队列为空时返回None"""
+        if not self._length:
+            return None
+        return self.queues[self._select()][0][1]
+
+    def pop(self) -> Any:
+        """出队，队列为空时返回None"""
+        if not self._length:
+            return None
+        priority = self._select()
+        size, item = self.queues[priority].popleft()
+        if priority != PRIORITY_INTERACTIVE:
+            self.deficits[priority] -= size
+        self._length -= 1
+        return item
+
+    def queued(self) -> Dict[str, int]:
+        """各级排队的帧数"""
+        return {name: len(queue) if queue else 0 for name, queue in zip(PRIORITY_NAMES, self.queues)}
+
+class PrioritySender:
+    """连接的发送任务
+
+    帧先进入优先级队列，transport缓冲超过low_water时暂停写出，让积压留在这里按优先级出队，
+    而不是以先进先出的顺序堆在transport和内核发送缓冲中
+    """
+    def __init__(self, writer: asyncio.StreamWriter, low_water: int = 16384,
+                 weights: Optional[Dict[int, int]] = None,
+                 on_write: Optional[Callable[[bytes], None]] = None):
+        self.writer = writer
+        self.low_water = low_water
+        # 每帧实际写出时调用，可恢复会话据此按线上顺序给帧编号
+        self.on_write = on_write
+        self.frames = PriorityQueues(weights)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """收紧transport和内核的发送缓冲并启动发送任务"""
+        self.writer.transport.set_write_buffer_limits(high=self.low_water)
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None and hasattr(socket, 'TCP_NOTSENT_LOWAT'):
+            try:
+                # 内核中未发出的数据超过low_water时不再报告可写
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, self.low_water)
+            except OSError as e:
+                logger.debug(f"设置TCP_NOTSENT_LOWAT失败: {str(e)}")
+        self._task = asyncio.create_task(self._run())
+
+    async def send(self, frame: bytes, priority: int = PRIORITY_NORMAL):
+        """排队一帧，交给transport后返回"""
+        if self._task is None or self._task.done():
+            raise ConnectionError("发送任务已停止")
+        future = asyncio.get_running_loop().create_future()
+        self.frames.push((frame, future), len(frame), priority)
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        try:
+            while True:
+                if not self.frames:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, future = self.frames.pop()
+                if future.done():
+                    # 发送方已取消
+                    continue
+                if self.on_write is not None:
+                    self.on_write(frame)
+                self.writer.write(frame)
+                future.set_result(None)
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.debug(f"发送任务结束: {str(e)}")
+        finally:
+            self._fail_pending()
+
+    def take_pending(self) -> List[bytes]:
+        """按出队顺序取出尚未写出的帧，它们的发送方视为发送成功，由调用方负责重发"""
+        frames = []
+        while self.frames:
+            frame, future = self.frames.pop()
+            if not future.done():
+                future.set_result(None)
+                frames.append(frame)
+        return frames
+
+    def _fail_pending(self):
+        while self.frames:
+            _, future = self.frames.pop()
+            if not future.done():
+                future.set_exception(ConnectionError("连接已关闭"))
+
+    async def close(self):
+        """停止发送任务，排队中的帧以ConnectionError失败"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._fail_pending()
@@ -0,0 +1,326 @@
+"""分流规则引擎：域名后缀规则编译为反转标签的字典树，CIDR规则编译为路径压缩的基数树
+
+规则按 域名规则 -> IP规则 -> 默认动作 的顺序决定直连还是走隧道。这是离线的规则工具：
+隧道不转发单个连接，客户端的数据路径不使用它；route()用于命令行查询，
+to_pac()导出的PAC需要指向用户自己提供的HTTP代理
+"""
+import json
+import logging
+import socket
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIRECT = 'direct'
+TUNNEL = 'tunnel'
+
+# 规则文件中的动作名称
+ACTIONS = {'DIRECT': DIRECT, 'TUNNEL': TUNNEL, 'PROXY': TUNNEL}
+
+# 局域网和保留地址默认直连，避免绕道远程服务器
+LAN_CIDRS = (
+    '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8',
+    '169.254.0.0/16', '100.64.0.0/10', '::1/128', 'fc00::/7', 'fe80::/10'
+)
+LAN_DOMAINS = ('localhost', 'local', 'lan')
+
+class DomainTrie:
+    """按反转的域名标签组织的字典树，匹配最长的后缀规则
+
+    每个节点是一个dict，键为下一级标签，动作保存在键None下
+    """
+    def __init__(self):
+        self.root: Dict = {}
+        self.size = 0
+
+    def add(self, suffix: str, action: str):
+        """添加后缀规则，example.com 同时匹配 example.com 和 *.example.com"""
+        node = self.root
+        for label in reversed(suffix.lower().strip('.').lstrip('*.').split('.')):
+            node = node.setdefault(label, {})
+        if None not in node:
+            self.size += 1
+        node[None] = action
+
+    def match(self, host: str) -> Optional[str]:
+        """返回最长匹配后缀的动作，没有匹配时返回None"""
+        node = self.root
+        action = None
+        for label in reversed(host.lower().rstrip('.').split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            action = node.get(None, action)
+        return action
+
+class _RadixNode:
+    __slots__ = ('prefix', 'length', 'value', 'children')
+
+    def __init__(self, prefix: int, length: int, value: Optional[str] = None):
+        self.prefix = prefix
+        self.length = length
+        self.value = value
+        self.children: List[Optional['_RadixNode']] = [None, None]
+
+class RadixTree:
+    """路径压缩的二进制基数树，按最长前缀匹配
+
+    只在分叉处建立节点，10万条前缀的树高通常不超过20层
+    """
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = _RadixNode(0, 0)
+        self.size = 0
+
+    def add(self, prefix: int, length: int, value: str):
+        """添加前缀，prefix的主机位必须为0"""
+        bits = self.bits
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.size += 1
+                node.value = value
+                return
+            bit = (prefix >> (bits - node.length - 1)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _RadixNode(prefix, length, value)
+                self.size += 1
+                return
+            # prefix与child最高位起相同的位数
+            limit = child.length if child.length < length else length
+            common = bits - (child.prefix ^ prefix).bit_length()
+            if common >= limit:
+                if limit == child.length:
+                    node = child
+                    continue
+                common = limit
+            # 在common处分叉，插入新的中间节点
+            mask = ((1 << common) - 1) << (bits - common)
+            branch = _RadixNode(prefix & mask, common, value if common == length else None)
+            branch.children[(child.prefix >> (bits - common - 1)) & 1] = child
+            if common != length:
+                branch.children[(prefix >> (bits - common - 1)) & 1] = _RadixNode(prefix, length, value)
+            node.children[bit] = branch
+            self.size += 1
+            return
+
+    def match(self, address: int) -> Optional[str]:
+        """最长前缀匹配"""
+        node = self.root
+        value = node.value
+        bits = self.bits
+        while node.length < bits:
+            node = node.children[(address >> (bits - node.length - 1)) & 1]
+            if node is None or (address ^ node.prefix) >> (bits - node.length):
+                break
+            if node.value is not None:
+                value = node.value
+        return value
+
+def parse_address(host: str) -> Optional[Tuple[int, int]]:
+    """把IP字符串解析为(位数, 整数)，不是IP时返回None"""
+    try:
+        return 32, int.from_bytes(socket.inet_pton(socket.AF_INET, host), 'big')
+    except OSError:
+        pass
+    try:
+        return 128, int.from_bytes(socket.inet_pton(socket.AF_INET6, host.strip('[]')), 'big')
+    except OSError:
+        return None
+
+def parse_cidr(cidr: str) -> Tuple[int, int, int]:
+    """解析CIDR，返回(位数, 网络地址整数, 前缀长度)"""
+    address, _, length = cidr.partition('/')
+    parsed = parse_address(address)
+    if parsed is None:
+        raise ValueError(f"无效的CIDR: {cidr}")
+    bits, value = parsed
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError(f"无效的前缀长度: {cidr}")
+    # 清除主机位
+    value &= ((1 << length) - 1) << (bits - length)
+    return bits, value, length
+
+class Router:
+    """分流路由器：决定一个主机直连还是走隧道，并导出同样规则的PAC"""
+    def __init__(self, default: str = TUNNEL, bypass_lan: bool = True):
+        self.default = default
+        self.domains = DomainTrie()
+        self.ipv4 = RadixTree(32)
+        self.ipv6 = RadixTree(128)
+        if bypass_lan:
+            for cidr in LAN_CIDRS:
+                self.add_cidr(cidr, DIRECT)
+            for domain in LAN_DOMAINS:
+                self.add_domain(domain, DIRECT)
+
+    def add_domain(self, suffix: str, action: str):
+        """添加域名后缀规则"""
+        self.domains.add(suffix, action)
+
+    def add_cidr(self, cidr: str, action: str):
+        """添加IPv4或IPv6网段规则"""
+        bits, value, length = parse_cidr(cidr)
+        (self.ipv4 if bits == 32 else self.ipv6).add(value, length, action)
+
+    def load_rules(self, lines: Iterable[str]) -> int:
+        """加载规则，每行格式为 类型,值,动作，返回加载的规则数
+
+        类型为 DOMAIN-SUFFIX、IP-CIDR 或 IP-CIDR6，动作为 DIRECT 或 TUNNEL(PROXY)；
+        单独一行 FINAL,动作 设置默认动作，#开头的行为注释
+        """
+        count = 0
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split(',')]
+            try:
+                if parts[0].upper() == 'FINAL':
+                    self.default = ACTIONS[parts[1].upper()]
+                    continue
+                kind, value, action = parts[0].upper(), parts[1], ACTIONS[parts[2].upper()]
+                if kind == 'DOMAIN-SUFFIX':
+                    self.add_domain(value, action)
+                elif kind in ('IP-CIDR', 'IP-CIDR6'):
+                    self.add_cidr(value, action)
+                else:
+                    raise ValueError(f"未知的规则类型: {kind}")
+                count += 1
+            except (IndexError, KeyError, ValueError) as e:
+                logger.warning(f"忽略第{lineno}行的无效规则 {line!r}: {str(e)}")
+        return count
+
+    def load_file(self, path: Path) -> int:
+        """从文件加载规则"""
+        with open(path, 'r', encoding='utf-8') as f:
+            count = self.load_rules(f)
+        logger.info(f"已加载 {count} 条分流规则: {path}")
+        return count
+
+    def match_address(self, host: str) -> Optional[str]:
+        """host是IP地址时按网段规则匹配"""
+        parsed = parse_address(host)
+        if parsed is None:
+            return None
+        bits, value = parsed
+        return (self.ipv4 if bits == 32 else self.ipv6).match(value)
+
+    def route(self, host: str, address: Optional[str] = None) -> str:
+        """决定一个主机的去向
+
+        host可以是域名或IP；address为已解析的IP时在域名规则未命中后参与网段匹配
+        """
+        action = self.match_address(host)
+        if action is not None:
+            return action
+        action = self.domains.match(host)
+        if action is not None:
+            return action
+        if address is not None:
+            action = self.match_address(address)
+            if action is not None:
+                return action
+        return self.default
+
+    def _ipv4_tables(self) -> Dict[int, Dict[str, str]]:
+        """把IPv4基数树展开为 前缀长度 -> {网络号: 动作}，供PAC按最长前缀查表"""
+        tables: Dict[int, Dict[str, str]] = {}
+        stack = [self.ipv4.root]
+        while stack:
+            node = stack.pop()
+            if node.value is not None:
+                tables.setdefault(node.length, {})[str(node.prefix >> (32 - node.length) if node.length else 0)] = node.value
+            stack.extend(child for child in node.children if child is not None)
+        return tables
+
+    def to_pac(self, proxy: str) -> str:
+        """导出PAC文件，proxy为走隧道的连接使用的HTTP代理地址(host:port)
+
+        PAC中只包含IPv4网段规则；只有存在网段规则时才会对域名调用dnsResolve
+        """
+        domains = {}
+        stack = [((), self.domains.root)]
+        while stack:
+            labels, node = stack.pop()
+            for label, child in node.items():
+                if label is None:
+                    domains['.'.join(reversed(labels))] = child
+                else:
+                    stack.append((labels + (label,), child))
+        tables = self._ipv4_tables()
+        lengths = sorted(tables, reverse=True)
+        return PAC_TEMPLATE % {
+            'proxy': json.dumps(f"PROXY {proxy}"),
+            'default': json.dumps(self.default),
+            'domains': json.dumps(domains, separators=(',', ':')),
+            'lengths': json.dumps(lengths),
+            'tables': json.dumps({str(length): tables[length] for length in lengths}, separators=(',', ':'))
+        }
+
+    def write_pac(self, path: Path, proxy: str) -> Path:
+        """把PAC写入文件"""
+        path = Path(path)
+        path.write_text(self.to_pac(proxy), encoding='utf-8')
+        logger.info(f"PAC文件已导出: {path}")
+        return path
+
+PAC_TEMPLATE = """var PROXY = %(proxy)s;
+var DEFAULT_ACTION = %(default)s;
+var DOMAINS = %(domains)s;
+var LENGTHS = %(lengths)s;
+var TABLES = %(tables)s;
+
+function decide(action) {
+    return action === "direct" ? "DIRECT" : PROXY;
+}
+
+function ipv4ToInt(ip) {
+    var parts = ip.split(".");
+    if (parts.length !== 4) return -1;
+    var value = 0;
+    for (var i = 0; i < 4; i++) {
+        var part = parseInt(parts[i], 10);
+        if (isNaN(part) || part < 0 || part > 255) return -1;
+        value = value * 256 + part;
+    }
+    return value;
+}
+
+function matchAddress(ip) {
+    var value = ipv4ToInt(ip);
+    if (value < 0) return null;
+    for (var i = 0; i < LENGTHS.length; i++) {
+        var length = LENGTHS[i];
+        var key = length ? Math.floor(value / Math.pow(2, 32 - length)) : 0;
+        var action = TABLES[length][key];
+        if (action) return action;
+    }
+    return null;
+}
+
+function FindProxyForURL(url, host) {
+    host = host.toLowerCase();
+    var action = matchAddress(host);
+    if (action) return decide(action);
+    var suffix = host;
+    while (true) {
+        if (DOMAINS.hasOwnProperty(suffix)) return decide(DOMAINS[suffix]);
+        var dot = suffix.indexOf(".");
+        if (dot < 0) break;
+        suffix = suffix.substring(dot + 1);
+    }
+    if (LENGTHS.length) {
+        var resolved = dnsResolve(host);
+        if (resolved) {
+            action = matchAddress(resolved);
+            if (action) return decide(action);
+        }
+    }
+    return decide(DEFAULT_ACTION);
+}
+"""
@@ -0,0 +1,200 @@
+"""多服务器列表：并发测速、选择最快节点，并把测速结果带TTL缓存在配置目录"""
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core import CONNECT_ERRORS, FRAME_DATA, FRAME_HEADER, ReconnectSupervisor, TunnelClient
+
+logger = logging.getLogger(__name__)
+
+Server = Tuple[str, int]
+
+def parse_servers(text: str, default_port: int = 443) -> List[Server]:
+    """解析 "host[:port],host[:port]" 格式的服务器列表，IPv6地址写作 [addr]:port"""
+    servers = []
+    for item in text.replace(' ', ',').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, port = item, default_port
+        if item.startswith('['):
+            host, _, rest = item[1:].partition(']')
+            if rest.startswith(':'):
+                port = int(rest[1:])
+        elif item.count(':') == 1:
+            host, port_text = item.split(':')
+            port = int(port_text)
+        servers.append((host, int(port)))
+    return servers
+
+class ServerProber:
+    """并发测量每个服务器的TCP+TLS+握手耗时和一个小数据样本的往返吞吐量
+
+    得分为 建连耗时 + 样本传输耗时，越小越好
+    """
+    def __init__(self, client: TunnelClient, sample_frames: int = 8, frame_size: int = 8192,
+                 timeout: float = 5.0, settle: float = 0.5):
+        self.client = client
+        self.settle = settle
+        self.sample_frames = sample_frames
+        self.frame_size = frame_size
+        self.timeout = timeout
+
+    async def probe(self, host: str, port: int) -> Dict:
+        """测量单个服务器，失败时返回ok为False的结果"""
+        result = {'host': host, 'port': port, 'ok': False, 'probed_at': time.time()}
+        try:
+            result.update(await asyncio.wait_for(self._measure(host, port), self.timeout))
+            result['ok'] = True
+        except (asyncio.TimeoutError, *CONNECT_ERRORS) as e:
+            result['error'] = str(e) or type(e).__name__
+        return result
+
+    async def _measure(self, host: str, port: int) -> Dict:
+        # 独立的客户端实例，不影响主连接的压缩状态
+        prober = TunnelClient(host, port, self.client.encryption_key, compression=False, resumable=False)
+        started = time.perf_counter()
+        reader, writer = await prober.open_connection()
+        connect_ms = (time.perf_counter() - started) * 1000
+        try:
+            # 随机数据不可压缩，测到的是链路本身的吞吐
+            frame = prober.encode(os.urandom(self.frame_size))
+            started = time.perf_counter()
+            writer.write((FRAME_HEADER.pack(FRAME_DATA, len(frame)) + frame) * self.sample_frames)
+            await writer.drain()
+            for _ in range(self.sample_frames):
+                await prober.read_frame(reader)
+            sample_ms = (time.perf_counter() - started) * 1000
+        finally:
+            writer.close()
+        return {
+            'connect_ms': connect_ms,
+            'sample_ms': sample_ms,
+            'throughput_kbps': self.sample_frames * len(frame) * 8 / max(sample_ms, 0.001),
+            'score': connect_ms + sample_ms
+        }
+
+    async def probe_all(self, servers: Sequence[Server]) -> List[Dict]:
+        """并发测量所有服务器，按得分排序，不可达的排在最后
+
+        第一个节点测速成功后，其余节点最多再等settle秒，卡住的节点不拖慢选择
+        """
+        tasks = {asyncio.ensure_future(self.probe(host, port)): (host, port) for host, port in servers}
+        pending = set(tasks)
+        deadline = None
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            if deadline is None and any(task.result()['ok'] for task in done):
+                deadline = time.perf_counter() + self.settle
+        results = []
+        for task, (host, port) in tasks.items():
+            if task in pending:
+                task.cancel()
+                results.append({'host': host, 'port': port, 'ok': False, 'probed_at': time.time(),
+                                'error': '测速超时'})
+            else:
+                results.append(task.result())
+        return sorted(results, key=lambda r: (not r['ok'], r.get('score', 0)))
+
+class ServerPool:
+    """管理服务器列表：启动时用缓存或测速选出最快节点，运行中定期重新测速并切换备用连接目标"""
+    def __init__(self, client: TunnelClient, servers: Sequence[Server], cache_file: Optional[Path] = None,
+                 ttl: float = 600.0, interval: float = 300.0, prober: Optional[ServerProber] = None):
+        self.client = client
+        self.servers = list(dict.fromkeys(servers))
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.interval = interval
+        self.prober = prober or ServerProber(client)
+        self.results: List[Dict] = []
+        # 最快节点变化时以新节点(host, port)调用，GUI用它更新系统代理
+        self.on_switch: Optional[Callable[[Server], None]] = None
+
+    def load_cache(self) -> Optional[List[Dict]]:
+        """读取未过期且与当前服务器列表一致的测速结果"""
+        if self.cache_file is None or not self.cache_file.exists():
+            return None
+        try:
+            cache = json.loads(self.cache_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取测速缓存失败: {str(e)}")
+            return None
+        if time.time() - cache.get('probed_at', 0) > self.ttl:
+            return None
+        results = cache.get('results', [])
+        if {(r['host'], r['port']) for r in results} != set(self.servers):
+            return None
+        return results
+
+    def save_cache(self):
+        """保存测速结果"""
+        if self.cache_file is None:
+            return
+        try:
+            self.cache_file.write_text(json.dumps({'probed_at': time.time(), 'results': self.results},
+                                                  indent=4, ensure_ascii=False), encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"保存测速缓存失败: {str(e)}")
+
+    def best(self) -> Server:
+        """当前最快的可用节点，全部不可达时返回列表中的第一个"""
+        for result in self.results:
+            if result['ok']:
+                return result['host'], result['port']
+        return self.servers[0]
+
+    async def refresh(self) -> Server:
+        """重新测速并保存缓存"""
+        self.results = await self.prober.probe_all(self.servers)
+        self.save_cache()
+        for result in self.results:
+            if result['ok']:
+                self.client._log(f"节点 {result['host']}:{result['port']} "
+                                 f"建连 {result['connect_ms']:.0f}ms，"
+                                 f"吞吐 {result['throughput_kbps'] / 1000:.1f}Mbps")
+            else:
+                self.client._log(f"节点 {result['host']}:{result['port']} 不可达: {result.get('error')}")
+        return self.best()
+
+    async def select(self) -> Server:
+        """启动时选择节点：缓存有效时直接使用，否则先测速"""
+        cached = self.load_cache()
+        if cached is not None:
+            self.results = cached
+            best = self.best()
+            self.client._log(f"使用缓存的测速结果，最快节点 {best[0]}:{best[1]}")
+        elif len(self.servers) > 1:
+            best = await self.refresh()
+        else:
+            best = self.servers[0]
+        self.client.host, self.client.port = best
+        return best
+
+    async def monitor(self, supervisor: ReconnectSupervisor):
+        """定期重新测速，最快节点变化时切换备用连接和重连目标，当前连接不受影响"""
+        while True:
+            await asyncio.sleep(self.interval)
+            best = await self.refresh()
+            if best != (self.client.host, self.client.port):
+                self.client._log(f"最快节点变为 {best[0]}:{best[1]}，下次切换时生效")
+                self.client.host, self.client.port = best
+                if self.on_switch is not None:
+                    self.on_switch(best)
+            supervisor.set_standby_target(best)
+
+    async def supervise(self, supervisor: ReconnectSupervisor):
+        """在select()之后运行监督器，期间在后台定期测速"""
+        supervisor.standby_target = (self.client.host, self.client.port)
+        monitor = asyncio.create_task(self.monitor(supervisor)) if len(self.servers) > 1 else None
+        try:
+            await supervisor.run()
+        finally:
+            if monitor is not None:
+                monitor.cancel()
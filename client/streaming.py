@@ -0,0 +1,133 @@
+"""分段流式加密，与服务端 utils/streaming.py 保持一致"""
+import os
+import struct
+from typing import Iterable, Iterator, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# 流头: 版本 + 明文分段大小 + 派生本条流密钥的随机盐
+STREAM_HEADER = struct.Struct('!BI16s')
+VERSION = 1
+SALT_SIZE = 16
+TAG_SIZE = 16
+SEGMENT_SIZE = 64 * 1024
+# 接收方接受的最大分段，限制每条流在内存中的占用
+MAX_SEGMENT_SIZE = 1024 * 1024
+
+# 分段nonce: 3字节填充 + 8字节分段序号 + 末段标志，序号防止重排和重放，末段标志防止截断
+NONCE = struct.Struct('!3xQB')
+# 分段在线上的格式: 1字节末段标志 + 密文和认证标签
+FINAL = b'\x01'
+NOT_FINAL = b'\x00'
+
+def derive_stream_key(master_key: bytes, salt: bytes) -> bytes:
+    """从主密钥和流头中的盐派生每条流独立的AEAD密钥"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b'cysteria stream'
+    ).derive(master_key)
+
+def iter_segments(chunks: Iterable[bytes], segment_size: int = SEGMENT_SIZE) -> Iterator[Tuple[bytes, bool]]:
+    """把任意大小的数据块重新切成固定大小的分段，返回(分段, 是否为最后一段)
+
+    只缓存一个正在拼接的分段和一个等待确认是否为最后一段的分段；空消息产出一个空的最后一段
+    """
+    buffer = bytearray()
+    held = None
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while view:
+            take = segment_size - len(buffer)
+            buffer += view[:take]
+            view = view[take:]
+            if len(buffer) == segment_size:
+                if held is not None:
+                    yield held, False
+                held = bytes(buffer)
+                buffer.clear()
+    if buffer:
+        if held is not None:
+            yield held, False
+        held = bytes(buffer)
+    yield (held if held is not None else b''), True
+
+class StreamEncryptor:
+    """一条流的发送方，按顺序加密分段，每段独立认证"""
+    __slots__ = ('header', 'segment_size', 'index', 'finished', '_aead')
+
+    def __init__(self, master_key: bytes, segment_size: int = SEGMENT_SIZE):
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError(f"Invalid stream segment size: {segment_size}")
+        salt = os.urandom(SALT_SIZE)
+        self.header = STREAM_HEADER.pack(VERSION, segment_size, salt)
+        self.segment_size = segment_size
+        self.index = 0
+        self.finished = False
+        self._aead = AESGCM(derive_stream_key(master_key, salt))
+
+    def encrypt(self, data: bytes, final: bool) -> bytes:
+        """加密下一个分段，流头作为附加数据"""
+        if self.finished:
+            raise ValueError("Stream already finished")
+        if len(data) > self.segment_size:
+            raise ValueError(f"Stream segment too large: {len(data)}")
+        nonce = NONCE.pack(self.index, final)
+        self.index += 1
+        self.finished = final
+        return (FINAL if final else NOT_FINAL) + self._aead.encrypt(nonce, data, self.header)
+
+class StreamDecryptor:
+    """一条流的接收方，按到达顺序逐段解密验证，不缓存已解密的数据"""
+    __slots__ = ('header', 'segment_size', 'index', 'finished', '_aead')
+
+    def __init__(self, master_key: bytes, header: bytes):
+        if len(header) != STREAM_HEADER.size:
+            raise ValueError("Invalid stream header")
+        version, segment_size, salt = STREAM_HEADER.unpack(header)
+        if version != VERSION or not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError(f"Unsupported stream version {version} or segment size {segment_size}")
+        self.header = bytes(header)
+        self.segment_size = segment_size
+        self.index = 0
+        self.finished = False
+        self._aead = AESGCM(derive_stream_key(master_key, salt))
+
+    def decrypt(self, segment) -> bytes:
+        """解密下一个分段，认证失败、分段过大或最后一段之后还有数据时抛出ValueError"""
+        if self.finished:
+            raise ValueError("Data after the final stream segment")
+        if not 1 + TAG_SIZE <= len(segment) <= 1 + self.segment_size + TAG_SIZE:
+            raise ValueError(f"Invalid stream segment length: {len(segment)}")
+        final = segment[0] == FINAL[0]
+        try:
+            data = self._aead.decrypt(NONCE.pack(self.index, final), bytes(segment[1:]), self.header)
+        except InvalidTag:
+            raise ValueError(f"Stream segment {self.index} failed authentication") from None
+        self.index += 1
+        self.finished = final
+        return data
+
+def encrypt_stream(master_key: bytes, chunks: Iterable[bytes],
+                   segment_size: int = SEGMENT_SIZE) -> Iterator[bytes]:
+    """流式加密，先产出流头，再逐个产出加密分段，内存占用与消息大小无关"""
+    encryptor = StreamEncryptor(master_key, segment_size)
+    yield encryptor.header
+    for data, final in iter_segments(chunks, segment_size):
+        yield encryptor.encrypt(data, final)
+
+def decrypt_stream(master_key: bytes, segments: Iterable[bytes]) -> Iterator[bytes]:
+    """流式解密encrypt_stream的输出，逐段产出明文；流在最后一段之前结束时抛出ValueError"""
+    segments = iter(segments)
+    header = next(segments, None)
+    if header is None:
+        raise ValueError("Missing stream header")
+    decryptor = StreamDecryptor(master_key, header)
+    for segment in segments:
+        yield decryptor.decrypt(segment)
+    if not decryptor.finished:
+        raise ValueError("Stream truncated before the final segment")
@@ -0,0 +1,217 @@
+"""并行连接条带化：把帧分散到K条隧道连接上，绕开单条TCP连接的拥塞窗口和队头阻塞"""
+import asyncio
+import logging
+import os
+import struct
+from typing import Dict, List, Optional, Set
+
+from core import CONNECT_ERRORS, FRAME_HEADER, FRAME_STRIPE, Backoff, TunnelClient
+
+logger = logging.getLogger(__name__)
+
+# 条带帧负载: 8字节会话内序号 + 加密数据，与服务端 utils/striping.py 保持一致；
+# 只有序号没有数据的条带帧通知服务端这个序号已被放弃
+STRIPE_HEADER = struct.Struct('!Q')
+
+class Reassembler:
+    """按序号恢复响应的原始顺序"""
+    def __init__(self):
+        self.next_seq = 0
+        # 值为None的序号已被放弃，只占位不交付
+        self.buffered: Dict[int, Optional[bytes]] = {}
+
+    def push(self, seq: int, data: Optional[bytes]) -> List[bytes]:
+        """加入一帧，返回可以按序交付的数据"""
+        if seq < self.next_seq or seq in self.buffered:
+            return []
+        self.buffered[seq] = data
+        ready = []
+        while self.next_seq in self.buffered:
+            data = self.buffered.pop(self.next_seq)
+            if data is not None:
+                ready.append(data)
+            self.next_seq += 1
+        return ready
+
+    def skip(self, seq: int) -> List[bytes]:
+        """放弃一个序号（请求所在的连接已断开，响应不会到达），返回因此可以交付的数据"""
+        return self.push(seq, None)
+
+class StripeLane:
+    """条带中的一条连接"""
+    def __init__(self, index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.index = index
+        self.reader = reader
+        self.writer = writer
+        self.in_flight = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def load(self) -> int:
+        """未确认的帧数加上发送缓冲区中的字节数（按16KB折算为帧）"""
+        return self.in_flight + self.writer.transport.get_write_buffer_size() // 16384
+
+class StripedTunnel:
+    """在同一会话中打开K条并行连接，按最小负载调度发送帧
+
+    服务端按会话内序号恢复顺序后处理，响应带回原序号，客户端再按序交付。
+    一条连接断开时，在它上面还没有收到响应的帧被放弃（最多交付一次），两端都跳过这些序号，
+    其余连接继续工作，断开的连接在后台重连；所有连接都断开时隧道结束
+    """
+    def __init__(self, client: TunnelClient, connections: int = 4, max_in_flight: int = 256):
+        self.client = client
+        self.connections = connections
+        self.max_in_flight = max_in_flight
+        self.session_key = os.urandom(32)
+        self.lanes: List[StripeLane] = []
+        self.reassembler = Reassembler()
+        self._next_seq = 0
+        # 等待响应的序号 -> 发送它的连接
+        self._in_flight: Dict[int, StripeLane] = {}
+        self._reconnects: Set[asyncio.Task] = set()
+        self._window: Optional[asyncio.Semaphore] = None
+        self._closed: Optional[asyncio.Future] = None
+
+    async def open(self):
+        """并发建立所有连接"""
+        self._closed = asyncio.get_running_loop().create_future()
+        self._window = asyncio.Semaphore(self.max_in_flight)
+        conns = await asyncio.gather(*(
+            self.client.open_connection(session_key=self.session_key)
+            for _ in range(self.connections)
+        ), return_exceptions=True)
+        errors = [c for c in conns if isinstance(c, BaseException)]
+        if errors:
+            for conn in conns:
+                if not isinstance(conn, BaseException):
+                    conn[1].close()
+            raise errors[0]
+        for index, (reader, writer) in enumerate(conns):
+            self._add_lane(index, reader, writer)
+        self.client._log(f"已建立 {self.connections} 条并行连接")
+
+    def _add_lane(self, index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lane = StripeLane(index, reader, writer)
+        lane.task = asyncio.create_task(self._read_lane(lane))
+        self.lanes.append(lane)
+
+    def _pick_lane(self) -> Optional[StripeLane]:
+        """最小负载调度，跳过正在关闭的连接，没有可用连接时返回None"""
+        return min((lane for lane in self.lanes if not lane.writer.is_closing()),
+                   key=lambda lane: lane.load, default=None)
+
+    async def send(self, data: bytes):
+        """加密并通过负载最小的连接发送一帧"""
+        await self._window.acquire()
+        lane = self._pick_lane()
+        if lane is None:
+            self._window.release()
+            raise ConnectionError("没有可用的条带连接")
+        seq = self._next_seq
+        self._next_seq += 1
+        token = self.client.encode(data)
+        lane.in_flight += 1
+        self._in_flight[seq] = lane
+        payload = STRIPE_HEADER.pack(seq) + token
+        lane.writer.write(FRAME_HEADER.pack(FRAME_STRIPE, len(payload)) + payload)
+        await lane.writer.drain()
+
+    def _deliver(self, ready: List[bytes]):
+        if self.client.on_data:
+            for data in ready:
+                self.client.on_data(data)
+
+    async def _read_lane(self, lane: StripeLane):
+        """读取一条连接上的响应并按序交付，控制帧（心跳PING等）与单连接时一样处理"""
+        try:
+            while True:
+                frame_type, payload = await self.client.read_frame(lane.reader)
+                if frame_type != FRAME_STRIPE:
+                    self.client._handle_control(lane.writer, frame_type, payload)
+                    continue
+                (seq,) = STRIPE_HEADER.unpack_from(payload)
+                owner = self._in_flight.pop(seq, None)
+                if owner is None:
+                    # 已放弃的序号迟到的响应
+                    continue
+                owner.in_flight -= 1
+                self._window.release()
+                data = self.client.decode(payload[STRIPE_HEADER.size:])
+                self._deliver(self.reassembler.push(seq, data))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            logger.info(f"条带连接 {lane.index} 已断开: {str(e)}")
+        finally:
+            self._lane_lost(lane)
+
+    def _lane_lost(self, lane: StripeLane):
+        """放弃断开的连接上等待响应的帧并通知服务端跳过，其余连接继续工作，断开的连接在后台重连"""
+        if lane in self.lanes:
+            self.lanes.remove(lane)
+        lane.writer.close()
+        abandoned = [seq for seq, owner in self._in_flight.items() if owner is lane]
+        for seq in abandoned:
+            del self._in_flight[seq]
+            self._window.release()
+            self._deliver(self.reassembler.skip(seq))
+        if self._closed.done():
+            return
+        if not self.lanes:
+            self.client._log("所有条带连接都已断开")
+            self._closed.set_result(None)
+            return
+        notify = self._pick_lane()
+        if abandoned and notify is not None:
+            # 服务端可能还在等这些序号，不通知就会一直卡住后面的帧
+            for seq in abandoned:
+                notify.writer.write(FRAME_HEADER.pack(FRAME_STRIPE, STRIPE_HEADER.size) + STRIPE_HEADER.pack(seq))
+        self.client._log(f"条带连接 {lane.index} 已断开，放弃 {len(abandoned)} 帧，正在重连")
+        task = asyncio.create_task(self._reconnect(lane.index))
+        self._reconnects.add(task)
+        task.add_done_callback(self._reconnects.discard)
+
+    async def _reconnect(self, index: int):
+        """按退避重连一条断开的连接，以同一会话密钥加入原会话"""
+        backoff = Backoff()
+        while not self._closed.done():
+            await asyncio.sleep(backoff.next_delay())
+            if self._closed.done():
+                return
+            try:
+                reader, writer = await self.client.open_connection(session_key=self.session_key)
+            except CONNECT_ERRORS as e:
+                logger.info(f"条带连接 {index} 重连失败: {str(e) or type(e).__name__}")
+                continue
+            if self._closed.done():
+                writer.close()
+                return
+            self._add_lane(index, reader, writer)
+            self.client._log(f"条带连接 {index} 已重连")
+            return
+
+    async def run(self):
+        """建立连接并等待所有连接断开或调用stop()"""
+        self.client._status("正在连接...")
+        await self.open()
+        self.client._status("已连接")
+        try:
+            await self._closed
+        finally:
+            await self.close()
+            self.client._status("已断开")
+
+    async def close(self):
+        """关闭所有连接"""
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+        lanes, self.lanes = self.lanes, []
+        tasks = [lane.task for lane in lanes if lane.task] + list(self._reconnects)
+        for lane in lanes:
+            lane.writer.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        """停止条带隧道"""
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
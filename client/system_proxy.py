@@ -0,0 +1,49 @@
+import logging
+import winreg
+
+logger = logging.getLogger(__name__)
+
+class SystemProxy:
+    """系统代理管理器"""
+    def __init__(self):
+        self.INTERNET_SETTINGS = winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+            r'Software\Microsoft\Windows\CurrentVersion\Internet Settings',
+            0, winreg.KEY_ALL_ACCESS)
+
+    def set_proxy(self, host, port):
+        """设置系统代理"""
+        try:
+            # 启用代理
+            winreg.SetValueEx(self.INTERNET_SETTINGS, 'ProxyEnable', 0, winreg.REG_DWORD, 1)
+            # 设置HTTP和HTTPS代理
+            proxy_server = f"http=127.0.0.1:{port};https=127.0.0.1:{port}"
+            winreg.SetValueEx(self.INTERNET_SETTINGS, 'ProxyServer', 0, winreg.REG_SZ, proxy_server)
+            # 刷新系统设置
+            self._refresh_system()
+            logger.info(f"系统代理已设置为: {proxy_server}")
+            return True
+        except Exception as e:
+            logger.error(f"设置系统代理失败: {str(e)}")
+            return False
+
+    def clear_proxy(self):
+        """清除系统代理"""
+        try:
+            # 禁用代理
+            winreg.SetValueEx(self.INTERNET_SETTINGS, 'ProxyEnable', 0, winreg.REG_DWORD, 0)
+            # 刷新系统设置
+            self._refresh_system()
+            logger.info("系统代理已清除")
+            return True
+        except Exception as e:
+            logger.error(f"清除系统代理失败: {str(e)}")
+            return False
+
+    def _refresh_system(self):
+        """刷新系统代理设置"""
+        import ctypes
+        INTERNET_OPTION_SETTINGS_CHANGED = 39
+        INTERNET_OPTION_REFRESH = 37
+        internet_set_option = ctypes.windll.Wininet.InternetSetOptionW
+        internet_set_option(0, INTERNET_OPTION_SETTINGS_CHANGED, 0, 0)
+        internet_set_option(0, INTERNET_OPTION_REFRESH, 0, 0)
@@ -1,26 +1,29 @@
 import os
-from dotenv import load_dotenv
 import logging
 from pathlib import Path
 import socket
 import random
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# 导入本模块没有副作用：不配置日志、不绑定端口、不创建目录，日志由入口脚本配置
 logger = logging.getLogger(__name__)
 
+def load_env():
+    """加载.env中的环境变量；没有.env文件时不导入python-dotenv"""
+    directory = Path(__file__).resolve().parent
+    if not any((path / '.env').is_file() for path in (Path.cwd(), directory, *directory.parents)):
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+
 # 加载环境变量
-load_dotenv()
+load_env()
 
 # 服务器配置
 SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
 
-def find_available_port(start_port=1024, end_port=65535):
-    """查找可用端口"""
-    while True:
+def find_available_port(start_port=1024, end_port=65535, attempts=100):
+    """查找可用端口，随机尝试attempts次后交给内核分配"""
+    for _ in range(attempts):
         port = random.randint(start_port, end_port)
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -29,69 +32,171 @@ def find_available_port(start_port=1024, end_port=65535):
                 return port
         except OSError:
             continue
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((SERVER_HOST, 0))
+        port = s.getsockname()[1]
+    logger.info(f"找到可用端口: {port}")
+    return port
+
+_server_port = None
+
+def server_port() -> int:
+    """服务器端口: 环境变量SERVER_PORT，未设置时在第一次调用时选一个随机的可用端口"""
+    global _server_port
+    if _server_port is None:
+        _server_port = int(os.getenv('SERVER_PORT') or find_available_port())
+    return _server_port
+
+def __getattr__(name):
+    # 兼容 from config import SERVER_PORT，端口在第一次访问时才确定
+    if name == 'SERVER_PORT':
+        return server_port()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 数据加密密钥（Fernet格式），客户端需要使用相同的密钥；未设置时每次启动随机生成
+ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
+
+# 连接处理引擎: stream(StreamReader/StreamWriter) 或 protocol(BufferedProtocol + 缓冲池)
+SERVER_ENGINE = os.getenv('SERVER_ENGINE', 'stream')
+
+# 是否在同一端口上同时提供UDP数据报传输
+DATAGRAM_ENABLED = os.getenv('DATAGRAM_ENABLED', '1') == '1'
+
+# 发送限速（0为不限制）：每个客户端和全局的 字节/秒 与 帧/秒
+RATE_LIMITS = {
+    'client_bytes_rate': float(os.getenv('CLIENT_RATE_LIMIT_BPS', 0)),
+    'client_frames_rate': float(os.getenv('CLIENT_RATE_LIMIT_FPS', 0)),
+    'global_bytes_rate': float(os.getenv('GLOBAL_RATE_LIMIT_BPS', 0)),
+    'global_frames_rate': float(os.getenv('GLOBAL_RATE_LIMIT_FPS', 0))
+}
+
+# 每个客户端排队等待发送的字节上限(KB)，超过时暂停读取该连接
+SEND_QUEUE_KB = int(os.getenv('SEND_QUEUE_KB', 1024))
+
+# 心跳间隔(秒，0为关闭)和判定连接失效的连续未响应次数
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 15))
+HEARTBEAT_MISSES = int(os.getenv('HEARTBEAT_MISSES', 3))
+
+# 过载保护: 每隔LOOP_LAG_INTERVAL秒测量事件循环延迟，平滑后的延迟超过OVERLOAD_SHED_MS时拒绝新连接，
+# 超过OVERLOAD_PAUSE_MS时暂停accept，回落后保持OVERLOAD_RECOVER_AFTER秒恢复（间隔为0时关闭）
+OVERLOAD = {
+    'interval': float(os.getenv('LOOP_LAG_INTERVAL', 0.05)),
+    'shed_ms': float(os.getenv('OVERLOAD_SHED_MS', 50)),
+    'pause_ms': float(os.getenv('OVERLOAD_PAUSE_MS', 200)),
+    'recover_after': float(os.getenv('OVERLOAD_RECOVER_AFTER', 1))
+}
+# 过载期间每个客户端的发送帧率上限（0为不限制）
+OVERLOAD_CLIENT_FPS = float(os.getenv('OVERLOAD_CLIENT_FPS', 50))
+
+# 可恢复会话在连接断开后保留的秒数（0为不支持会话恢复）
+SESSION_GRACE = float(os.getenv('SESSION_GRACE', 30))
 
-# 获取随机端口
-SERVER_PORT = int(os.getenv('SERVER_PORT', find_available_port()))
+# 套接字调优档位: latency（默认）、throughput（高带宽时延积链路）或 low-memory（大量连接）
+SOCKET_PROFILE = os.getenv('SOCKET_PROFILE', 'latency')
 
-# SSL证书配置
+# 服务器日志、错误日志、分析结果和其他运行时文件的目录
+LOG_DIR = Path(os.getenv('LOG_DIR', Path(__file__).parent / 'logs'))
+
+# 工作进程数，大于1时预先fork出多个进程通过SO_REUSEPORT监听同一端口（仅Linux/BSD），
+# 各进程的指标写入共享内存文件METRICS_FILE，由主进程汇总
+WORKERS = int(os.getenv('WORKERS', 1))
+METRICS_FILE = Path(os.getenv('METRICS_FILE', LOG_DIR / 'metrics.mmap'))
+
+# 设置TRACE_FILE时把每条连接的帧大小、方向和时间（不含负载）录制到该文件，最多TRACE_MAX_MB兆字节，
+# 可用 bench/replay.py 在回环服务器上按原时序重放；多进程模式下每个工作进程写入 TRACE_FILE.<序号>
+TRACE_FILE = os.getenv('TRACE_FILE')
+TRACE_MAX_MB = float(os.getenv('TRACE_MAX_MB', 64))
+
+# 平滑重启: 运行中的服务器在HANDOVER_SOCKET上等待以 --takeover 启动的新进程接管监听套接字，
+# 交接后在DRAIN_TIMEOUT秒内逐步关闭现有连接再退出（为空时关闭）
+HANDOVER_SOCKET = os.getenv('HANDOVER_SOCKET', str(LOG_DIR / 'handover.sock'))
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', 30))
+
+# 连接池的连接数上限
+MAX_CONNECTIONS = int(os.getenv('MAX_CONNECTIONS', 1000))
+# 每条连接的StreamReader上限和TLS读缓冲(字节)，0为使用套接字调优档位的read_size；
+# 大量空闲连接时调小可以降低每条连接的常驻内存
+READ_LIMIT = int(os.getenv('READ_LIMIT', 0))
+
+# SIGUSR1触发的CPU分析窗口长度(秒)，分析结果写入日志目录
+PROFILE_DURATION = float(os.getenv('PROFILE_DURATION', 30))
+
+# 是否允许客户端协商逐帧压缩（zlib，安装了zstandard时优先zstd）
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+
+# SSL证书配置，首次部署时可用 python config.py 预先生成
 CERT_DIR = Path(__file__).parent
 CERT_FILE = CERT_DIR / 'cert.pem'
 KEY_FILE = CERT_DIR / 'key.pem'
-
-# 创建证书目录（如果不存在）
-CERT_DIR.mkdir(parents=True, exist_ok=True)
+# 每隔CERT_RELOAD_INTERVAL秒检查证书和私钥文件，变化时为新连接换用新证书，已建立的连接不受影响；
+# 0为只在收到SIGHUP时重新加载
+CERT_RELOAD_INTERVAL = float(os.getenv('CERT_RELOAD_INTERVAL', 30))
 
 def generate_self_signed_cert():
-    """生成自签名SSL证书"""
-    from OpenSSL import crypto
-    
+    """生成自签名SSL证书
+
+    使用ECDSA P-256密钥：生成只需约1毫秒（RSA 2048需要上百毫秒），TLS握手时服务端的签名也更快。
+    先写临时文件再改名，证书热更新不会读到写了一半的文件
+    """
     # 检查证书是否已存在
     if CERT_FILE.exists() and KEY_FILE.exists():
         logger.info("SSL证书已存在")
         return
-        
+    
+    from datetime import datetime, timedelta, timezone
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    
     # 生成密钥
-    key = crypto.PKey()
-    key.generate_key(crypto.TYPE_RSA, 2048)
+    key = ec.generate_private_key(ec.SECP256R1())
     
     # 生成证书
-    cert = crypto.X509()
-    cert.get_subject().CN = "Cysteria VPN"
-    cert.set_serial_number(1000)
-    cert.gmtime_adj_notBefore(0)
-    cert.gmtime_adj_notAfter(365*24*60*60)  # 有效期1年
-    cert.set_issuer(cert.get_subject())
-    cert.set_pubkey(key)
-    cert.sign(key, 'sha256')
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Cysteria VPN")])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=365))  # 有效期1年
+            .sign(key, hashes.SHA256()))
     
-    # 保存证书和密钥
-    with open(CERT_FILE, 'wb') as f:
-        f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
-    with open(KEY_FILE, 'wb') as f:
-        f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+    # 保存证书和密钥，私钥只允许属主读取
+    CERT_DIR.mkdir(parents=True, exist_ok=True)
+    key_tmp = KEY_FILE.with_suffix('.tmp')
+    with open(os.open(key_tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+    cert_tmp = CERT_FILE.with_suffix('.tmp')
+    cert_tmp.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    os.replace(key_tmp, KEY_FILE)
+    os.replace(cert_tmp, CERT_FILE)
         
     logger.info("已生成新的SSL证书")
 
-def setup():
-    """初始化配置"""
+def setup(port=None):
+    """初始化配置，port为实际使用的端口（接管其他进程的监听套接字时与SERVER_PORT不同）"""
     try:
         # 生成SSL证书
         generate_self_signed_cert()
         
         # 创建日志目录
-        log_dir = Path(__file__).parent / 'logs'
-        log_dir.mkdir(parents=True, exist_ok=True)
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
         
         # 保存端口信息到文件
         port_file = Path(__file__).parent / 'port.txt'
         with open(port_file, 'w') as f:
-            f.write(str(SERVER_PORT))
+            f.write(str(port or server_port()))
         
-        logger.info(f"配置初始化完成，服务器端口: {SERVER_PORT}")
+        logger.info(f"配置初始化完成，服务器端口: {port or server_port()}")
         return True
     except Exception as e:
         logger.error(f"配置初始化失败: {str(e)}")
         return False
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     setup() 
\ No newline at end of file
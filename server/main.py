@@ -1,17 +1,20 @@
 import asyncio
+import socket
 import ssl
 import logging
 from cryptography.fernet import Fernet
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import json
 import os
-from dotenv import load_dotenv
 import time
 import sys
 import signal
-import daemon
-from pathlib import Path
-from config import SERVER_HOST, SERVER_PORT, setup
+from config import (SERVER_HOST, SERVER_ENGINE, ENCRYPTION_KEY, DATAGRAM_ENABLED,
+                    COMPRESSION_ENABLED, RATE_LIMITS, SEND_QUEUE_KB, HEARTBEAT_INTERVAL, HEARTBEAT_MISSES,
+                    SESSION_GRACE, SOCKET_PROFILE, PROFILE_DURATION, OVERLOAD, OVERLOAD_CLIENT_FPS,
+                    MAX_CONNECTIONS, READ_LIMIT, WORKERS, METRICS_FILE, TRACE_FILE, TRACE_MAX_MB,
+                    CERT_FILE, KEY_FILE, CERT_RELOAD_INTERVAL, HANDOVER_SOCKET, DRAIN_TIMEOUT, LOG_DIR,
+                    server_port, setup)
 import random
 
 from utils.obfuscator import TrafficObfuscator
@@ -19,18 +22,55 @@ from utils.auth import AuthenticationManager
 from utils.connection_pool import ConnectionPool
 from utils.performance import PerformanceMonitor
 from utils.error_handler import ErrorHandler
+from utils.buffer_pool import BufferPool
+from utils.protocol_engine import CysteriaBufferedProtocol
+from utils.framing import (FRAME_ACK, FRAME_DATA, FRAME_HELLO, FRAME_PING, FRAME_PONG, FRAME_RESUME,
+                           FRAME_SEGMENT, FRAME_STRIPE, HEADER_SIZE, pack_frame, unpack_header)
+from utils.striping import STRIPE_HEADER, StripeManager
+from utils.compression import CODEC_NONE, AdaptiveCompressor, choose_codec, decompress_frame
+from utils.scheduler import FairScheduler
+from utils.heartbeat import HeartbeatMonitor
+from utils.session import RESUME_REPLY, SESSION_RESUMABLE, SessionManager
+from utils.socket_tuning import get_profile, set_tls_read_size, tune_connection, tune_listener
+from utils.profiling import ProfilingController
+from utils.acceptor import Acceptor
+from utils.overload import LEVEL_NORMAL, LEVEL_PAUSED, OverloadController
+from utils.shared_metrics import MetricsSlot, SharedMetrics
+from utils.trace import EVENT_CLOSE, EVENT_IN, EVENT_OUT, TraceRecorder
+from utils.certificates import CertificateReloader
+from utils.handover import Handover, HandoverServer, take_over
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Path(__file__).parent / 'logs' / 'server.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 主进程在fork工作进程前导入的模块，工作进程直接继承，第一个连接不必再承担导入开销
+PRELOAD_MODULES = ('jwt', 'utils.datagram', 'utils.streaming')
+
+def setup_logging():
+    """配置日志，在入口处调用，导入本模块时不打开日志文件"""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_DIR / 'server.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+def preload_modules():
+    """导入按需加载的模块，缺少可选依赖时跳过"""
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError as e:
+            logger.warning(f"Failed to preload {name}: {str(e)}")
+
+# 握手中会话密钥的长度，其后的可选字节为客户端支持的压缩算法位掩码
+HANDSHAKE_KEY_SIZE = 32
+
+# 交接后排空连接时检查的间隔(秒)
+DRAIN_TICK = 0.1
+
 class CysteriaProtocol:
     """Cysteria协议实现"""
     def __init__(self):
@@ -47,11 +87,19 @@ class CysteriaProtocol:
         
     def encrypt_data(self, data, key):
         """加密数据"""
-        # 使用XOR加密
-        encrypted = bytearray()
-        for i, byte in enumerate(data):
-            encrypted.append(byte ^ key[i % len(key)])
-        return bytes(encrypted)
+        return b''.join(self.encrypt_chunks([data], key))
+
+    def encrypt_chunks(self, chunks, key):
+        """逐块XOR加密，密钥位置跨块连续，每次只生成当前块的输出"""
+        offset = 0
+        for chunk in chunks:
+            size = len(chunk)
+            if not size:
+                continue
+            start = offset % len(key)
+            pad = (key[start:] + key * (size // len(key) + 1))[:size]
+            yield (int.from_bytes(chunk, 'big') ^ int.from_bytes(pad, 'big')).to_bytes(size, 'big')
+            offset += size
         
     def decrypt_data(self, data, key):
         """解密数据"""
@@ -65,84 +113,359 @@ class CysteriaProtocol:
         return padding + data
 
 class CysteriaServer:
-    def __init__(self, host: str = '0.0.0.0', port: int = 443):
+    ENGINES = ('stream', 'protocol')
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 443, engine: str = 'stream',
+                 certfile: str = str(CERT_FILE), keyfile: str = str(KEY_FILE),
+                 encryption_key: Optional[bytes] = None, datagram: bool = True,
+                 compression: bool = True, rate_limits: Optional[Dict[str, float]] = None,
+                 send_queue_bytes: int = 1024 * 1024, heartbeat_interval: float = 15.0, heartbeat_misses: int = 3,
+                 session_grace: float = 30.0, socket_profile: str = 'latency',
+                 profile_duration: float = 30.0, overload: Optional[Dict[str, float]] = None,
+                 overload_client_fps: float = 50.0, max_connections: int = 1000,
+                 read_limit: int = 0, reuse_port: bool = False, metrics: Optional[MetricsSlot] = None,
+                 trace_file: Optional[str] = None, trace_max_bytes: int = 64 * 1024 * 1024,
+                 cert_reload_interval: float = 30.0, handover: Optional[Handover] = None,
+                 handover_socket: Optional[str] = None, drain_timeout: float = 30.0):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown server engine: {engine}")
+        # 套接字选项、监听队列和读缓冲大小
+        self.socket_profile = get_profile(socket_profile)
+        # 每条连接的StreamReader上限和TLS读缓冲
+        self.read_limit = read_limit or self.socket_profile.read_size
         self.host = host
-        self.port = port
-        self.encryption_key = Fernet.generate_key()
+        # 接管上一个进程的监听套接字时沿用它的端口
+        self.handover = handover
+        self.port = handover.port if handover is not None else port
+        # 在这个Unix套接字上等待下一个进程接管，交接后在drain_timeout秒内逐步关闭现有连接
+        self.handover_socket = handover_socket
+        self.handover_server: Optional[HandoverServer] = None
+        self.drain_timeout = drain_timeout
+        self.datagram_transport: Optional[asyncio.DatagramTransport] = None
+        # 多进程模式下与其他工作进程共用监听端口
+        self.reuse_port = reuse_port
+        self.engine = engine
+        self.datagram = datagram
+        # 开启UDP传输时才导入utils.datagram
+        self.datagram_protocol: Optional[asyncio.DatagramProtocol] = None
+        self.compression = compression
+        # 协商了压缩的连接的发送方向压缩器
+        self.compressors: Dict[str, AdaptiveCompressor] = {}
+        self.encryption_key = encryption_key or Fernet.generate_key()
         self.cipher = Fernet(self.encryption_key)
+        # 正在接收的流式消息的解密器(StreamDecryptor)，每条连接同时只有一条；收到第一个分段时才导入utils.streaming
+        self.streams: Dict[str, object] = {}
         
         # 初始化各个组件
+        self.protocol = CysteriaProtocol()
         self.obfuscator = TrafficObfuscator()
         self.auth_manager = AuthenticationManager()  # 使用默认的公开访问密钥
-        self.connection_pool = ConnectionPool()
-        self.performance_monitor = PerformanceMonitor()
-        self.error_handler = ErrorHandler()
+        self.connection_pool = ConnectionPool(max_connections=max_connections)
+        self.performance_monitor = PerformanceMonitor(metrics=metrics)
+        self.error_handler = ErrorHandler(str(LOG_DIR))
+        self.buffer_pool = BufferPool(buffer_size=self.socket_profile.read_size)
+        self.stripes = StripeManager()
+        # 断线后可恢复的会话，session_grace为0时不向客户端提供恢复
+        self.sessions = SessionManager(grace=session_grace)
+        # 按客户端公平调度发送并限速，积压的响应超过send_queue_bytes时暂停读取该连接
+        self.rate_limits = rate_limits or {}
+        self.scheduler = FairScheduler(max_queued_bytes=send_queue_bytes, performance_monitor=self.performance_monitor,
+                                       on_write=self.sessions.sent, **self.rate_limits)
+        # 事件循环延迟过高时暂停或拒绝新连接，并把每个客户端的发送帧率降到overload_client_fps
+        self.overload = OverloadController(**(overload or {}))
+        self.overload.add_listener(self.apply_overload)
+        self.overload_client_fps = overload_client_fps
+        self.acceptor: Optional[Acceptor] = None
+        # 心跳保活、RTT测量和失效连接检测
+        self.heartbeat = HeartbeatMonitor(heartbeat_interval, heartbeat_misses, self.performance_monitor)
+        # SIGUSR1/SIGUSR2触发的CPU和内存分析
+        self.profiler = ProfilingController(LOG_DIR, duration=profile_duration)
+        # 帧大小和时序的轨迹录制，在start()中打开
+        self.trace_file = trace_file
+        self.trace_max_bytes = trace_max_bytes
+        self.tracer: Optional[TraceRecorder] = None
+        
+        # 加载SSL证书，文件更新或收到SIGHUP时热替换
+        self.certificates = CertificateReloader(certfile, keyfile, self.apply_ssl_context,
+                                                interval=cert_reload_interval)
+        self.ssl_context = self.certificates.load()
+
+    def apply_ssl_context(self, context: ssl.SSLContext):
+        """替换之后新连接握手使用的SSL上下文"""
+        self.ssl_context = context
+        if self.acceptor is not None:
+            self.acceptor.ssl_context = context
+
+    def apply_overload(self, level: int):
+        """过载等级变化时调整accept和每个客户端的发送预算"""
+        client_fps = self.rate_limits.get('client_frames_rate', 0)
+        if level == LEVEL_NORMAL:
+            self.scheduler.set_client_limits(self.rate_limits.get('client_bytes_rate', 0), client_fps)
+        elif self.overload_client_fps > 0:
+            limit = min(client_fps, self.overload_client_fps) if client_fps > 0 else self.overload_client_fps
+            self.scheduler.set_client_limits(self.rate_limits.get('client_bytes_rate', 0), limit)
+        if self.acceptor is None:
+            return
+        self.acceptor.rejecting = level != LEVEL_NORMAL
+        if level == LEVEL_PAUSED:
+            self.acceptor.pause()
+        else:
+            self.acceptor.resume()
+
+    async def register_client(self, client_id: str, reader: Optional[asyncio.StreamReader], writer) -> bool:
+        """认证客户端并加入连接池"""
+        self.performance_monitor.record_connect(client_id)
+        # 处理客户端连接
+        auth_info = {
+            'client_id': client_id,
+            'connected_at': time.time()
+        }
+        
+        # 生成访问令牌
+        self.auth_manager.authenticate_client(client_id, auth_info)
+        
+        tune_connection(writer.get_extra_info('socket'), self.socket_profile)
+        
+        # 添加到连接池
+        if not await self.connection_pool.add_connection(client_id, reader, writer):
+            writer.write(b"Connection pool full")
+            return False
+        self.scheduler.register(client_id)
+        self.heartbeat.register(client_id, writer)
+            
+        logger.info(f"New client connected: {client_id}")
+        return True
+
+    async def unregister_client(self, client_id: str):
+        """连接断开时清理连接池和条带会话"""
+        self.stripes.detach(client_id)
+        self.scheduler.unregister(client_id)
+        self.heartbeat.unregister(client_id)
+        self.sessions.detach(client_id)
+        self.streams.pop(client_id, None)
+        compressor = self.compressors.pop(client_id, None)
+        if compressor is not None:
+            stats = compressor.get_stats()
+            self.performance_monitor.record_compression(client_id, stats)
+            logger.info(f"Compression stats for {client_id}: {stats['codec']}, "
+                        f"saved {stats['saved_bytes']} of {stats['bytes_in']} bytes, "
+                        f"CPU {stats['cpu_ms']:.1f}ms")
+        await self.connection_pool.remove_connection(client_id)
+        self.auth_manager.revoke_token(client_id)
+        self.performance_monitor.forget_client(client_id)
+
+    def handle_control(self, client_id: str, frame_type: int, payload) -> Optional[bytes]:
+        """处理控制帧，返回需要立即写回的帧"""
+        if frame_type == FRAME_HELLO:
+            valid, session_id = self.protocol.verify_handshake(bytes(payload))
+            if not valid:
+                raise ValueError(f"Invalid handshake from {client_id}")
+            session_id, capabilities = session_id[:HANDSHAKE_KEY_SIZE], session_id[HANDSHAKE_KEY_SIZE:]
+            # 握手中的随机密钥作为会话ID，携带相同会话ID的并行连接归入同一条带会话
+            self.stripes.attach(client_id, session_id)
+            codec = choose_codec(capabilities[0]) if capabilities and self.compression else CODEC_NONE
+            if codec != CODEC_NONE:
+                # 此后该连接上每帧明文前都带1字节编码标记
+                self.compressors[client_id] = AdaptiveCompressor(codec)
+            if len(capabilities) < 2:
+                # 旧版本客户端只带压缩算法位掩码
+                return pack_frame(FRAME_HELLO, b"OK" if codec == CODEC_NONE else b"OK" + bytes([codec]))
+            # 回复选定的算法和服务端接受的会话标志
+            flags = 0
+            if capabilities[1] & SESSION_RESUMABLE and self.sessions.grace > 0:
+                self.sessions.open(client_id, session_id, codec)
+                flags |= SESSION_RESUMABLE
+            return pack_frame(FRAME_HELLO, b"OK" + bytes([codec, flags]))
+        if frame_type == FRAME_PING:
+            # 原样回显，对端据此计算RTT
+            return pack_frame(FRAME_PONG, bytes(payload))
+        if frame_type == FRAME_PONG:
+            self.heartbeat.handle_pong(client_id, payload)
+            return None
+        if frame_type == FRAME_RESUME:
+            return self.resume_session(client_id, payload)
+        if frame_type == FRAME_ACK:
+            self.sessions.acknowledge(client_id, payload)
+            return None
+        logger.debug(f"Ignoring frame of unknown type {frame_type}")
+        return None
+
+    def resume_session(self, client_id: str, payload) -> bytes:
+        """客户端重连后接回原会话，回复服务端已收到的帧数，并补发客户端未收到的响应"""
+        compressor = self.compressors.get(client_id)
+        session, previous, replay = self.sessions.resume(client_id, bytes(payload),
+                                                         compressor.codec if compressor else CODEC_NONE)
+        if session is None:
+            logger.info(f"Session resume from {client_id} rejected, continuing with a new session")
+            return pack_frame(FRAME_RESUME, RESUME_REPLY.pack(0, 0))
+        if previous is not None:
+            # 旧连接还没被发现断开，直接关闭
+            conn = self.connection_pool.get_connection(previous)
+            if conn is not None:
+                conn.writer.transport.abort()
+        logger.info(f"Session resumed by {client_id}, replaying {len(replay)} frames")
+        return pack_frame(FRAME_RESUME, RESUME_REPLY.pack(1, session.received)) + b''.join(replay)
+
+    def track_received(self, client_id: str, writer):
+        """可恢复会话按序计数收到的数据帧，定期回复ACK"""
+        ack = self.sessions.received(client_id)
+        if ack:
+            writer.write(ack)
+
+    def decode_frame(self, payload, client_id: Optional[str] = None) -> bytes:
+        """解密数据帧并去除混淆"""
+        # 解密数据（Fernet只接受bytes）
+        decrypted_data = self.cipher.decrypt(bytes(payload))
+        
+        # 解压
+        if client_id in self.compressors:
+            decrypted_data = decompress_frame(decrypted_data)
+        
+        # 去除混淆
+        return self.obfuscator.deobfuscate(decrypted_data, b'')
+
+    def decode_stripe(self, payload, client_id: Optional[str] = None) -> Tuple[int, Optional[bytes]]:
+        """解析条带帧，返回(序号, 数据)，客户端放弃的序号数据为None"""
+        (seq,) = STRIPE_HEADER.unpack_from(payload)
+        if len(payload) == STRIPE_HEADER.size:
+            return seq, None
+        return seq, self.decode_frame(payload[STRIPE_HEADER.size:], client_id)
+
+    def decode_segment(self, client_id: str, payload) -> Tuple[bytes, bool]:
+        """解密流式消息的一个分段，返回(明文, 是否为最后一段)；每条消息的首帧是流头，返回空明文"""
+        decryptor = self.streams.get(client_id)
+        if decryptor is None:
+            from utils.streaming import StreamDecryptor
+            self.streams[client_id] = StreamDecryptor(self.encryption_key, bytes(payload))
+            return b'', False
+        data = decryptor.decrypt(payload)
+        if decryptor.finished:
+            del self.streams[client_id]
+        return data, decryptor.finished
+
+    async def respond(self, data: bytes, seq: Optional[int] = None, client_id: Optional[str] = None) -> bytes:
+        """处理数据并生成加密后的响应帧，条带帧的响应带回原序号"""
+        response = await self.process_client_data(data)
+        return self.encode_response(response, seq, client_id)
+
+    def encode_response(self, response: bytes, seq: Optional[int] = None, client_id: Optional[str] = None) -> bytes:
+        """混淆、压缩并加密响应帧"""
+        # 添加混淆
+        obfuscated_response, marker = self.obfuscator.obfuscate(response)
         
-        # 加载SSL证书
-        self.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        self.ssl_context.load_cert_chain(
-            certfile='server/cert.pem',
-            keyfile='server/key.pem'
-        )
+        # 加密前压缩
+        compressor = self.compressors.get(client_id)
+        if compressor is not None:
+            obfuscated_response = compressor.compress(obfuscated_response)
+        
+        # 加密响应
+        token = self.cipher.encrypt(obfuscated_response)
+        if seq is None:
+            return pack_frame(FRAME_DATA, token)
+        return pack_frame(FRAME_STRIPE, STRIPE_HEADER.pack(seq) + token)
+
+    async def handle_stripe(self, client_id: str, writer, seq: int, data: Optional[bytes]):
+        """按会话内序号处理条带帧，响应写回该帧到达时所在的连接"""
+        session = self.stripes.get(client_id)
+        if session is None:
+            raise ValueError(f"Stripe frame before handshake from {client_id}")
+        ready = session.push(seq, data, writer)
+        if not ready:
+            return
+        async with session.lock:
+            for ready_seq, ready_data, member_writer in ready:
+                response = await self.respond(ready_data, ready_seq, client_id)
+                if not member_writer.is_closing():
+                    await self.scheduler.send(client_id, member_writer, response)
+
+    async def handle_segment(self, client_id: str, writer, data: bytes, final: bool) -> Optional[bytes]:
+        """处理流式消息的一个明文分段，整条消息处理完后回复一个数据帧并返回它"""
+        response = await self.process_stream_segment(client_id, data, final)
+        if response is None:
+            return None
+        frame = self.encode_response(response, client_id=client_id)
+        await self.scheduler.send(client_id, writer, frame)
+        return frame
+
+    def record_frame(self, client_id: str, start_time: float, nbytes: int):
+        """记录性能指标"""
+        latency = (time.time() - start_time) * 1000
+        self.performance_monitor.record_latency(client_id, latency)
+        self.performance_monitor.record_throughput(client_id, nbytes)
 
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         client_id = None
         start_time = time.time()
+        tracer = self.tracer
+        trace = tracer.open_connection() if tracer is not None else 0
         
         try:
             # 获取客户端信息
             addr = writer.get_extra_info('peername')
             client_id = f"{addr[0]}:{addr[1]}"
             
-            # 处理客户端连接
-            auth_info = {
-                'client_id': client_id,
-                'connected_at': time.time()
-            }
-            
-            # 生成访问令牌
-            token = self.auth_manager.authenticate_client(client_id, auth_info)
-            
-            # 添加到连接池
-            if not await self.connection_pool.add_connection(client_id, reader, writer, token):
-                writer.write(b"Connection pool full")
+            if not await self.register_client(client_id, reader, writer):
                 await writer.drain()
                 return
-                
-            logger.info(f"New client connected: {client_id}")
             
             # 主循环处理客户端数据
             while True:
-                data = await reader.read(8192)
-                if not data:
+                try:
+                    header = await reader.readexactly(HEADER_SIZE)
+                    frame_type, length = unpack_header(header)
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    # 客户端半关闭后仍要写完排队的响应
+                    await self.scheduler.flush(client_id)
                     break
+                if tracer is not None:
+                    tracer.record(trace, EVENT_IN, frame_type, length)
                     
                 # 更新活动时间
+                self.heartbeat.seen(client_id)
                 await self.connection_pool.update_activity(client_id)
                 
-                # 解密数据
-                decrypted_data = self.cipher.decrypt(data)
-                
-                # 去除混淆
-                real_data = self.obfuscator.deobfuscate(decrypted_data, auth_info.get('marker', b''))
+                # 条带帧
+                if frame_type == FRAME_STRIPE:
+                    seq, real_data = self.decode_stripe(payload, client_id)
+                    await self.handle_stripe(client_id, writer, seq, real_data)
+                    await writer.drain()
+                    self.record_frame(client_id, start_time, len(payload))
+                    continue
                 
-                # 处理数据
-                response = await self.process_client_data(real_data)
+                # 流式消息的分段，解密后逐段处理，不在内存中拼出整条消息
+                if frame_type == FRAME_SEGMENT:
+                    real_data, final = self.decode_segment(client_id, payload)
+                    response = await self.handle_segment(client_id, writer, real_data, final)
+                    if response is not None and tracer is not None:
+                        tracer.record(trace, EVENT_OUT, FRAME_DATA, len(response) - HEADER_SIZE)
+                    await writer.drain()
+                    self.record_frame(client_id, start_time, len(payload))
+                    continue
                 
-                # 添加混淆
-                obfuscated_response, marker = self.obfuscator.obfuscate(response)
+                # 控制帧
+                if frame_type != FRAME_DATA:
+                    reply = self.handle_control(client_id, frame_type, payload)
+                    if reply:
+                        if tracer is not None:
+                            tracer.record(trace, EVENT_OUT, reply[0], len(reply) - HEADER_SIZE)
+                        writer.write(reply)
+                        await writer.drain()
+                    continue
                 
-                # 加密响应
-                encrypted_response = self.cipher.encrypt(obfuscated_response)
+                # 解密并去除混淆
+                real_data = self.decode_frame(payload, client_id)
+                self.track_received(client_id, writer)
                 
-                # 发送响应
-                writer.write(encrypted_response)
-                await writer.drain()
+                # 发送响应（经过公平调度和限速）；数据帧不携带流标识，同一客户端的响应按请求顺序写出。
+                # 排队后继续读取下一帧，积压的响应由调度器写出，背压也由调度器负责
+                response = await self.respond(real_data, client_id=client_id)
+                if tracer is not None:
+                    tracer.record(trace, EVENT_OUT, FRAME_DATA, len(response) - HEADER_SIZE)
+                await self.scheduler.submit(client_id, writer, response)
                 
                 # 记录性能指标
-                latency = (time.time() - start_time) * 1000
-                self.performance_monitor.record_latency(client_id, latency)
-                self.performance_monitor.record_throughput(client_id, len(data))
+                self.record_frame(client_id, start_time, len(payload))
                 
         except Exception as e:
             if client_id:
@@ -150,12 +473,19 @@ class CysteriaServer:
                 self.performance_monitor.record_error(client_id)
             logger.error(f"Error handling client {client_id}: {str(e)}")
         finally:
+            if tracer is not None:
+                tracer.record(trace, EVENT_CLOSE)
             if client_id:
-                await self.connection_pool.remove_connection(client_id)
+                await self.unregister_client(client_id)
             writer.close()
             await writer.wait_closed()
             logger.info(f"Client disconnected: {client_id}")
 
+    async def handle_datagram(self, client_id: str, data: bytes) -> bytes:
+        """处理UDP传输上收到的消息，AEAD已由数据报层完成"""
+        self.performance_monitor.record_throughput(client_id, len(data))
+        return await self.process_client_data(data)
+
     async def process_client_data(self, data: bytes) -> bytes:
         """处理客户端数据"""
         try:
@@ -165,51 +495,268 @@ class CysteriaServer:
             self.error_handler.handle_error(e, {'data': data})
             return b"Error processing data"
 
+    async def process_stream_segment(self, client_id: str, data: bytes, final: bool) -> Optional[bytes]:
+        """处理流式消息的一个分段，整条消息处理完后返回响应"""
+        # 这里实现具体的流式处理逻辑，分段处理完即可释放
+        return b"OK" if final else None
+
     async def start(self):
         """启动服务器"""
+        loop = asyncio.get_running_loop()
         try:
-            # 启动连接池清理任务
+            # 启动连接池清理任务和心跳
             self.connection_pool.start_cleanup_task()
+            self.heartbeat.start()
+            self.profiler.install(loop)
+            if self.trace_file:
+                self.tracer = TraceRecorder(self.trace_file, self.trace_max_bytes)
+                logger.info(f"Recording traffic trace to {self.trace_file}")
             
             # 启动服务器
-            server = await asyncio.start_server(
-                self.handle_client,
-                self.host,
-                self.port,
-                ssl=self.ssl_context
-            )
+            profile = self.socket_profile
+            set_tls_read_size(self.read_limit)
+            if self.engine == 'protocol':
+                def protocol_factory():
+                    return CysteriaBufferedProtocol(self, self.buffer_pool, max_read_size=profile.max_read_size)
+            else:
+                def protocol_factory():
+                    return asyncio.StreamReaderProtocol(asyncio.StreamReader(limit=self.read_limit),
+                                                        self.handle_client)
+            self.acceptor = Acceptor(protocol_factory, self.ssl_context, backlog=profile.backlog,
+                                     reuse_port=self.reuse_port)
+            if self.handover is not None:
+                listeners = await self.acceptor.adopt(self.handover.listeners)
+            else:
+                listeners = await self.acceptor.listen(self.host, self.port)
+            for sock in listeners:
+                tune_listener(sock, profile)
+            self.overload.start()
+            self.certificates.start(loop)
+            
+            logger.info(f"Server started on {self.host}:{self.port} ({self.engine} engine, "
+                        f"{profile.name} socket profile)")
+            
+            # 在同一端口上并行提供UDP数据报传输
+            if self.datagram:
+                from utils.datagram import DatagramTunnelProtocol
+                if self.handover is not None and self.handover.datagram is not None:
+                    address = {'sock': self.handover.datagram}
+                else:
+                    address = {'local_addr': (self.host, self.port), 'reuse_port': self.reuse_port or None}
+                self.datagram_transport, self.datagram_protocol = await loop.create_datagram_endpoint(
+                    lambda: DatagramTunnelProtocol(self.encryption_key, self.handle_datagram), **address
+                )
+                logger.info(f"Datagram transport listening on udp/{self.port}")
             
-            logger.info(f"Server started on {self.host}:{self.port}")
+            # 已开始accept，通知上一个进程停止accept并排空连接
+            if self.handover is not None:
+                self.handover.ready()
+                self.handover = None
+            if self.handover_socket:
+                self.handover_server = HandoverServer(self.handover_socket, self.port, self.encryption_key,
+                                                      self.listening_sockets, self.drain)
+                self.handover_server.start(loop)
             
             # 定期记录性能指标
             async def log_performance():
                 while True:
                     await asyncio.sleep(60)
+                    self.performance_monitor.record_loop_lag(self.overload.get_stats())
+                    self.scheduler.report_stats()
                     self.performance_monitor.log_performance_metrics()
                     
             asyncio.create_task(log_performance())
             
-            async with server:
-                await server.serve_forever()
+            await self.acceptor.serve_forever()
                 
         except Exception as e:
             self.error_handler.handle_error(e)
             raise
         finally:
             self.connection_pool.stop_cleanup_task()
+            self.heartbeat.stop()
+            self.profiler.uninstall()
+            if self.tracer is not None:
+                self.tracer.close()
+                self.tracer = None
+            self.overload.stop()
+            self.certificates.stop()
+            if self.handover_server is not None:
+                self.handover_server.close()
+            if self.acceptor is not None:
+                self.acceptor.close()
+            if self.datagram_transport is not None:
+                self.datagram_transport.close()
 
-def run_server():
-    """运行服务器"""
+    def listening_sockets(self):
+        """交给下一个进程的TCP监听套接字和UDP套接字"""
+        datagram = None
+        if self.datagram_transport is not None:
+            datagram = self.datagram_transport.get_extra_info('socket')
+        return list(self.acceptor.sockets), datagram
+
+    async def drain(self):
+        """交接后停止accept和UDP接收，在drain_timeout秒内按匀速逐步关闭现有连接
+
+        最久没有活动的连接先关闭，客户端的重连和TLS握手均匀分布到新进程，而不是在同一时刻涌入；
+        全部连接关闭后start()返回
+        """
+        loop = asyncio.get_running_loop()
+        # 过载等级回落时apply_overload会恢复accept，排空期间不再调整
+        self.overload.stop()
+        self.acceptor.pause()
+        if self.datagram_transport is not None:
+            self.datagram_transport.close()
+            self.datagram_transport = None
+        connections = self.connection_pool.connections
+        initial = len(connections)
+        logger.info(f"Handed over to the new server, draining {initial} connections "
+                    f"over up to {self.drain_timeout:.0f}s")
+        started = loop.time()
+        while connections:
+            elapsed = loop.time() - started
+            if elapsed >= self.drain_timeout:
+                break
+            # 到这个时间点应当还保留的连接数
+            keep = initial - int(initial * elapsed / self.drain_timeout)
+            open_connections = [conn for conn in connections.values() if not conn.writer.is_closing()]
+            open_connections.sort(key=lambda conn: conn.last_active)
+            for conn in open_connections[:max(0, len(open_connections) - keep)]:
+                conn.writer.close()
+            await asyncio.sleep(DRAIN_TICK)
+        for conn in list(connections.values()):
+            conn.writer.close()
+        logger.info(f"Drain finished after {loop.time() - started:.1f}s")
+        self.acceptor.close()
+
+# 主进程转发给所有工作进程的信号: 重新加载证书(SIGHUP)、CPU分析(SIGUSR1)和内存分析(SIGUSR2)，
+# 没有这些信号的平台（Windows）也不支持多进程模式
+FORWARDED_SIGNALS = tuple(getattr(signal, name) for name in ('SIGHUP', 'SIGUSR1', 'SIGUSR2') if hasattr(signal, name))
+
+def run_workers(count: int, options: dict):
+    """预先fork出count个工作进程，各自通过SO_REUSEPORT监听同一端口
+
+    主进程不处理连接，只在工作进程异常退出时重新拉起，并定期汇总共享内存中的指标写入日志
+    """
+    metrics = SharedMetrics.create(METRICS_FILE, count)
+    # pid -> (槽位, 启动时间)
+    workers: Dict[int, Tuple[int, float]] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            # 不继承主进程转发信号的处理器
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # 事件循环注册自己的处理器之前收到的SIGHUP和分析信号不应终止工作进程
+            for signo in FORWARDED_SIGNALS:
+                signal.signal(signo, signal.SIG_IGN)
+            status = 0
+            try:
+                worker_options = dict(options, reuse_port=True, metrics=metrics.slot(index), handover_socket=None)
+                if options.get('trace_file'):
+                    worker_options['trace_file'] = f"{options['trace_file']}.{index}"
+                server = CysteriaServer(**worker_options)
+                asyncio.run(server.start())
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} failed: {str(e)}")
+                status = 1
+            finally:
+                logging.shutdown()
+                os._exit(status)
+        workers[pid] = (index, time.monotonic())
+
+    def stop(signo, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    def forward(signo, frame):
+        # 重新加载证书和按需分析由各工作进程自己完成
+        for pid in workers:
+            os.kill(pid, signo)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for signo in FORWARDED_SIGNALS:
+        signal.signal(signo, forward)
+    preload_modules()
+    for index in range(count):
+        spawn(index)
+    logger.info(f"Started {count} workers, metrics in {METRICS_FILE}")
+
+    last_report = time.monotonic()
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            index, started = workers.pop(pid)
+            metrics.retire(index)
+            if stopping:
+                continue
+            # 启动后很快退出（如端口被占用）时重启也无济于事
+            if time.monotonic() - started < 10:
+                logger.error(f"Worker {pid} exited with status {status} during startup")
+            else:
+                logger.warning(f"Worker {pid} exited with status {status}, restarting")
+                spawn(index)
+            continue
+        time.sleep(1)
+        if time.monotonic() - last_report >= 60:
+            last_report = time.monotonic()
+            stats = metrics.aggregate()
+            logger.info(f"Aggregate Metrics - Workers: {stats['workers']}, Clients: {stats['clients']}, "
+                        f"Frames: {stats['frames']}, Bytes: {stats['bytes']}, "
+                        f"Avg Latency: {stats['latency']['average']:.2f}ms, "
+                        f"p99 Latency: {stats['latency']['p99']}ms, "
+                        f"Error Rate: {stats['error_rate']*100:.2f}%, "
+                        f"Max Loop Lag p99: {stats['loop_lag_p99_ms']:.1f}ms")
+    metrics.close()
+
+def run_server(takeover: bool = False):
+    """运行服务器，takeover为True时接管正在运行的服务器的监听套接字"""
     try:
+        handover = None
+        if takeover:
+            if WORKERS > 1:
+                logger.error("Takeover is only supported with a single worker process")
+                sys.exit(1)
+            handover = take_over(HANDOVER_SOCKET)
+        
         # 初始化配置
-        if not setup():
+        if not setup(handover.port if handover is not None else None):
             sys.exit(1)
             
-        # 创建服务器实例
-        server = CysteriaServer(SERVER_HOST, SERVER_PORT)
+        # 未配置密钥时沿用被接管进程的密钥或随机生成一个，多个工作进程必须使用同一密钥
+        if ENCRYPTION_KEY:
+            encryption_key = ENCRYPTION_KEY.encode()
+        elif handover is not None:
+            encryption_key = handover.encryption_key
+        else:
+            encryption_key = Fernet.generate_key()
+        port = handover.port if handover is not None else server_port()
+        options = dict(host=SERVER_HOST, port=port, engine=SERVER_ENGINE, encryption_key=encryption_key,
+                       datagram=DATAGRAM_ENABLED, compression=COMPRESSION_ENABLED,
+                       rate_limits=RATE_LIMITS, send_queue_bytes=SEND_QUEUE_KB * 1024,
+                       heartbeat_interval=HEARTBEAT_INTERVAL,
+                       heartbeat_misses=HEARTBEAT_MISSES, session_grace=SESSION_GRACE,
+                       socket_profile=SOCKET_PROFILE, profile_duration=PROFILE_DURATION,
+                       overload=OVERLOAD, overload_client_fps=OVERLOAD_CLIENT_FPS,
+                       max_connections=MAX_CONNECTIONS, read_limit=READ_LIMIT,
+                       trace_file=TRACE_FILE, trace_max_bytes=int(TRACE_MAX_MB * 1024 * 1024),
+                       cert_reload_interval=CERT_RELOAD_INTERVAL, drain_timeout=DRAIN_TIMEOUT,
+                       handover_socket=str(HANDOVER_SOCKET) if HANDOVER_SOCKET else None)
+        
+        logger.info(f"Server started on {SERVER_HOST}:{port}")
+        if WORKERS > 1 and hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT'):
+            run_workers(WORKERS, options)
+            return
+        if WORKERS > 1:
+            logger.warning("Multiple workers need fork and SO_REUSEPORT, running a single process")
         
-        # 运行服务器
-        logger.info(f"Server started on {SERVER_HOST}:{SERVER_PORT}")
+        # 创建服务器实例并运行
+        server = CysteriaServer(handover=handover, **options)
         asyncio.run(server.start())
         
     except Exception as e:
@@ -218,9 +765,12 @@ def run_server():
 
 def main():
     """主函数"""
+    # --takeover: 接管正在运行的服务器的监听套接字，旧进程停止accept并逐步排空连接
+    takeover = '--takeover' in sys.argv[1:]
     # 检查是否以守护进程模式运行
-    if len(sys.argv) > 1 and sys.argv[1] == '--daemon':
-        # 创建守护进程
+    if '--daemon' in sys.argv[1:]:
+        import daemon
+        # 创建守护进程，日志文件在脱离终端后再打开，避免被DaemonContext关闭
         with daemon.DaemonContext(
             working_directory=os.getcwd(),
             umask=0o022,
@@ -228,9 +778,11 @@ def main():
                 signal.SIGTERM: lambda signo, frame: sys.exit(0)
             }
         ):
-            run_server()
+            setup_logging()
+            run_server(takeover)
     else:
-        run_server()
+        setup_logging()
+        run_server(takeover)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import errno
+import logging
+import socket
+import ssl
+import struct
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SO_LINGER为(开启, 0秒)时close()直接发送RST，不经过FIN握手也不占用TIME_WAIT
+LINGER_RESET = struct.pack('ii', 1, 0)
+
+# 文件描述符或内存耗尽时accept会一直失败，而监听套接字一直可读；与asyncio一致，停止监听读事件，隔一段时间再恢复
+ACCEPT_RESOURCE_ERRORS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM)
+ACCEPT_RETRY_DELAY = 1.0
+
+class Acceptor:
+    """自行管理监听套接字和accept的服务端入口
+
+    asyncio.start_server不能暂停accept，也不能在TLS握手之前拒绝连接；这里直接在监听套接字上注册读事件，
+    过载时可以暂停accept（新连接留在内核监听队列里），或者在accept后立即以RST关闭，省掉TLS握手的开销。
+    接受的连接交给loop.connect_accepted_socket完成TLS握手并创建协议
+    """
+    def __init__(self, protocol_factory: Callable[[], asyncio.BaseProtocol],
+                 ssl_context: Optional[ssl.SSLContext] = None, backlog: int = 100,
+                 max_accepts: int = 64, reuse_port: bool = False):
+        self.protocol_factory = protocol_factory
+        self.ssl_context = ssl_context
+        self.backlog = backlog
+        # 每次读事件最多accept的连接数，避免连接洪峰时长时间占用事件循环
+        self.max_accepts = max_accepts
+        # 多个工作进程各自监听同一端口，由内核在它们之间分配新连接
+        self.reuse_port = reuse_port
+        self.sockets: List[socket.socket] = []
+        self.paused = False
+        # 为True时accept后立即重置连接
+        self.rejecting = False
+        self.accepted = 0
+        self.rejected = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed: Optional[asyncio.Future] = None
+        # 因资源耗尽暂停监听的套接字和恢复监听的定时器
+        self._retries: Dict[socket.socket, asyncio.TimerHandle] = {}
+
+    async def listen(self, host: str, port: int) -> List[socket.socket]:
+        """在host解析出的每个地址上监听并开始accept"""
+        self._loop = asyncio.get_running_loop()
+        self._closed = self._loop.create_future()
+        infos = await self._loop.getaddrinfo(host or None, port, type=socket.SOCK_STREAM,
+                                             flags=socket.AI_PASSIVE)
+        try:
+            for family, kind, proto, _, address in dict.fromkeys(infos):
+                sock = socket.socket(family, kind, proto)
+                self.sockets.append(sock)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if self.reuse_port:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                if family == socket.AF_INET6 and hasattr(socket, 'IPPROTO_IPV6'):
+                    # 与asyncio一致，IPv6套接字只监听IPv6，IPv4由单独的套接字处理
+                    sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+                sock.bind(address)
+                sock.listen(self.backlog)
+                sock.setblocking(False)
+        except OSError:
+            self.close()
+            raise
+        self.resume()
+        return self.sockets
+
+    async def adopt(self, sockets: List[socket.socket]) -> List[socket.socket]:
+        """在从上一个进程接过来的监听套接字上开始accept"""
+        self._loop = asyncio.get_running_loop()
+        self._closed = self._loop.create_future()
+        for sock in sockets:
+            sock.setblocking(False)
+            self.sockets.append(sock)
+        self.resume()
+        return self.sockets
+
+    def pause(self):
+        """停止accept，已建立的连接不受影响；资源耗尽的退避定时器照常运行，到期时不恢复监听"""
+        if self.paused or self._loop is None:
+            return
+        for sock in self.sockets:
+            self._loop.remove_reader(sock.fileno())
+        self.paused = True
+
+    def resume(self):
+        """恢复accept；仍在资源耗尽退避中的套接字等定时器到期后再恢复监听"""
+        if self._loop is None:
+            return
+        self.paused = False
+        for sock in self.sockets:
+            if sock not in self._retries:
+                self._loop.add_reader(sock.fileno(), self._accept, sock)
+
+    def _cancel_retries(self):
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+
+    def _retry(self, listener: socket.socket):
+        """资源耗尽的退避结束后恢复监听，此时处于pause()状态或已close()时不恢复"""
+        self._retries.pop(listener, None)
+        if not self.paused and listener in self.sockets:
+            self._loop.add_reader(listener.fileno(), self._accept, listener)
+
+    def _accept(self, listener: socket.socket):
+        for _ in range(self.max_accepts):
+            try:
+                conn, addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if e.errno in ACCEPT_RESOURCE_ERRORS:
+                    logger.warning(f"Accept failed: {str(e)}, pausing accept for {ACCEPT_RETRY_DELAY}s")
+                    self._loop.remove_reader(listener.fileno())
+                    self._retries[listener] = self._loop.call_later(ACCEPT_RETRY_DELAY, self._retry, listener)
+                else:
+                    # 连接在accept前被对端重置等，只影响这一个连接
+                    logger.warning(f"Accept failed: {str(e)}")
+                return
+            if self.rejecting:
+                self.rejected += 1
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_RESET)
+                conn.close()
+                continue
+            self.accepted += 1
+            conn.setblocking(False)
+            self._loop.create_task(self._connect(conn, addr))
+
+    async def _connect(self, conn: socket.socket, addr):
+        try:
+            await self._loop.connect_accepted_socket(self.protocol_factory, conn, ssl=self.ssl_context)
+        except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+            logger.debug(f"Handshake with {addr} failed: {str(e)}")
+            conn.close()
+
+    async def serve_forever(self):
+        """阻塞到close()被调用"""
+        await asyncio.shield(self._closed)
+
+    def close(self):
+        self._cancel_retries()
+        if self._loop is not None and not self.paused:
+            for sock in self.sockets:
+                self._loop.remove_reader(sock.fileno())
+        for sock in self.sockets:
+            sock.close()
+        self.sockets = []
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
@@ -3,7 +3,6 @@ import hmac
 import time
 import json
 from typing import Dict, Optional
-import jwt
 from datetime import datetime, timedelta
 
 class AuthenticationManager:
@@ -14,6 +13,8 @@ class AuthenticationManager:
         
     def generate_token(self, client_id: str, client_info: dict) -> str:
         """生成访问令牌"""
+        # PyJWT会连带导入cryptography.x509，推迟到第一次使用
+        import jwt
         payload = {
             'client_id': client_id,
             'client_info': client_info,
@@ -23,6 +24,7 @@ class AuthenticationManager:
         
     def verify_token(self, token: str) -> Optional[dict]:
         """验证访问令牌"""
+        import jwt
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
             return payload
@@ -55,6 +57,10 @@ class AuthenticationManager:
         self.client_tokens[client_id] = token
         return token
         
+    def revoke_token(self, client_id: str):
+        """连接断开时丢弃客户端的令牌"""
+        self.client_tokens.pop(client_id, None)
+        
     def _validate_client_info(self, client_info: dict) -> bool:
         """验证客户端信息 - 始终返回True"""
         return True 
\ No newline at end of file
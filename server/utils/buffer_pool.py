@@ -0,0 +1,46 @@
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+class BufferPool:
+    """可复用的接收缓冲区池
+
+    固定大小的bytearray在连接之间循环使用，超出标准尺寸的大帧
+    临时分配独立缓冲区，用完后直接丢弃
+    """
+    def __init__(self, buffer_size: int = 64 * 1024, max_buffers: int = 1024):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free: List[bytearray] = []
+        self.allocated = 0
+        self.reused = 0
+        self.oversized = 0
+
+    def acquire(self, min_size: int = 0) -> bytearray:
+        """获取一个至少min_size大小的缓冲区"""
+        if min_size > self.buffer_size:
+            self.oversized += 1
+            return bytearray(min_size)
+        if self._free:
+            self.reused += 1
+            return self._free.pop()
+        self.allocated += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray):
+        """归还缓冲区"""
+        if len(buffer) != self.buffer_size:
+            return
+        if len(self._free) < self.max_buffers:
+            self._free.append(buffer)
+
+    def get_stats(self) -> dict:
+        """获取缓冲池统计信息"""
+        return {
+            'buffer_size': self.buffer_size,
+            'free': len(self._free),
+            'allocated': self.allocated,
+            'reused': self.reused,
+            'oversized': self.oversized
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import signal
+import ssl
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 有效期少于这个天数时每次加载都发出警告
+EXPIRY_WARNING_DAYS = 14
+
+def build_ssl_context(certfile: Path, keyfile: Path) -> ssl.SSLContext:
+    """加载证书链和私钥，证书与私钥不匹配时抛出ssl.SSLError"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile=str(certfile), keyfile=str(keyfile))
+    return context
+
+def certificate_expiry(certfile: Path):
+    """读取证书链中第一张证书的到期时间(UTC)，无法解析时返回None"""
+    try:
+        from cryptography import x509
+        cert = x509.load_pem_x509_certificate(Path(certfile).read_bytes())
+    except (OSError, ValueError):
+        return None
+    return getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after
+
+class CertificateReloader:
+    """证书和私钥的热更新
+
+    每隔interval秒检查两个文件的修改时间、大小和inode，变化时（或收到SIGHUP时）在线程池中构建新的SSLContext，
+    成功后通过on_reload原子替换，只影响之后的TLS握手，已建立的连接继续使用原来的上下文。
+    构建失败（如证书和私钥只更新了一个）时保留当前上下文，下次检查时重试。interval为0时只响应SIGHUP
+    """
+    def __init__(self, certfile: Path, keyfile: Path, on_reload: Callable[[ssl.SSLContext], None],
+                 interval: float = 30.0):
+        self.certfile = Path(certfile)
+        self.keyfile = Path(keyfile)
+        self.on_reload = on_reload
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self._signature = self.signature()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reloading: Optional[asyncio.Task] = None
+
+    def signature(self) -> Tuple:
+        """两个文件的(inode, 大小, 修改时间)，文件不存在时为None"""
+        result = []
+        for path in (self.certfile, self.keyfile):
+            try:
+                st = os.stat(path)
+            except OSError:
+                result.append(None)
+                continue
+            result.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        return tuple(result)
+
+    def load(self) -> ssl.SSLContext:
+        """同步加载当前文件，用于启动时；到期检查需要解析证书，由start()和reload()在线程池中进行"""
+        return build_ssl_context(self.certfile, self.keyfile)
+
+    def _load_and_check(self) -> ssl.SSLContext:
+        context = self.load()
+        self._log_expiry()
+        return context
+
+    def _log_expiry(self):
+        expiry = certificate_expiry(self.certfile)
+        if expiry is None:
+            return
+        from datetime import datetime, timezone
+        if expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        days = (expiry - datetime.now(timezone.utc)).total_seconds() / 86400
+        if days < EXPIRY_WARNING_DAYS:
+            logger.warning(f"TLS certificate {self.certfile} expires in {days:.1f} days ({expiry.isoformat()})")
+        else:
+            logger.info(f"TLS certificate {self.certfile} valid until {expiry.isoformat()}")
+
+    async def reload(self) -> bool:
+        """在线程池中构建新的上下文并替换，返回是否成功"""
+        signature = self.signature()
+        loop = asyncio.get_running_loop()
+        try:
+            context = await loop.run_in_executor(None, self._load_and_check)
+        except (OSError, ssl.SSLError) as e:
+            self.failures += 1
+            logger.error(f"Failed to reload TLS certificate, keeping the current one: {str(e)}")
+            return False
+        self._signature = signature
+        self.on_reload(context)
+        self.reloads += 1
+        logger.info(f"TLS certificate reloaded from {self.certfile}")
+        return True
+
+    def request_reload(self):
+        """信号处理器中调用，正在加载时忽略"""
+        if self._reloading is None or self._reloading.done():
+            self._reloading = asyncio.ensure_future(self.reload())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.signature() != self._signature:
+                await self.reload()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """注册SIGHUP并开始定期检查，启动时的到期检查在线程池中进行，不推迟开始accept"""
+        self._loop = loop
+        loop.run_in_executor(None, self._log_expiry)
+        if hasattr(signal, 'SIGHUP'):
+            loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._loop is not None and hasattr(signal, 'SIGHUP'):
+            self._loop.remove_signal_handler(signal.SIGHUP)
+            self._loop = None
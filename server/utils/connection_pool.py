@@ -1,30 +1,34 @@
 import asyncio
-from typing import Dict, Set
+from typing import Dict, Optional
 import time
 import logging
-from dataclasses import dataclass
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-@dataclass
 class ConnectionInfo:
-    reader: asyncio.StreamReader
-    writer: asyncio.StreamWriter
-    last_active: datetime
-    client_id: str
-    token: str
+    """连接池中的一条连接
+
+    每条空闲连接都常驻一个，用__slots__和单调时钟的浮点数代替dataclass和datetime；
+    访问令牌由AuthenticationManager保存，这里不再重复引用
+    """
+    __slots__ = ('reader', 'writer', 'last_active', 'client_id')
+
+    def __init__(self, reader: Optional[asyncio.StreamReader], writer: asyncio.StreamWriter,
+                 last_active: float, client_id: str):
+        self.reader = reader
+        self.writer = writer
+        self.last_active = last_active
+        self.client_id = client_id
 
 class ConnectionPool:
     def __init__(self, max_connections: int = 1000, idle_timeout: int = 300):
         self.max_connections = max_connections
         self.idle_timeout = idle_timeout
         self.connections: Dict[str, ConnectionInfo] = {}
-        self.active_connections: Set[str] = set()
         self._cleanup_task = None
         
-    async def add_connection(self, client_id: str, reader: asyncio.StreamReader, 
-                           writer: asyncio.StreamWriter, token: str) -> bool:
+    async def add_connection(self, client_id: str, reader: Optional[asyncio.StreamReader],
+                           writer: asyncio.StreamWriter) -> bool:
         """添加新连接到连接池"""
         if len(self.connections) >= self.max_connections:
             logger.warning(f"Connection pool is full, rejecting connection from {client_id}")
@@ -33,14 +37,7 @@ class ConnectionPool:
         if client_id in self.connections:
             await self.remove_connection(client_id)
             
-        self.connections[client_id] = ConnectionInfo(
-            reader=reader,
-            writer=writer,
-            last_active=datetime.now(),
-            client_id=client_id,
-            token=token
-        )
-        self.active_connections.add(client_id)
+        self.connections[client_id] = ConnectionInfo(reader, writer, time.monotonic(), client_id)
         logger.info(f"New connection added: {client_id}")
         return True
         
@@ -51,21 +48,20 @@ class ConnectionPool:
             conn.writer.close()
             await conn.writer.wait_closed()
             del self.connections[client_id]
-            self.active_connections.discard(client_id)
             logger.info(f"Connection removed: {client_id}")
             
     async def update_activity(self, client_id: str):
         """更新连接的最后活动时间"""
         if client_id in self.connections:
-            self.connections[client_id].last_active = datetime.now()
+            self.connections[client_id].last_active = time.monotonic()
             
     async def cleanup_idle_connections(self):
         """清理空闲连接"""
         while True:
             await asyncio.sleep(60)  # 每分钟检查一次
-            current_time = datetime.now()
+            current_time = time.monotonic()
             for client_id, conn in list(self.connections.items()):
-                idle_time = (current_time - conn.last_active).total_seconds()
+                idle_time = current_time - conn.last_active
                 if idle_time > self.idle_timeout:
                     logger.info(f"Removing idle connection: {client_id}")
                     await self.remove_connection(client_id)
@@ -87,4 +83,4 @@ class ConnectionPool:
         
     def get_active_connections_count(self) -> int:
         """获取活动连接数"""
-        return len(self.active_connections) 
\ No newline at end of file
+        return len(self.connections)
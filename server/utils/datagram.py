@@ -0,0 +1,321 @@
+import asyncio
+import errno
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+logger = logging.getLogger(__name__)
+
+# 数据报头: 8字节会话ID + 8字节包序号 + 4字节消息ID + 分片序号 + 分片总数，整体作为AEAD附加数据
+PACKET_HEADER = struct.Struct('!8sQIBB')
+TAG_SIZE = 16
+# IPv6(40) + UDP(8)，按较大的IP头计算，IPv4下会多留出20字节余量
+IP_UDP_OVERHEAD = 48
+DEFAULT_MTU = 1400
+MIN_MTU = 576
+MAX_FRAGMENTS = 255
+
+# 方向前缀，保证同一会话两个方向的nonce不会重复
+CLIENT_TO_SERVER = b'C2S\x00'
+SERVER_TO_CLIENT = b'S2C\x00'
+
+# 控制数据报的分片总数为0，分片序号区分类型，数据报末尾是截断的HMAC
+# HELLO: 客户端随机数; WELCOME: 客户端随机数 + 服务端随机数; RESET: 服务端不认识该会话，包序号为被丢弃的数据报的序号
+PACKET_HELLO = 0
+PACKET_WELCOME = 1
+PACKET_RESET = 2
+HANDSHAKE_NONCE_SIZE = 16
+MAC_SIZE = 16
+
+# Linux下的PMTU相关选项
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+
+def derive_session_key(master_key: bytes, session_id: bytes, client_nonce: bytes, server_nonce: bytes) -> bytes:
+    """从主密钥、会话ID和握手双方的随机数派生每个会话独立的AEAD密钥
+
+    服务端随机数保证服务端每次建立会话（包括重启、交接或清理后）都使用新的密钥，包序号从0开始也不会重用nonce
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=session_id + client_nonce + server_nonce,
+        info=b'cysteria datagram'
+    ).derive(master_key)
+
+def derive_control_key(master_key: bytes) -> bytes:
+    """控制数据报的HMAC密钥"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'cysteria datagram control'
+    ).derive(master_key)
+
+def pack_control(key: bytes, session_id: bytes, kind: int, body: bytes = b'', seq: int = 0) -> bytes:
+    """构造控制数据报"""
+    header = PACKET_HEADER.pack(session_id, seq, 0, kind, 0)
+    return header + body + hmac.new(key, header + body, hashlib.sha256).digest()[:MAC_SIZE]
+
+def unpack_control(key: bytes, packet: bytes) -> Optional[Tuple[bytes, int, int, bytes]]:
+    """校验控制数据报，返回(会话ID, 类型, 包序号, 内容)，不是控制数据报或校验失败时返回None"""
+    if len(packet) < PACKET_HEADER.size + MAC_SIZE:
+        return None
+    session_id, seq, _, kind, count = PACKET_HEADER.unpack_from(packet)
+    if count != 0:
+        return None
+    expected = hmac.new(key, packet[:-MAC_SIZE], hashlib.sha256).digest()[:MAC_SIZE]
+    if not hmac.compare_digest(expected, packet[-MAC_SIZE:]):
+        return None
+    return session_id, kind, seq, packet[PACKET_HEADER.size:-MAC_SIZE]
+
+def max_fragment_payload(mtu: int) -> int:
+    """给定路径MTU时单个数据报可携带的明文字节数"""
+    return mtu - IP_UDP_OVERHEAD - PACKET_HEADER.size - TAG_SIZE
+
+def enable_pmtu_discovery(sock: socket.socket):
+    """设置DF位，超过路径MTU的发送会报EMSGSIZE而不是被分片"""
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+    except OSError:
+        pass
+
+def query_path_mtu(sock: socket.socket, default: int = DEFAULT_MTU) -> int:
+    """读取已connect的UDP套接字上内核记录的路径MTU，不支持时返回default"""
+    try:
+        return min(default, sock.getsockopt(socket.IPPROTO_IP, IP_MTU))
+    except OSError:
+        return default
+
+class ReplayWindow:
+    """滑动窗口防重放，用整数位图记录最近window个序号"""
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.highest = -1
+        self.bitmap = 0
+
+    def check_and_update(self, seq: int) -> bool:
+        """序号首次出现且未落到窗口之外时返回True并记录"""
+        if seq > self.highest:
+            shift = seq - self.highest
+            if shift >= self.window:
+                self.bitmap = 1
+            else:
+                self.bitmap = ((self.bitmap << shift) | 1) & ((1 << self.window) - 1)
+            self.highest = seq
+            return True
+        offset = self.highest - seq
+        if offset >= self.window:
+            return False
+        mask = 1 << offset
+        if self.bitmap & mask:
+            return False
+        self.bitmap |= mask
+        return True
+
+class PacketCodec:
+    """一个会话单方向的分片、加密与另一方向的解密、重组"""
+    def __init__(self, key: bytes, session_id: bytes, send_prefix: bytes, recv_prefix: bytes,
+                 mtu: int = DEFAULT_MTU, reassembly_timeout: float = 5.0):
+        self.aead = AESGCM(key)
+        self.session_id = session_id
+        self.send_prefix = send_prefix
+        self.recv_prefix = recv_prefix
+        self.mtu = mtu
+        self.reassembly_timeout = reassembly_timeout
+        self.send_seq = 0
+        self.next_message_id = 0
+        self.replay = ReplayWindow()
+        self.accepted = 0
+        # 消息ID -> (首个分片到达时间, 分片列表)
+        self.partial: Dict[int, Tuple[float, List[Optional[bytes]]]] = {}
+
+    def encode(self, message: bytes) -> List[bytes]:
+        """把一条消息切成不超过路径MTU的加密数据报"""
+        chunk = max_fragment_payload(self.mtu)
+        count = max(1, -(-len(message) // chunk))
+        if count > MAX_FRAGMENTS:
+            raise ValueError(f"Message too large for datagram transport: {len(message)}")
+        message_id = self.next_message_id
+        self.next_message_id = (self.next_message_id + 1) & 0xFFFFFFFF
+        view = memoryview(message)
+        packets = []
+        for index in range(count):
+            header = PACKET_HEADER.pack(self.session_id, self.send_seq, message_id, index, count)
+            nonce = self.send_prefix + self.send_seq.to_bytes(8, 'big')
+            self.send_seq += 1
+            packets.append(header + self.aead.encrypt(nonce, view[index * chunk:(index + 1) * chunk], header))
+        return packets
+
+    def decode(self, packet: bytes) -> Optional[bytes]:
+        """解密一个数据报，消息的最后一个分片到达时返回完整消息
+
+        认证失败或重放的数据报被丢弃并返回None
+        """
+        if len(packet) < PACKET_HEADER.size + TAG_SIZE:
+            return None
+        header = packet[:PACKET_HEADER.size]
+        session_id, seq, message_id, index, count = PACKET_HEADER.unpack(header)
+        if session_id != self.session_id or index >= count:
+            return None
+        nonce = self.recv_prefix + seq.to_bytes(8, 'big')
+        try:
+            plaintext = self.aead.decrypt(nonce, packet[PACKET_HEADER.size:], header)
+        except Exception:
+            return None
+        # 认证通过后再更新防重放窗口，伪造的数据报不能推动窗口
+        if not self.replay.check_and_update(seq):
+            return None
+        self.accepted += 1
+        if count == 1:
+            return plaintext
+        now = time.monotonic()
+        started, fragments = self.partial.setdefault(message_id, (now, [None] * count))
+        fragments[index] = plaintext
+        if all(fragment is not None for fragment in fragments):
+            del self.partial[message_id]
+            return b''.join(fragments)
+        self._expire(now)
+        return None
+
+    def _expire(self, now: float):
+        """丢弃超时仍未重组完成的消息"""
+        for message_id, (started, _) in list(self.partial.items()):
+            if now - started > self.reassembly_timeout:
+                del self.partial[message_id]
+
+    def lower_mtu(self):
+        """收到EMSGSIZE时降低路径MTU"""
+        self.mtu = max(MIN_MTU, self.mtu - 128)
+
+class DatagramSession:
+    """服务端的UDP会话，地址可以随客户端漫游而更新"""
+    def __init__(self, session_id: bytes, addr, codec: PacketCodec, client_nonce: bytes, server_nonce: bytes):
+        self.session_id = session_id
+        self.addr = addr
+        self.codec = codec
+        self.client_nonce = client_nonce
+        self.server_nonce = server_nonce
+        self.client_id = f"udp:{session_id.hex()}"
+        self.last_active = time.monotonic()
+
+class DatagramTunnelProtocol(asyncio.DatagramProtocol):
+    """UDP隧道传输：每包独立AEAD、防重放窗口、按路径MTU分片
+
+    handler接收(client_id, 消息)并返回响应消息。会话由HELLO/WELCOME握手建立，密钥包含服务端随机数；
+    不认识的会话的数据报（空闲清理、重启、交接后）一律丢弃并回复RESET，客户端重新握手，不会用旧密钥重建会话
+    """
+    def __init__(self, master_key: bytes, handler: Callable, mtu: int = DEFAULT_MTU,
+                 idle_timeout: float = 300.0, max_sessions: int = 10000):
+        self.master_key = master_key
+        self.control_key = derive_control_key(master_key)
+        self.handler = handler
+        self.mtu = mtu
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions: Dict[bytes, DatagramSession] = {}
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.dropped = 0
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            enable_pmtu_discovery(sock)
+        self._sweep_task = asyncio.get_running_loop().create_task(self._sweep_idle())
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) < PACKET_HEADER.size + TAG_SIZE:
+            self.dropped += 1
+            return
+        session_id, seq, _, _, count = PACKET_HEADER.unpack_from(data)
+        if count == 0:
+            self._handle_hello(data, addr)
+            return
+        session = self.sessions.get(session_id)
+        if session is None:
+            # RESET不比触发它的数据报长，不能被用来放大流量
+            self.dropped += 1
+            if self.transport is not None:
+                self.transport.sendto(pack_control(self.control_key, session_id, PACKET_RESET, seq=seq), addr)
+            return
+        accepted = session.codec.accepted
+        message = session.codec.decode(data)
+        if session.codec.accepted == accepted:
+            # 认证失败或重放
+            self.dropped += 1
+            return
+        session.addr = addr
+        session.last_active = time.monotonic()
+        if message is not None:
+            asyncio.ensure_future(self._respond(session, message))
+
+    def _handle_hello(self, data: bytes, addr):
+        """建立会话并回复WELCOME；重复的HELLO（WELCOME丢失时客户端重发）得到同样的回复"""
+        control = unpack_control(self.control_key, data)
+        if control is None or control[1] != PACKET_HELLO or len(control[3]) != HANDSHAKE_NONCE_SIZE:
+            self.dropped += 1
+            return
+        session_id, _, _, client_nonce = control
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                self.dropped += 1
+                return
+            server_nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+            key = derive_session_key(self.master_key, session_id, client_nonce, server_nonce)
+            codec = PacketCodec(key, session_id, SERVER_TO_CLIENT, CLIENT_TO_SERVER, self.mtu)
+            session = DatagramSession(session_id, addr, codec, client_nonce, server_nonce)
+            self.sessions[session_id] = session
+            logger.info(f"New datagram session {session.client_id} from {addr[0]}:{addr[1]}")
+        elif session.client_nonce != client_nonce:
+            # 会话ID已被另一次握手占用
+            self.dropped += 1
+            return
+        if self.transport is not None:
+            self.transport.sendto(pack_control(self.control_key, session_id, PACKET_WELCOME,
+                                               session.client_nonce + session.server_nonce), addr)
+
+    async def _respond(self, session: DatagramSession, message: bytes):
+        try:
+            response = await self.handler(session.client_id, message)
+        except Exception as e:
+            logger.error(f"Error handling datagram from {session.client_id}: {str(e)}")
+            return
+        if response is not None and self.transport is not None:
+            for packet in session.codec.encode(response):
+                self.transport.sendto(packet, session.addr)
+
+    def error_received(self, exc: Exception):
+        if isinstance(exc, OSError) and exc.errno == errno.EMSGSIZE:
+            # 无连接套接字无法得知是哪个对端，统一降低所有会话的MTU
+            for session in self.sessions.values():
+                session.codec.lower_mtu()
+            logger.warning("Datagram exceeded path MTU, lowering MTU")
+        else:
+            logger.debug(f"Datagram error: {str(exc)}")
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+
+    async def _sweep_idle(self):
+        """定期清理空闲会话"""
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_active > self.idle_timeout:
+                    del self.sessions[session_id]
+                    logger.info(f"Removing idle datagram session: {session.client_id}")
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 class ErrorHandler:
     def __init__(self, log_dir: str = "logs"):
         self.log_dir = Path(log_dir)
-        self.log_dir.mkdir(exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
         self.error_log_file = self.log_dir / "error.log"
         self.setup_logging()
         
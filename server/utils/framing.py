@@ -0,0 +1,53 @@
+import struct
+from typing import Iterator, Tuple
+
+# 帧头: 1字节类型 + 4字节负载长度(网络字节序)
+FRAME_HEADER = struct.Struct('!BI')
+HEADER_SIZE = FRAME_HEADER.size
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# 帧类型
+FRAME_DATA = 0x00
+FRAME_HELLO = 0x01
+FRAME_STRIPE = 0x02
+FRAME_PING = 0x03
+FRAME_PONG = 0x04
+FRAME_RESUME = 0x05
+FRAME_ACK = 0x06
+# 流式加密的分段，一条消息的首帧为流头
+FRAME_SEGMENT = 0x07
+
+class FrameError(ValueError):
+    """帧格式错误"""
+
+def pack_header(frame_type: int, length: int) -> bytes:
+    """打包帧头"""
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame too large: {length}")
+    return FRAME_HEADER.pack(frame_type, length)
+
+def pack_frame(frame_type: int, payload: bytes) -> bytes:
+    """打包完整的帧"""
+    return pack_header(frame_type, len(payload)) + payload
+
+def unpack_header(header) -> Tuple[int, int]:
+    """解析帧头，返回(类型, 长度)"""
+    frame_type, length = FRAME_HEADER.unpack_from(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame too large: {length}")
+    return frame_type, length
+
+def iter_frames(buffer: memoryview) -> Iterator[Tuple[int, memoryview, int]]:
+    """从缓冲区中依次切出完整的帧
+
+    返回(类型, 负载视图, 帧结束偏移)，不足一帧的剩余数据留给调用方
+    """
+    offset = 0
+    end = len(buffer)
+    while end - offset >= HEADER_SIZE:
+        frame_type, length = unpack_header(buffer[offset:offset + HEADER_SIZE])
+        frame_end = offset + HEADER_SIZE + length
+        if frame_end > end:
+            break
+        yield frame_type, buffer[offset + HEADER_SIZE:frame_end], frame_end
+        offset = frame_end
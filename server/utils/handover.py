@@ -0,0 +1,174 @@
+import array
+import asyncio
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 交接协议: 新进程发送REQUEST，旧进程用SCM_RIGHTS回传监听套接字和描述它们的JSON，
+# 新进程开始accept后回复READY，旧进程随即停止accept并开始排空
+REQUEST = b'TAKEOVER'
+READY = b'READY'
+MAX_FDS = 16
+MAX_MESSAGE = 4096
+
+def send_fds(sock: socket.socket, payload: bytes, fds: List[int]):
+    """随消息发送文件描述符（socket.send_fds要求Python 3.9）"""
+    sock.sendmsg([payload], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+def recv_fds(sock: socket.socket, size: int, max_fds: int) -> Tuple[bytes, List[int]]:
+    """接收消息和随附的文件描述符"""
+    fds = array.array('i')
+    payload, ancdata, _, _ = sock.recvmsg(size, socket.CMSG_LEN(max_fds * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    return payload, list(fds)
+
+class Handover:
+    """新进程从旧进程接过来的监听套接字"""
+    def __init__(self, conn: socket.socket, port: int, encryption_key: bytes, listeners: List[socket.socket],
+                 datagram: Optional[socket.socket]):
+        self.conn = conn
+        self.port = port
+        # 未配置ENCRYPTION_KEY时旧进程使用的随机密钥，沿用它已连接的客户端才能重连到新进程
+        self.encryption_key = encryption_key
+        self.listeners = listeners
+        self.datagram = datagram
+
+    def ready(self):
+        """已开始accept，通知旧进程停止accept并排空连接"""
+        try:
+            self.conn.sendall(READY)
+        except OSError as e:
+            logger.warning(f"Failed to notify the previous server: {str(e)}")
+        finally:
+            self.conn.close()
+
+def take_over(path: Path, timeout: float = 10.0) -> Optional[Handover]:
+    """连接正在运行的服务器的交接套接字并取回监听套接字，没有可接管的服务器时返回None"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(str(path))
+        conn.sendall(REQUEST)
+        payload, fds = recv_fds(conn, MAX_MESSAGE, MAX_FDS)
+    except OSError as e:
+        conn.close()
+        logger.warning(f"No running server to take over at {path}: {str(e)}")
+        return None
+    try:
+        info = json.loads(payload)
+        sockets = [socket.socket(fileno=fd) for fd in fds]
+    except (ValueError, OSError) as e:
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+        logger.error(f"Invalid handover message from {path}: {str(e)}")
+        return None
+    listeners = sockets[:info['listeners']]
+    datagram = sockets[info['listeners']] if len(sockets) > info['listeners'] else None
+    logger.info(f"Took over {len(listeners)} listening sockets on port {info['port']} "
+                f"from pid {info['pid']}")
+    return Handover(conn, info['port'], info['encryption_key'].encode(), listeners, datagram)
+
+class HandoverServer:
+    """在Unix套接字上等待新进程接管监听套接字
+
+    交接在线程池中用阻塞套接字完成，新进程回复READY后调用on_handover（停止accept并排空连接）；
+    新进程启动失败、没有回复READY时旧进程继续正常服务。交接消息中带有加密密钥，套接字只允许属主访问
+    """
+    def __init__(self, path: Path, port: int, encryption_key: bytes,
+                 get_sockets: Callable[[], Tuple[List[socket.socket], Optional[socket.socket]]],
+                 on_handover: Callable[[], Awaitable[None]], timeout: float = 30.0):
+        self.path = Path(path)
+        self.port = port
+        self.encryption_key = encryption_key
+        self.get_sockets = get_sockets
+        self.on_handover = on_handover
+        self.timeout = timeout
+        self.handed_over = False
+        self._sock: Optional[socket.socket] = None
+        self._inode: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """绑定交接套接字；路径上残留的旧套接字（包括被接管的旧进程的）直接替换"""
+        self._loop = loop
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(str(self.path))
+            os.chmod(self.path, 0o600)
+            sock.listen(1)
+        except OSError as e:
+            sock.close()
+            logger.warning(f"Handover socket {self.path} unavailable: {str(e)}")
+            return
+        sock.setblocking(False)
+        self._sock = sock
+        self._inode = os.stat(self.path).st_ino
+        loop.add_reader(sock.fileno(), self._accept)
+
+    def _accept(self):
+        try:
+            conn, _ = self._sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        # 同一时间只处理一次交接
+        self._loop.remove_reader(self._sock.fileno())
+        self._loop.create_task(self._serve(conn))
+
+    async def _serve(self, conn: socket.socket):
+        conn.setblocking(True)
+        conn.settimeout(self.timeout)
+        try:
+            ready = await self._loop.run_in_executor(None, self._exchange, conn)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Handover failed, continuing to serve: {str(e)}")
+            ready = False
+        finally:
+            conn.close()
+        if not ready:
+            if self._sock is not None:
+                self._loop.add_reader(self._sock.fileno(), self._accept)
+            return
+        self.handed_over = True
+        # 交接套接字的路径此时已属于新进程
+        self.close(unlink=False)
+        await self.on_handover()
+
+    def _exchange(self, conn: socket.socket) -> bool:
+        if conn.recv(len(REQUEST)) != REQUEST:
+            raise ValueError("unexpected handover request")
+        listeners, datagram = self.get_sockets()
+        fds = [sock.fileno() for sock in listeners]
+        if datagram is not None:
+            fds.append(datagram.fileno())
+        info = {'pid': os.getpid(), 'port': self.port, 'listeners': len(listeners),
+                'encryption_key': self.encryption_key.decode()}
+        send_fds(conn, json.dumps(info).encode(), fds)
+        logger.info(f"Sent {len(fds)} sockets to the new server, waiting for it to start accepting")
+        return conn.recv(len(READY)) == READY
+
+    def close(self, unlink: bool = True):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        if unlink:
+            # 只删除自己绑定的路径
+            try:
+                if os.stat(self.path).st_ino == self._inode:
+                    self.path.unlink()
+            except OSError:
+                pass
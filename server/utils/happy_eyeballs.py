@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (地址族, sockaddr)
+Address = Tuple[int, tuple]
+Resolver = Callable[[str, int], Awaitable[List[Address]]]
+
+# RFC 8305 建议的连接尝试间隔
+DEFAULT_ATTEMPT_DELAY = 0.25
+# 最多记住多少个目标的地址族偏好
+MAX_PREFERENCES = 4096
+
+async def system_resolver(host: str, port: int) -> List[Address]:
+    """用事件循环的getaddrinfo解析目标地址"""
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addresses = []
+    for family, _, _, _, sockaddr in infos:
+        if (family, sockaddr) not in addresses:
+            addresses.append((family, sockaddr))
+    return addresses
+
+def interleave(addresses: List[Address], first_family: int) -> List[Address]:
+    """按地址族交替排列，first_family的地址排在最前（RFC 8305 第4节）"""
+    preferred = [a for a in addresses if a[0] == first_family]
+    others = [a for a in addresses if a[0] != first_family]
+    ordered = []
+    for index in range(max(len(preferred), len(others))):
+        if index < len(preferred):
+            ordered.append(preferred[index])
+        if index < len(others):
+            ordered.append(others[index])
+    return ordered
+
+class UpstreamConnector:
+    """Happy Eyeballs式的上游连接器
+
+    按地址族交替、每隔attempt_delay启动一次连接尝试（前一次失败时立即启动下一次），
+    第一个成功的连接胜出，其余尝试被取消；每个目标记住胜出的地址族一段时间，
+    最多记住max_preferences个目标，超出时淘汰最久未使用的
+    """
+    def __init__(self, resolver: Optional[Resolver] = None, attempt_delay: float = DEFAULT_ATTEMPT_DELAY,
+                 connect_timeout: float = 10.0, preference_ttl: float = 600.0,
+                 max_preferences: int = MAX_PREFERENCES):
+        self.resolver = resolver or system_resolver
+        self.attempt_delay = attempt_delay
+        self.connect_timeout = connect_timeout
+        self.preference_ttl = preference_ttl
+        self.max_preferences = max_preferences
+        # (host, port) -> (地址族, 过期时间)，按最近使用排序
+        self.preferences: 'OrderedDict[Tuple[str, int], Tuple[int, float]]' = OrderedDict()
+        self.stats = {'connects': 0, 'fallbacks': 0, 'failures': 0}
+
+    def preferred_family(self, host: str, port: int) -> int:
+        """目标最近一次胜出的地址族，没有记录时优先IPv6"""
+        preference = self.preferences.get((host, port))
+        if preference is not None:
+            family, expires = preference
+            if time.monotonic() < expires:
+                self.preferences.move_to_end((host, port))
+                return family
+            del self.preferences[(host, port)]
+        return socket.AF_INET6
+
+    async def _attempt(self, family: int, sockaddr: tuple) -> socket.socket:
+        """一次非阻塞的TCP连接尝试"""
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, sockaddr)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    async def connect_socket(self, host: str, port: int) -> socket.socket:
+        """竞速连接，返回已连接的套接字"""
+        addresses = await self.resolver(host, port)
+        if not addresses:
+            raise OSError(f"No addresses found for {host}")
+        ordered = interleave(addresses, self.preferred_family(host, port))
+
+        attempts: Dict[asyncio.Task, Address] = {}
+        errors: List[Exception] = []
+        winner: Optional[Tuple[socket.socket, Address]] = None
+        next_index = 0
+        deadline = time.monotonic() + self.connect_timeout
+        try:
+            while winner is None:
+                if next_index < len(ordered):
+                    address = ordered[next_index]
+                    next_index += 1
+                    attempts[asyncio.ensure_future(self._attempt(*address))] = address
+                pending = [task for task in attempts if not task.done()]
+                if not pending and next_index >= len(ordered):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # 还有未尝试的地址时最多等attempt_delay，某次尝试失败时立即开始下一次
+                timeout = min(self.attempt_delay, remaining) if next_index < len(ordered) else remaining
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = (task.result(), attempts[task])
+                    else:
+                        # 同时完成的多余连接
+                        task.result().close()
+        except BaseException:
+            if winner is not None:
+                winner[0].close()
+            raise
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+            # 取消过程中恰好完成的连接
+            for task in attempts:
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                if winner is None or task.result() is not winner[0]:
+                    task.result().close()
+
+        if winner is None:
+            self.stats['failures'] += 1
+            if errors:
+                raise OSError(f"All connection attempts to {host}:{port} failed: {errors[-1]}")
+            raise asyncio.TimeoutError(f"Connection to {host}:{port} timed out")
+
+        sock, (family, sockaddr) = winner
+        self.stats['connects'] += 1
+        if (family, sockaddr) != ordered[0]:
+            self.stats['fallbacks'] += 1
+            logger.info(f"Upstream {host}:{port} connected via fallback address {sockaddr[0]}")
+        self.preferences[(host, port)] = (family, time.monotonic() + self.preference_ttl)
+        self.preferences.move_to_end((host, port))
+        while len(self.preferences) > self.max_preferences:
+            self.preferences.popitem(last=False)
+        return sock
+
+    async def open_connection(self, host: str, port: int, **kwargs):
+        """竞速连接并返回(reader, writer)"""
+        sock = await self.connect_socket(host, port)
+        return await asyncio.open_connection(sock=sock, **kwargs)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import struct
+import time
+from typing import Dict, List, Optional
+
+from utils.framing import FRAME_PING, pack_frame
+
+logger = logging.getLogger(__name__)
+
+# PING/PONG负载: 发送方的单调时钟（纳秒），对端原样回显
+PING_PAYLOAD = struct.Struct('!Q')
+
+class PeerState:
+    """一条连接的心跳状态"""
+    __slots__ = ('writer', 'last_seen', 'responsive')
+
+    def __init__(self, writer, now: float):
+        self.writer = writer
+        self.last_seen = now
+        # 回应过PONG的连接才按心跳判定失效，旧版本客户端交给连接池的空闲超时
+        self.responsive = False
+
+class HeartbeatMonitor:
+    """连接保活和失效检测
+
+    每隔interval向所有连接发送一次PING，PONG回来时测量RTT并报告给PerformanceMonitor；
+    回应过PONG的连接超过 interval*misses 秒没有收到任何帧时判定为失效并立即关闭。
+    所有连接共用一个定时任务，interval为0时关闭心跳
+    """
+    def __init__(self, interval: float = 15.0, misses: int = 3, performance_monitor=None):
+        self.interval = interval
+        self.misses = misses
+        self.performance_monitor = performance_monitor
+        self.peers: Dict[str, PeerState] = {}
+        self.dead_peers = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def register(self, client_id: str, writer):
+        self.peers[client_id] = PeerState(writer, time.monotonic())
+
+    def unregister(self, client_id: str):
+        self.peers.pop(client_id, None)
+
+    def seen(self, client_id: str):
+        """收到对端的任何数据都说明连接存活"""
+        peer = self.peers.get(client_id)
+        if peer is not None:
+            peer.last_seen = time.monotonic()
+
+    def handle_pong(self, client_id: str, payload):
+        """根据回显的发送时间计算RTT"""
+        peer = self.peers.get(client_id)
+        if peer is None or len(payload) != PING_PAYLOAD.size:
+            return
+        (sent,) = PING_PAYLOAD.unpack_from(payload)
+        rtt = (time.monotonic_ns() - sent) / 1e6
+        peer.responsive = True
+        if self.performance_monitor is not None:
+            self.performance_monitor.record_rtt(client_id, rtt)
+
+    def sweep(self, now: float) -> List[str]:
+        """关闭失效的连接并向其余连接发送PING，返回被关闭的连接"""
+        deadline = self.interval * self.misses
+        ping = pack_frame(FRAME_PING, PING_PAYLOAD.pack(time.monotonic_ns()))
+        dead = []
+        for client_id, peer in list(self.peers.items()):
+            if peer.writer.is_closing():
+                continue
+            if peer.responsive and now - peer.last_seen > deadline:
+                logger.info(f"Peer {client_id} missed {self.misses} heartbeats, closing connection")
+                # 对端已失联，不等待TLS关闭握手
+                peer.writer.transport.abort()
+                self.peers.pop(client_id, None)
+                dead.append(client_id)
+                continue
+            peer.writer.write(ping)
+        self.dead_peers += len(dead)
+        return dead
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sweep(time.monotonic())
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 事件循环延迟直方图的桶上界(毫秒)，最后一个桶收集超过最大上界的样本
+LAG_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 过载等级
+LEVEL_NORMAL = 0
+# 拒绝新连接并降低每个客户端的发送预算
+LEVEL_SHEDDING = 1
+# 停止accept，新连接留在内核监听队列中
+LEVEL_PAUSED = 2
+LEVEL_NAMES = ('normal', 'shedding', 'paused')
+
+class LagHistogram:
+    """事件循环延迟的固定桶直方图"""
+    __slots__ = ('counts', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, lag_ms: float):
+        for index, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                break
+        else:
+            index = len(LAG_BUCKETS_MS)
+        self.counts[index] += 1
+        self.count += 1
+        self.max = max(self.max, lag_ms)
+
+    def percentile(self, q: float) -> float:
+        """按桶上界估计百分位，落在最后一个桶时返回最大值"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LAG_BUCKETS_MS[index] if index < len(LAG_BUCKETS_MS) else self.max
+        return self.max
+
+    def get_stats(self) -> dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(LAG_BUCKETS_MS, self.counts)}
+        buckets[f">{LAG_BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            'samples': self.count,
+            'p50_ms': self.percentile(0.50),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': buckets
+        }
+
+class OverloadController:
+    """事件循环延迟采样和过载保护
+
+    每隔interval秒测量一次定时器的实际唤醒延迟，记入直方图并做指数平滑。
+    平滑延迟超过shed_ms时进入shedding，超过pause_ms时进入paused，等级变化时通知监听者；
+    延迟回落到当前等级阈值的一半以下并保持recover_after秒后降到对应等级。interval为0时关闭
+    """
+    def __init__(self, interval: float = 0.05, shed_ms: float = 50.0, pause_ms: float = 200.0,
+                 recover_after: float = 1.0, smoothing: float = 0.3):
+        self.interval = interval
+        self.thresholds = (0.0, shed_ms, pause_ms)
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.histogram = LagHistogram()
+        self.lag_ms = 0.0
+        self.level = LEVEL_NORMAL
+        self.transitions = 0
+        self._calm_since: Optional[float] = None
+        self._listeners: List[Callable[[int], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def add_listener(self, callback: Callable[[int], None]):
+        self._listeners.append(callback)
+
+    def _target(self, lag_ms: float) -> int:
+        level = LEVEL_NORMAL
+        for candidate in (LEVEL_SHEDDING, LEVEL_PAUSED):
+            if self.thresholds[candidate] > 0 and lag_ms >= self.thresholds[candidate]:
+                level = candidate
+        return level
+
+    def update(self, lag_ms: float, now: float):
+        """记录一次延迟样本并调整等级"""
+        self.histogram.record(lag_ms)
+        self.lag_ms += self.smoothing * (lag_ms - self.lag_ms)
+        target = self._target(self.lag_ms)
+        if target > self.level:
+            self._calm_since = None
+            self._set_level(target)
+        elif target < self.level and self.lag_ms < self.thresholds[self.level] / 2:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.recover_after:
+                self._calm_since = None
+                self._set_level(target)
+        else:
+            self._calm_since = None
+
+    def _set_level(self, level: int):
+        logger.warning(f"Event loop lag {self.lag_ms:.1f}ms, overload level "
+                       f"{LEVEL_NAMES[self.level]} -> {LEVEL_NAMES[level]}")
+        self.level = level
+        self.transitions += 1
+        for callback in self._listeners:
+            callback(level)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.update(max(0.0, (now - expected) * 1000), now)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            'level': LEVEL_NAMES[self.level],
+            'lag_ms': self.lag_ms,
+            'transitions': self.transitions,
+            'histogram': self.histogram.get_stats()
+        }
@@ -1,37 +1,111 @@
 import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 import time
 from collections import deque
-import statistics
+
+from utils.shared_metrics import (BYTES, COMPRESSED_IN, COMPRESSED_OUT, ERRORS, LOOP_LAG_P99_US,
+                                  OVERLOAD_LEVEL, RTT_SAMPLES, RTT_US, UPDATED, MetricsSlot)
+from utils.overload import LEVEL_NAMES
 
 logger = logging.getLogger(__name__)
 
+# 每次性能报告中逐个列出的被限速最久的客户端数
+THROTTLE_REPORT_CLIENTS = 10
+
 class PerformanceMonitor:
-    def __init__(self, window_size: int = 100):
+    def __init__(self, window_size: int = 100, metrics: Optional[MetricsSlot] = None):
         self.window_size = window_size
+        # 多进程模式下本进程在共享指标区域中的槽位，记录的数据同时累加到槽位中供主进程汇总
+        self.metrics = metrics
         self.latency_history: Dict[str, deque] = {}
         self.throughput_history: Dict[str, deque] = {}
+        self.rtt_history: Dict[str, deque] = {}
         self.error_count: Dict[str, int] = {}
+        self.compression_stats: Dict[str, dict] = {}
+        self.throttle_stats: Dict[str, dict] = {}
+        # 已断开但还没有出现在性能报告中的客户端的限速统计，报告后并入累计值
+        self.departed_throttle: Dict[str, dict] = {}
+        # 事件循环延迟直方图和过载等级
+        self.loop_lag: dict = {}
+        # 已断开客户端的累计值，forget_client后按客户端的记录不再保留
+        self.departed = {'errors': 0, 'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0,
+                         'throttled_clients': 0, 'throttle_ms': 0.0}
         
     def record_latency(self, client_id: str, latency: float):
         """记录延迟数据"""
         if client_id not in self.latency_history:
             self.latency_history[client_id] = deque(maxlen=self.window_size)
         self.latency_history[client_id].append(latency)
+        if self.metrics is not None:
+            self.metrics.observe_latency(latency)
         
     def record_throughput(self, client_id: str, bytes_transferred: int):
         """记录吞吐量数据"""
         if client_id not in self.throughput_history:
             self.throughput_history[client_id] = deque(maxlen=self.window_size)
         self.throughput_history[client_id].append(bytes_transferred)
+        if self.metrics is not None:
+            self.metrics.add(BYTES, bytes_transferred)
+        
+    def record_rtt(self, client_id: str, rtt: float):
+        """记录心跳测得的往返时间(毫秒)"""
+        if client_id not in self.rtt_history:
+            self.rtt_history[client_id] = deque(maxlen=self.window_size)
+        self.rtt_history[client_id].append(rtt)
+        if self.metrics is not None:
+            self.metrics.add(RTT_US, max(0, int(rtt * 1000)))
+            self.metrics.add(RTT_SAMPLES)
+        
+    def record_compression(self, client_id: str, stats: dict):
+        """记录一条连接的压缩统计（节省字节数和CPU开销）"""
+        self.compression_stats[client_id] = stats
+        if self.metrics is not None:
+            self.metrics.add(COMPRESSED_IN, stats['bytes_in'])
+            self.metrics.add(COMPRESSED_OUT, stats['bytes_out'])
+        
+    def record_throttle(self, client_id: str, stats: dict):
+        """记录一条连接的发送限速统计（被限速次数和累计等待时间），在线连接由定期报告刷新"""
+        self.throttle_stats[client_id] = stats
+        
+    def record_loop_lag(self, stats: dict):
+        """记录事件循环延迟统计"""
+        self.loop_lag = stats
+        if self.metrics is not None:
+            self.metrics.set(LOOP_LAG_P99_US, int(stats['histogram']['p99_ms'] * 1000))
+            self.metrics.set(OVERLOAD_LEVEL, LEVEL_NAMES.index(stats['level']))
+            self.metrics.set(UPDATED, int(time.time()))
         
     def record_error(self, client_id: str):
         """记录错误"""
         self.error_count[client_id] = self.error_count.get(client_id, 0) + 1
+        if self.metrics is not None:
+            self.metrics.add(ERRORS)
+        
+    def record_connect(self, client_id: str):
+        """记录一条新连接，与forget_client成对调用"""
+        if self.metrics is not None:
+            self.metrics.connected()
+        
+    def forget_client(self, client_id: str):
+        """连接断开后丢弃该客户端的历史，错误和压缩统计并入累计值，限速统计保留到下一次性能报告"""
+        if self.metrics is not None:
+            self.metrics.disconnected()
+        self.departed['errors'] += self.error_count.pop(client_id, 0)
+        self.departed['requests'] += len(self.latency_history.pop(client_id, ()))
+        self.throughput_history.pop(client_id, None)
+        self.rtt_history.pop(client_id, None)
+        compression = self.compression_stats.pop(client_id, None)
+        if compression is not None:
+            for key in ('bytes_in', 'bytes_out', 'cpu_ms'):
+                self.departed[key] += compression[key]
+        throttle = self.throttle_stats.pop(client_id, None)
+        if throttle is not None:
+            self.departed_throttle[client_id] = throttle
         
     def get_client_stats(self, client_id: str) -> dict:
         """获取客户端统计信息"""
+        import statistics
         stats = {
             'latency': {
                 'current': 0,
@@ -44,7 +118,13 @@ class PerformanceMonitor:
                 'average': 0,
                 'max': 0
             },
-            'error_rate': 0
+            'rtt': {
+                'current': 0,
+                'average': 0
+            },
+            'error_rate': 0,
+            'compression': self.compression_stats.get(client_id),
+            'throttle': self.throttle_stats.get(client_id) or self.departed_throttle.get(client_id)
         }
         
         # 计算延迟统计
@@ -66,6 +146,14 @@ class PerformanceMonitor:
                 'max': max(throughputs)
             })
             
+        # 计算RTT统计
+        if self.rtt_history.get(client_id):
+            rtts = self.rtt_history[client_id]
+            stats['rtt'].update({
+                'current': rtts[-1],
+                'average': statistics.mean(rtts)
+            })
+            
         # 计算错误率
         total_requests = len(self.latency_history.get(client_id, []))
         if total_requests > 0:
@@ -75,10 +163,16 @@ class PerformanceMonitor:
         
     def get_global_stats(self) -> dict:
         """获取全局统计信息"""
+        import statistics
         all_latencies = []
         all_throughputs = []
-        total_errors = sum(self.error_count.values())
-        total_requests = sum(len(history) for history in self.latency_history.values())
+        all_rtts = [rtt for history in self.rtt_history.values() for rtt in history]
+        departed = self.departed
+        total_errors = departed['errors'] + sum(self.error_count.values())
+        total_requests = departed['requests'] + sum(len(history) for history in self.latency_history.values())
+        compressed_in = departed['bytes_in'] + sum(stats['bytes_in'] for stats in self.compression_stats.values())
+        compressed_out = departed['bytes_out'] + sum(stats['bytes_out'] for stats in self.compression_stats.values())
+        throttles = list(self.throttle_stats.values()) + list(self.departed_throttle.values())
         
         for client_id in self.latency_history:
             all_latencies.extend(self.latency_history[client_id])
@@ -95,7 +189,22 @@ class PerformanceMonitor:
                 'average': statistics.mean(all_throughputs) if all_throughputs else 0,
                 'max': max(all_throughputs) if all_throughputs else 0
             },
-            'error_rate': total_errors / total_requests if total_requests > 0 else 0
+            'rtt': {
+                'average': statistics.mean(all_rtts) if all_rtts else 0,
+                'max': max(all_rtts) if all_rtts else 0
+            },
+            'error_rate': total_errors / total_requests if total_requests > 0 else 0,
+            'compression': {
+                'saved_bytes': compressed_in - compressed_out,
+                'ratio': compressed_out / compressed_in if compressed_in else 1.0,
+                'cpu_ms': departed['cpu_ms'] + sum(stats['cpu_ms'] for stats in self.compression_stats.values())
+            },
+            'throttle': {
+                'throttled_clients': departed['throttled_clients'] + sum(
+                    1 for stats in throttles if stats['throttled']),
+                'throttle_ms': departed['throttle_ms'] + sum(stats['throttle_ms'] for stats in throttles)
+            },
+            'loop_lag': self.loop_lag
         }
         
     def log_performance_metrics(self):
@@ -105,4 +214,27 @@ class PerformanceMonitor:
                    f"Clients: {global_stats['total_clients']}, "
                    f"Avg Latency: {global_stats['latency']['average']:.2f}ms, "
                    f"Avg Throughput: {global_stats['throughput']['average']:.2f} bytes/s, "
-                   f"Error Rate: {global_stats['error_rate']*100:.2f}%") 
\ No newline at end of file
+                   f"Avg RTT: {global_stats['rtt']['average']:.2f}ms, "
+                   f"Error Rate: {global_stats['error_rate']*100:.2f}%, "
+                   f"Compression Saved: {global_stats['compression']['saved_bytes']} bytes, "
+                   f"Throttled Clients: {global_stats['throttle']['throttled_clients']}")
+        self.log_throttle_stats()
+        if self.loop_lag:
+            histogram = self.loop_lag['histogram']
+            logger.info(f"Event loop lag - p50: {histogram['p50_ms']}ms, p99: {histogram['p99_ms']}ms, "
+                        f"max: {histogram['max_ms']:.1f}ms, overload level: {self.loop_lag['level']}") 
+            
+    def log_throttle_stats(self):
+        """列出被限速最久的客户端（包括上次报告后断开的），然后把已断开客户端的统计并入累计值"""
+        throttled = [(client_id, stats) for stats_by_client in (self.throttle_stats, self.departed_throttle)
+                     for client_id, stats in stats_by_client.items() if stats['throttled']]
+        throttled.sort(key=lambda item: item[1]['throttle_ms'], reverse=True)
+        for client_id, stats in throttled[:THROTTLE_REPORT_CLIENTS]:
+            state = 'disconnected' if client_id in self.departed_throttle else 'connected'
+            logger.info(f"Throttle stats for {client_id} ({state}): throttled {stats['throttled']} times, "
+                        f"waited {stats['throttle_ms']:.1f}ms, sent {stats['sent_bytes']} bytes, "
+                        f"queued {stats['queued_bytes']} bytes")
+        for stats in self.departed_throttle.values():
+            self.departed['throttled_clients'] += 1 if stats['throttled'] else 0
+            self.departed['throttle_ms'] += stats['throttle_ms']
+        self.departed_throttle.clear()
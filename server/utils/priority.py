@@ -0,0 +1,77 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 连接内的优先级：交互流量（按键、DNS等）严格优先，普通和大块传输按权重分享剩余带宽
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = ('interactive', 'normal', 'bulk')
+
+# 普通和大块两级的字节权重，交互级不参与加权
+DEFAULT_WEIGHTS = {PRIORITY_NORMAL: 4, PRIORITY_BULK: 1}
+
+class PriorityQueues:
+    """严格优先 + 加权的多级发送队列
+
+    交互级非空时总是先出队；普通和大块两级按字节赤字轮转，每轮各得 quantum*权重 字节的额度。
+    每条连接都有一个，空闲连接多时占用不可忽视，各级队列在第一次入队时才创建
+    """
+    __slots__ = ('weights', 'quantum', 'queues', 'deficits', 'weighted', '_current', '_length')
+
+    def __init__(self, weights: Optional[Dict[int, int]] = None, quantum: int = 16384):
+        self.weights = weights or DEFAULT_WEIGHTS
+        self.quantum = quantum
+        # 每级一个 (帧大小, 元素) 队列，未用过的级别为None
+        self.queues: List[Optional[Deque[Tuple[int, Any]]]] = [None] * len(PRIORITY_NAMES)
+        self.deficits = [0] * len(PRIORITY_NAMES)
+        self.weighted = sorted(self.weights)
+        self._current = len(self.weighted) - 1
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def push(self, item: Any, size: int, priority: int = PRIORITY_NORMAL):
+        queue = self.queues[priority]
+        if queue is None:
+            queue = self.queues[priority] = deque()
+        queue.append((size, item))
+        self._length += 1
+
+    def _select(self) -> int:
+        """下一个出队的级别，未出队前重复调用结果不变"""
+        if self.queues[PRIORITY_INTERACTIVE]:
+            return PRIORITY_INTERACTIVE
+        while True:
+            priority = self.weighted[self._current]
+            queue = self.queues[priority]
+            if queue and queue[0][0] <= self.deficits[priority]:
+                return priority
+            if not queue:
+                self.deficits[priority] = 0
+            # 额度不足，轮到下一级并给它补充额度
+            self._current = (self._current + 1) % len(self.weighted)
+            priority = self.weighted[self._current]
+            if self.queues[priority]:
+                self.deficits[priority] += self.quantum * self.weights[priority]
+
+    def peek(self) -> Any:
+        """队首元素，队列为空时返回None"""
+        if not self._length:
+            return None
+        return self.queues[self._select()][0][1]
+
+    def pop(self) -> Any:
+        """出队，队列为空时返回None"""
+        if not self._length:
+            return None
+        priority = self._select()
+        size, item = self.queues[priority].popleft()
+        if priority != PRIORITY_INTERACTIVE:
+            self.deficits[priority] -= size
+        self._length -= 1
+        return item
+
+    def queued(self) -> Dict[str, int]:
+        """各级排队的帧数"""
+        return {name: len(queue) if queue else 0 for name, queue in zip(PRIORITY_NAMES, self.queues)}
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class ProfilingController:
+    """信号触发的按需性能分析，用于守护进程模式下无法附加分析器的线上服务
+
+    SIGUSR1: 开启一个duration秒的CPU分析窗口（cProfile + 对事件循环线程的栈采样），
+    结束时在output_dir中写入pstats文件和可直接生成火焰图的折叠栈文件；窗口内再次收到SIGUSR1时提前结束。
+    SIGUSR2: 第一次开启tracemalloc并记录基线快照，第二次与基线比较，写入增长最多的分配位置后关闭tracemalloc。
+    空闲时只注册信号处理器，不启用任何分析钩子，没有额外开销
+    """
+    def __init__(self, output_dir: Path, duration: float = 30.0, sample_interval: float = 0.005,
+                 top: int = 50):
+        self.output_dir = Path(output_dir)
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.top = top
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._profile: Optional['cProfile.Profile'] = None
+        self._stacks: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling = threading.Event()
+        self._window: Optional[asyncio.TimerHandle] = None
+        self._started = 0.0
+        self._baseline: Optional['tracemalloc.Snapshot'] = None
+        # 通过PYTHONTRACEMALLOC等方式已开启的追踪不由我们关闭
+        self._owns_tracemalloc = False
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """在事件循环上注册信号处理器，不支持SIGUSR1/SIGUSR2的平台上不做处理"""
+        if not hasattr(signal, 'SIGUSR1'):
+            return
+        self._loop = loop
+        self._thread_id = threading.get_ident()
+        loop.add_signal_handler(signal.SIGUSR1, self.toggle_cpu)
+        loop.add_signal_handler(signal.SIGUSR2, self.toggle_memory)
+
+    def uninstall(self):
+        if self._loop is None:
+            return
+        self.stop_cpu()
+        self._loop.remove_signal_handler(signal.SIGUSR1)
+        self._loop.remove_signal_handler(signal.SIGUSR2)
+        self._loop = None
+
+    def _prefix(self, kind: str) -> Path:
+        """输出文件的公共前缀，同一次分析的文件只有扩展名不同"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        return self.output_dir / f"{kind}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    def toggle_cpu(self):
+        if self.active:
+            self.stop_cpu()
+        else:
+            self.start_cpu()
+
+    def start_cpu(self, duration: Optional[float] = None):
+        """开始CPU分析窗口，必须在事件循环线程中调用"""
+        if self.active:
+            return
+        self._stacks = Counter()
+        self._sampling.set()
+        self._sampler = threading.Thread(target=self._sample, name='profiling-sampler', daemon=True)
+        self._sampler.start()
+        # 分析模块在第一次使用时导入，空闲的控制器不增加启动时间
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self._started = time.monotonic()
+        self._window = self._loop.call_later(duration or self.duration, self.stop_cpu)
+        logger.info(f"CPU profiling started for {duration or self.duration:.0f}s")
+
+    def stop_cpu(self):
+        """结束CPU分析窗口并写出结果"""
+        if not self.active:
+            return
+        self._profile.disable()
+        self._sampling.clear()
+        self._sampler.join()
+        if self._window is not None:
+            self._window.cancel()
+            self._window = None
+        profile, self._profile = self._profile, None
+        elapsed = time.monotonic() - self._started
+        try:
+            prefix = self._prefix('cpu')
+            pstats_path = prefix.with_suffix('.pstats')
+            profile.dump_stats(str(pstats_path))
+            collapsed_path = prefix.with_suffix('.collapsed')
+            with open(collapsed_path, 'w') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.error(f"Failed to write CPU profile: {str(e)}")
+            return
+        logger.info(f"CPU profiling stopped after {elapsed:.1f}s, {sum(self._stacks.values())} samples: "
+                    f"{pstats_path}, {collapsed_path}")
+
+    def _sample(self):
+        """定期采样事件循环线程的调用栈，折叠成 根;...;叶 的形式计数"""
+        labels = {}
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+                names.append(label)
+                frame = frame.f_back
+            if names:
+                self._stacks[';'.join(reversed(names))] += 1
+            time.sleep(self.sample_interval)
+
+    def toggle_memory(self):
+        """第一次记录基线，第二次写出与基线的差异"""
+        import tracemalloc
+        if self._baseline is None:
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            tracemalloc.start()
+            self._baseline = tracemalloc.take_snapshot()
+            logger.info("tracemalloc started, send SIGUSR2 again to write the allocation diff")
+            return
+        snapshot = tracemalloc.take_snapshot()
+        baseline, self._baseline = self._baseline, None
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        stats = snapshot.compare_to(baseline, 'lineno')
+        try:
+            path = self._prefix('memory').with_suffix('.txt')
+            with open(path, 'w') as f:
+                total = sum(stat.size_diff for stat in stats)
+                f.write(f"Total allocated since baseline: {total / 1024:.1f} KiB\n")
+                for stat in stats[:self.top]:
+                    f.write(f"{stat}\n")
+        except OSError as e:
+            logger.error(f"Failed to write allocation diff: {str(e)}")
+            return
+        logger.info(f"tracemalloc diff written to {path}")
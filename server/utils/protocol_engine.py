@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from utils.buffer_pool import BufferPool
+from utils.framing import FRAME_DATA, FRAME_SEGMENT, FRAME_STRIPE, HEADER_SIZE, iter_frames, unpack_header
+
+logger = logging.getLogger(__name__)
+
+class TransportWriter:
+    """把transport包装成StreamWriter风格的接口，供连接池统一关闭连接"""
+    def __init__(self, transport: asyncio.Transport, closed: asyncio.Future):
+        self.transport = transport
+        self._closed = closed
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self):
+        self.transport.close()
+
+    async def wait_closed(self):
+        await asyncio.shield(self._closed)
+
+class CysteriaBufferedProtocol(asyncio.BufferedProtocol):
+    """基于BufferedProtocol的连接处理器
+
+    数据直接读入缓冲池中的bytearray，帧以memoryview形式切出并解密，
+    剩余的半帧数据在缓冲区尾部空间不足时才搬移到头部。
+    一次读取填满整个缓冲区时下次换用加倍的缓冲区（不超过max_read_size），读取量回落后换回标准缓冲区
+    """
+    def __init__(self, server, buffer_pool: BufferPool, max_pending: int = 64,
+                 max_read_size: Optional[int] = None):
+        self.server = server
+        self.buffer_pool = buffer_pool
+        self.max_pending = max_pending
+        self.max_read_size = max(max_read_size or buffer_pool.buffer_size, buffer_pool.buffer_size)
+        self.transport: Optional[asyncio.Transport] = None
+        self.writer: Optional[TransportWriter] = None
+        self.client_id: Optional[str] = None
+        self.start_time = time.time()
+        self._buffer: Optional[bytearray] = None
+        self._view: Optional[memoryview] = None
+        self._start = 0
+        self._end = 0
+        # 最近一次get_buffer提供的空间
+        self._offered = 0
+        # (帧类型, 条带序号或流式分段是否为最后一段, 已解密数据)
+        self._pending: Deque[Tuple[int, Optional[int], bytes]] = deque()
+        self._wakeup = asyncio.Event()
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._reading_paused = False
+        self._eof = False
+        self._task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        loop = asyncio.get_running_loop()
+        self.writer = TransportWriter(transport, loop.create_future())
+        addr = transport.get_extra_info('peername')
+        self.client_id = f"{addr[0]}:{addr[1]}"
+        self._set_buffer(self.buffer_pool.acquire())
+        self._task = loop.create_task(self._run())
+
+    def _set_buffer(self, buffer: bytearray):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self._end == len(self._buffer):
+            self._make_room()
+        self._offered = len(self._buffer) - self._end
+        return self._view[self._end:]
+
+    def _make_room(self):
+        """缓冲区写满时搬移半帧数据，必要时换用更大的缓冲区"""
+        pending = self._end - self._start
+        needed = len(self._buffer)
+        if pending >= HEADER_SIZE:
+            _, length = unpack_header(self._view[self._start:self._start + HEADER_SIZE])
+            needed = max(needed, HEADER_SIZE + length)
+        if needed > len(self._buffer) or self._start == 0:
+            new_buffer = self.buffer_pool.acquire(max(needed, len(self._buffer) * 2))
+            new_buffer[:pending] = self._view[self._start:self._end]
+            self._release_buffer()
+            self._set_buffer(new_buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def buffer_updated(self, nbytes: int):
+        self._end += nbytes
+        self.server.heartbeat.seen(self.client_id)
+        try:
+            offset = self._start
+            for frame_type, payload, frame_end in iter_frames(self._view[self._start:self._end]):
+                if frame_type == FRAME_DATA:
+                    self._pending.append((FRAME_DATA, None, self.server.decode_frame(payload, self.client_id)))
+                    self.server.track_received(self.client_id, self.transport)
+                elif frame_type == FRAME_STRIPE:
+                    self._pending.append((FRAME_STRIPE, *self.server.decode_stripe(payload, self.client_id)))
+                elif frame_type == FRAME_SEGMENT:
+                    data, final = self.server.decode_segment(self.client_id, payload)
+                    self._pending.append((FRAME_SEGMENT, final, data))
+                else:
+                    reply = self.server.handle_control(self.client_id, frame_type, payload)
+                    if reply:
+                        self.transport.write(reply)
+                offset = self._start + frame_end
+            self._start = offset
+        except Exception as e:
+            self.server.error_handler.handle_error(e, {'client_id': self.client_id})
+            self.server.performance_monitor.record_error(self.client_id)
+            self.transport.close()
+            return
+        if self._start == self._end:
+            self._start = self._end = 0
+            self._resize_buffer(nbytes)
+        if self._pending:
+            self._wakeup.set()
+            if len(self._pending) >= self.max_pending and not self._reading_paused:
+                self._reading_paused = True
+                self.transport.pause_reading()
+
+    def _resize_buffer(self, nbytes: int):
+        """缓冲区已清空时按本次读取量调整大小"""
+        size = len(self._buffer)
+        standard = self.buffer_pool.buffer_size
+        if nbytes >= self._offered and size < self.max_read_size:
+            # 读满了，对端发送得比我们读得快
+            new_size = min(size * 2, self.max_read_size)
+        elif size != standard and nbytes < standard:
+            # 大帧或突发已处理完毕，换回标准缓冲区
+            new_size = standard
+        else:
+            return
+        self._release_buffer()
+        self._set_buffer(self.buffer_pool.acquire(new_size))
+
+    def eof_received(self):
+        self._eof = True
+        self._wakeup.set()
+        return False
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self._eof = True
+        self._wakeup.set()
+        self._can_write.set()
+        if not self.writer._closed.done():
+            self.writer._closed.set_result(None)
+        self._release_buffer()
+
+    def _release_buffer(self):
+        if self._buffer is not None:
+            self._view.release()
+            self.buffer_pool.release(self._buffer)
+            self._buffer = None
+            self._view = None
+
+    async def _run(self):
+        """按顺序处理已解密的帧并写回响应"""
+        client_id = self.client_id
+        try:
+            if not await self.server.register_client(client_id, None, self.writer):
+                return
+            while True:
+                while self._pending:
+                    frame_type, seq, data = self._pending.popleft()
+                    await self.server.connection_pool.update_activity(client_id)
+                    if self.transport.is_closing():
+                        return
+                    if frame_type == FRAME_DATA:
+                        # 排队后继续处理下一帧，由调度器按请求顺序写出并负责背压
+                        response = await self.server.respond(data, client_id=client_id)
+                        await self.server.scheduler.submit(client_id, self.writer, response)
+                    elif frame_type == FRAME_SEGMENT:
+                        await self._can_write.wait()
+                        await self.server.handle_segment(client_id, self.writer, data, seq)
+                    else:
+                        await self._can_write.wait()
+                        await self.server.handle_stripe(client_id, self.writer, seq, data)
+                    self.server.record_frame(client_id, self.start_time, len(data) if data is not None else 0)
+                    if self._reading_paused and len(self._pending) < self.max_pending // 2:
+                        self._reading_paused = False
+                        self.transport.resume_reading()
+                if self._eof:
+                    await self.server.scheduler.flush(client_id)
+                    break
+                self._wakeup.clear()
+                await self._wakeup.wait()
+        except Exception as e:
+            self.server.error_handler.handle_error(e, {'client_id': client_id})
+            self.server.performance_monitor.record_error(client_id)
+            logger.error(f"Error handling client {client_id}: {str(e)}")
+        finally:
+            await self.server.unregister_client(client_id)
+            self.transport.close()
+            logger.info(f"Client disconnected: {client_id}")
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from utils.priority import PRIORITY_NORMAL, PriorityQueues
+
+logger = logging.getLogger(__name__)
+
+def _retrieve(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+class TokenBucket:
+    """令牌桶，rate为每秒补充的令牌数，rate<=0表示不限速
+
+    单次请求超过桶容量时，只要桶是满的就放行并把令牌记为负数，避免大帧永远发不出去
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """距离可以消费amount个令牌还需等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if not self.unlimited:
+            self.tokens -= amount
+
+class ClientQueue:
+    """一个客户端的发送队列（按优先级分级）、DRR赤字计数和限速令牌桶"""
+    __slots__ = ('client_id', 'frames', 'queued_bytes', 'deficit', 'bytes_bucket', 'frames_bucket',
+                 'blocked_since', 'sent_bytes', 'sent_frames', 'throttled', 'throttle_time', 'idle')
+
+    def __init__(self, client_id: str, bytes_bucket: TokenBucket, frames_bucket: TokenBucket):
+        self.client_id = client_id
+        # (帧, writer, 写出后完成的future)
+        self.frames = PriorityQueues()
+        self.queued_bytes = 0
+        self.deficit = 0
+        self.bytes_bucket = bytes_bucket
+        self.frames_bucket = frames_bucket
+        self.blocked_since: Optional[float] = None
+        self.sent_bytes = 0
+        self.sent_frames = 0
+        self.throttled = 0
+        self.throttle_time = 0.0
+        # flush()等待时才创建，队列排空时完成
+        self.idle: Optional[asyncio.Future] = None
+
+    def set_idle(self):
+        if self.idle is not None and not self.idle.done():
+            self.idle.set_result(None)
+        self.idle = None
+
+    def get_stats(self) -> Dict[str, float]:
+        throttle_time = self.throttle_time
+        if self.blocked_since is not None:
+            # 正在被限速的帧已经等待的时间
+            throttle_time += time.monotonic() - self.blocked_since
+        return {
+            'sent_bytes': self.sent_bytes,
+            'sent_frames': self.sent_frames,
+            'queued_bytes': self.queued_bytes,
+            'queued_frames': self.frames.queued(),
+            'throttled': self.throttled,
+            'throttle_ms': throttle_time * 1000
+        }
+
+class FairScheduler:
+    """按客户端公平调度发送：每个客户端一个令牌桶（字节/秒和帧/秒），
+    全局再共享一组令牌桶，积压的发送队列按赤字轮转(DRR)服务
+
+    队列为空且未被限速时直接写出，不经过调度任务；速率为0表示不限制。
+    同一客户端积压的帧按优先级出队，同一优先级内先进先出；连接的响应都使用默认级别，按请求顺序写出。
+    连接用submit()排队响应后继续读取下一帧，积压超过max_queued_bytes时才等待写出
+    """
+    def __init__(self, client_bytes_rate: float = 0, client_frames_rate: float = 0,
+                 global_bytes_rate: float = 0, global_frames_rate: float = 0,
+                 quantum: int = 16384, burst_window: float = 0.1,
+                 max_write_buffer: int = 64 * 1024, max_queued_bytes: int = 1024 * 1024,
+                 performance_monitor=None, on_write: Optional[Callable[[str, bytes], None]] = None):
+        self.client_bytes_rate = client_bytes_rate
+        self.client_frames_rate = client_frames_rate
+        self.quantum = quantum
+        self.burst_window = burst_window
+        self.max_write_buffer = max_write_buffer
+        self.max_queued_bytes = max_queued_bytes
+        self.performance_monitor = performance_monitor
+        # 每帧实际写出时调用，可恢复会话据此按线上顺序给帧编号
+        self.on_write = on_write
+        self.global_bytes = self._bucket(global_bytes_rate, quantum)
+        self.global_frames = self._bucket(global_frames_rate, 1)
+        self.queues: Dict[str, ClientQueue] = {}
+        self.active: Deque[ClientQueue] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _bucket(self, rate: float, minimum: float) -> TokenBucket:
+        """桶容量为burst_window秒的流量，至少能放下一个单位"""
+        return TokenBucket(rate, max(rate * self.burst_window, minimum))
+
+    def register(self, client_id: str) -> ClientQueue:
+        queue = self.queues.get(client_id)
+        if queue is None:
+            queue = self.queues[client_id] = ClientQueue(
+                client_id,
+                self._bucket(self.client_bytes_rate, self.quantum),
+                self._bucket(self.client_frames_rate, 1)
+            )
+        return queue
+
+    def set_client_limits(self, bytes_rate: float, frames_rate: float):
+        """调整每个客户端的限速，对已有连接立即生效"""
+        self.client_bytes_rate = bytes_rate
+        self.client_frames_rate = frames_rate
+        for queue in self.queues.values():
+            queue.bytes_bucket = self._bucket(bytes_rate, self.quantum)
+            queue.frames_bucket = self._bucket(frames_rate, 1)
+        self._wakeup.set()
+
+    def report_stats(self):
+        """把在线客户端的限速统计报告给PerformanceMonitor，由定期的性能报告调用"""
+        if self.performance_monitor is None:
+            return
+        for client_id, queue in self.queues.items():
+            self.performance_monitor.record_throttle(client_id, queue.get_stats())
+
+    def unregister(self, client_id: str):
+        """连接断开时丢弃积压的帧，并把最终的限速统计报告给PerformanceMonitor"""
+        queue = self.queues.pop(client_id, None)
+        if queue is None:
+            return
+        while queue.frames:
+            _, _, future = queue.frames.pop()
+            if not future.done():
+                future.set_exception(ConnectionError(f"Client {client_id} disconnected"))
+        queue.set_idle()
+        if queue in self.active:
+            self.active.remove(queue)
+        if self.performance_monitor is not None:
+            self.performance_monitor.record_throttle(client_id, queue.get_stats())
+
+    def _wait_time(self, queue: ClientQueue, size: int, now: float) -> float:
+        return max(queue.bytes_bucket.wait_time(size, now), queue.frames_bucket.wait_time(1, now),
+                   self.global_bytes.wait_time(size, now), self.global_frames.wait_time(1, now))
+
+    def _write(self, queue: ClientQueue, writer, data: bytes, now: float):
+        if self.on_write is not None:
+            self.on_write(queue.client_id, data)
+        writer.write(data)
+        for bucket in (queue.bytes_bucket, self.global_bytes):
+            bucket.consume(len(data))
+        for bucket in (queue.frames_bucket, self.global_frames):
+            bucket.consume(1)
+        queue.sent_bytes += len(data)
+        queue.sent_frames += 1
+        if queue.blocked_since is not None:
+            queue.throttle_time += now - queue.blocked_since
+            queue.blocked_since = None
+
+    def _backlogged(self, writer) -> bool:
+        """内核发送缓冲已满、transport开始堆积时暂缓写出"""
+        return writer.transport.get_write_buffer_size() > self.max_write_buffer
+
+    def enqueue(self, client_id: str, writer, data: bytes,
+                priority: int = PRIORITY_NORMAL) -> Optional[asyncio.Future]:
+        """发送一帧但不等待：能直接写出时写出并返回None，否则按优先级排队，返回写出后完成的future"""
+        queue = self.queues.get(client_id) or self.register(client_id)
+        now = time.monotonic()
+        if not queue.frames and not self._backlogged(writer) and self._wait_time(queue, len(data), now) == 0:
+            self._write(queue, writer, data, now)
+            return None
+        future = asyncio.get_running_loop().create_future()
+        # 没有人等待的帧在断开时被丢弃，取走异常避免"exception was never retrieved"
+        future.add_done_callback(_retrieve)
+        queue.frames.push((data, writer, future), len(data), priority)
+        queue.queued_bytes += len(data)
+        if len(queue.frames) == 1:
+            self.active.append(queue)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def send(self, client_id: str, writer, data: bytes, priority: int = PRIORITY_NORMAL):
+        """发送一帧，被限速或有积压时按优先级排队，直到写出后返回"""
+        future = self.enqueue(client_id, writer, data, priority)
+        if future is not None:
+            await future
+
+    async def submit(self, client_id: str, writer, data: bytes, priority: int = PRIORITY_NORMAL):
+        """排队发送一帧后立即返回，让连接继续读取而不被慢速的下行阻塞；
+        该客户端排队的字节超过max_queued_bytes时等待这一帧写出，作为背压
+        """
+        future = self.enqueue(client_id, writer, data, priority)
+        if future is not None and self.queues[client_id].queued_bytes > self.max_queued_bytes:
+            await future
+
+    async def flush(self, client_id: str):
+        """等待该客户端排队的帧全部写出（或因断开被丢弃）"""
+        queue = self.queues.get(client_id)
+        if queue is None or not queue.frames:
+            return
+        if queue.idle is None:
+            queue.idle = asyncio.get_running_loop().create_future()
+        await asyncio.shield(queue.idle)
+
+    async def _run(self):
+        """DRR调度循环：每轮给每个活跃队列quantum字节的额度"""
+        while True:
+            if not self.active:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            sent = False
+            next_wake = 0.005
+            for _ in range(len(self.active)):
+                queue = self.active.popleft()
+                queue.deficit += self.quantum
+                while queue.frames:
+                    data, writer, future = queue.frames.peek()
+                    if writer.is_closing() or future.done():
+                        queue.frames.pop()
+                        queue.queued_bytes -= len(data)
+                        if not future.done():
+                            future.set_exception(ConnectionError(f"Client {queue.client_id} disconnected"))
+                        continue
+                    if len(data) > queue.deficit:
+                        break
+                    wait = self._wait_time(queue, len(data), now)
+                    if wait > 0 or self._backlogged(writer):
+                        if queue.blocked_since is None:
+                            queue.blocked_since = now
+                            queue.throttled += 1
+                        if wait > 0:
+                            next_wake = min(next_wake, wait)
+                        # 被阻塞的队列不累积额度，避免解除限速后突发
+                        queue.deficit = min(queue.deficit, max(self.quantum, len(data)))
+                        break
+                    queue.frames.pop()
+                    queue.queued_bytes -= len(data)
+                    queue.deficit -= len(data)
+                    self._write(queue, writer, data, now)
+                    future.set_result(None)
+                    sent = True
+                if queue.frames:
+                    self.active.append(queue)
+                else:
+                    queue.deficit = 0
+                    queue.set_idle()
+            if not sent:
+                await asyncio.sleep(next_wake)
+            else:
+                # 让出事件循环，读取和处理其他连接
+                await asyncio.sleep(0)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {client_id: queue.get_stats() for client_id, queue in self.queues.items()}
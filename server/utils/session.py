@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import struct
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils.framing import FRAME_ACK, FRAME_DATA, pack_frame
+
+logger = logging.getLogger(__name__)
+
+# 握手回复中的标志位，以及客户端握手能力字节中的同名标志
+SESSION_RESUMABLE = 0x01
+
+# ACK负载: 已按序收到的数据帧数
+ACK_PAYLOAD = struct.Struct('!Q')
+# RESUME请求: 会话ID + 客户端已收到的数据帧数；回复: 1字节状态 + 服务端已收到的数据帧数
+RESUME_REQUEST = struct.Struct('!32sQ')
+RESUME_REPLY = struct.Struct('!BQ')
+
+class ResumableSession:
+    """可在断线后恢复的会话
+
+    两个方向的数据帧都按会话内的顺序计数，已发出但对端尚未确认的帧保留在重放缓冲中，
+    重连后按对端报告的已收帧数补发
+    """
+    __slots__ = ('session_id', 'client_id', 'codec', 'sent', 'received', 'replay', 'replay_bytes', 'expiry')
+
+    def __init__(self, session_id: bytes, client_id: str, codec: int):
+        self.session_id = session_id
+        self.client_id: Optional[str] = client_id
+        # 重放的帧按原压缩算法编码，恢复时新连接必须协商出相同的算法
+        self.codec = codec
+        self.sent = 0
+        self.received = 0
+        # (序号, 完整的数据帧)
+        self.replay: Deque[Tuple[int, bytes]] = deque()
+        self.replay_bytes = 0
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+    def acknowledge(self, count: int):
+        """丢弃对端已确认的帧"""
+        while self.replay and self.replay[0][0] <= count:
+            _, frame = self.replay.popleft()
+            self.replay_bytes -= len(frame)
+
+class SessionManager:
+    """按会话ID管理可恢复会话，连接断开后会话保留grace秒等待客户端重连"""
+    def __init__(self, grace: float = 30.0, max_replay_frames: int = 256,
+                 max_replay_bytes: int = 1024 * 1024, ack_every: int = 16):
+        self.grace = grace
+        self.max_replay_frames = max_replay_frames
+        self.max_replay_bytes = max_replay_bytes
+        self.ack_every = ack_every
+        self.sessions: Dict[bytes, ResumableSession] = {}
+        self.client_sessions: Dict[str, ResumableSession] = {}
+        self.stats = {'opened': 0, 'resumed': 0, 'rejected': 0, 'expired': 0, 'replayed_frames': 0}
+
+    def open(self, client_id: str, session_id: bytes, codec: int) -> ResumableSession:
+        """握手时为声明支持恢复的连接创建会话"""
+        session = ResumableSession(session_id, client_id, codec)
+        self.sessions[session_id] = session
+        self.client_sessions[client_id] = session
+        self.stats['opened'] += 1
+        return session
+
+    def get(self, client_id: str) -> Optional[ResumableSession]:
+        return self.client_sessions.get(client_id)
+
+    def sent(self, client_id: str, frame: bytes):
+        """按实际写出顺序记录发给客户端的数据帧"""
+        session = self.client_sessions.get(client_id)
+        if session is None or frame[0] != FRAME_DATA:
+            return
+        session.sent += 1
+        session.replay.append((session.sent, frame))
+        session.replay_bytes += len(frame)
+        while (len(session.replay) > self.max_replay_frames
+               or session.replay_bytes > self.max_replay_bytes):
+            _, dropped = session.replay.popleft()
+            session.replay_bytes -= len(dropped)
+
+    def received(self, client_id: str) -> Optional[bytes]:
+        """记录收到一个数据帧，每ack_every帧返回一个需要写回的ACK帧"""
+        session = self.client_sessions.get(client_id)
+        if session is None:
+            return None
+        session.received += 1
+        if session.received % self.ack_every:
+            return None
+        return pack_frame(FRAME_ACK, ACK_PAYLOAD.pack(session.received))
+
+    def acknowledge(self, client_id: str, payload):
+        """处理客户端的ACK"""
+        session = self.client_sessions.get(client_id)
+        if session is not None and len(payload) == ACK_PAYLOAD.size:
+            session.acknowledge(ACK_PAYLOAD.unpack_from(payload)[0])
+
+    def detach(self, client_id: str):
+        """连接断开，会话进入宽限期"""
+        session = self.client_sessions.pop(client_id, None)
+        if session is None or session.client_id != client_id:
+            return
+        session.client_id = None
+        loop = asyncio.get_running_loop()
+        session.expiry = loop.call_later(self.grace, self._expire, session.session_id)
+
+    def _expire(self, session_id: bytes):
+        session = self.sessions.get(session_id)
+        if session is not None and session.client_id is None:
+            del self.sessions[session_id]
+            self.stats['expired'] += 1
+            logger.debug(f"Session {session_id[:4].hex()} expired")
+
+    def resume(self, client_id: str, payload,
+               codec: int) -> Tuple[Optional[ResumableSession], Optional[str], List[bytes]]:
+        """把连接重新绑定到已有会话
+
+        返回(会话, 被接管的旧连接ID, 需要补发的帧)，无法无损恢复时会话为None，
+        连接继续使用握手时新建的会话
+        """
+        if len(payload) != RESUME_REQUEST.size:
+            raise ValueError(f"Invalid resume request from {client_id}")
+        session_id, client_received = RESUME_REQUEST.unpack_from(payload)
+        session = self.sessions.get(session_id)
+        if session is None or session.codec != codec or client_received > session.sent:
+            self.stats['rejected'] += 1
+            return None, None, []
+        session.acknowledge(client_received)
+        first = session.replay[0][0] if session.replay else session.sent + 1
+        if first != client_received + 1:
+            # 需要补发的帧已因重放缓冲溢出被丢弃
+            self.stats['rejected'] += 1
+            return None, None, []
+
+        # 丢弃本连接握手时新建的空会话
+        fresh = self.client_sessions.get(client_id)
+        if fresh is not None and fresh is not session:
+            self.sessions.pop(fresh.session_id, None)
+        previous = session.client_id
+        if previous is not None:
+            self.client_sessions.pop(previous, None)
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        session.client_id = client_id
+        self.client_sessions[client_id] = session
+        replay = [frame for _, frame in session.replay]
+        self.stats['resumed'] += 1
+        self.stats['replayed_frames'] += len(replay)
+        return session, previous, replay
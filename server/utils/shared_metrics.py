@@ -0,0 +1,174 @@
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List
+
+# 区域头: 魔数、版本、槽位数、每个槽位的字段数，占满一个缓存行
+HEADER = struct.Struct('=4sHHI')
+HEADER_SIZE = 64
+MAGIC = b'CYSM'
+VERSION = 1
+
+# 帧处理延迟直方图的桶上界(毫秒)，最后一个桶收集超过最大上界的样本
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 槽位中的字段，均为无符号64位整数；clients、loop_lag_p99_us和overload_level是当前值，其余为累计值
+FIELDS = ('pid', 'started', 'updated', 'clients', 'connections', 'frames', 'bytes', 'errors',
+          'latency_us', 'rtt_us', 'rtt_samples', 'compressed_in', 'compressed_out',
+          'loop_lag_p99_us', 'overload_level')
+(PID, STARTED, UPDATED, CLIENTS, CONNECTIONS, FRAMES, BYTES, ERRORS, LATENCY_US, RTT_US, RTT_SAMPLES,
+ COMPRESSED_IN, COMPRESSED_OUT, LOOP_LAG_P99_US, OVERLOAD_LEVEL) = range(len(FIELDS))
+# 当前值字段，槽位被重新占用或退役时清零
+CURRENT_FIELDS = (CLIENTS, LOOP_LAG_P99_US, OVERLOAD_LEVEL)
+# 延迟直方图在槽位中的起始下标
+LATENCY_HISTOGRAM = len(FIELDS)
+# 槽位按64字节对齐，相邻进程的槽位不在同一缓存行上
+SLOT_FIELDS = -(-(len(FIELDS) + len(LATENCY_BUCKETS_MS) + 1) // 8) * 8
+SLOT_SIZE = SLOT_FIELDS * 8
+
+class MetricsSlot:
+    """一个工作进程在共享区域中的槽位，只由该进程写入"""
+    __slots__ = ('values',)
+
+    def __init__(self, values: memoryview):
+        self.values = values
+
+    def add(self, field: int, amount: int = 1):
+        self.values[field] += amount
+
+    def set(self, field: int, value: int):
+        self.values[field] = value
+
+    def observe_latency(self, latency_ms: float):
+        """记录一帧的处理延迟"""
+        values = self.values
+        values[FRAMES] += 1
+        values[LATENCY_US] += max(0, int(latency_ms * 1000))
+        values[LATENCY_HISTOGRAM + bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def connected(self):
+        self.values[CLIENTS] += 1
+        self.values[CONNECTIONS] += 1
+
+    def disconnected(self):
+        if self.values[CLIENTS]:
+            self.values[CLIENTS] -= 1
+
+def histogram_percentile(counts: List[int], q: float) -> float:
+    """按桶上界估计百分位，落在最后一个桶时返回最大上界"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= q * total:
+            return float(LATENCY_BUCKETS_MS[min(index, len(LATENCY_BUCKETS_MS) - 1)])
+    return float(LATENCY_BUCKETS_MS[-1])
+
+class SharedMetrics:
+    """多个工作进程共享的指标区域（基于文件的mmap）
+
+    每个工作进程独占一个槽位，热路径上只对自己槽位中的计数器做加法，不加锁也不经过任何IPC；
+    读取方（主进程或外部导出工具）把所有槽位相加得到全局统计。字段都是对齐的64位整数，
+    单个字段的读写不会撕裂，同一槽位的不同字段之间允许短暂不一致
+    """
+    def __init__(self, path: Path, region: mmap.mmap):
+        self.path = Path(path)
+        self._region = region
+        magic, version, self.slots, fields = HEADER.unpack_from(region)
+        if magic != MAGIC or version != VERSION or fields != SLOT_FIELDS:
+            region.close()
+            raise ValueError(f"Not a metrics region or incompatible version: {path}")
+        self._values = memoryview(region)[HEADER_SIZE:HEADER_SIZE + self.slots * SLOT_SIZE].cast('Q')
+
+    @classmethod
+    def create(cls, path: Path, slots: int) -> 'SharedMetrics':
+        """创建（或清空重建）有slots个槽位的区域"""
+        size = HEADER_SIZE + slots * SLOT_SIZE
+        with open(path, 'w+b') as f:
+            f.truncate(size)
+            region = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(region, 0, MAGIC, VERSION, slots, SLOT_FIELDS)
+        return cls(path, region)
+
+    @classmethod
+    def open(cls, path: Path) -> 'SharedMetrics':
+        """打开已有区域，供导出工具读取"""
+        with open(path, 'r+b') as f:
+            region = mmap.mmap(f.fileno(), 0)
+        return cls(path, region)
+
+    def slot(self, index: int) -> MetricsSlot:
+        """占用一个槽位，在工作进程中调用
+
+        重生的工作进程沿用退出进程的槽位，只清零当前值，累计值和延迟直方图继续累加
+        """
+        values = self._values[index * SLOT_FIELDS:(index + 1) * SLOT_FIELDS]
+        for field in CURRENT_FIELDS:
+            values[field] = 0
+        now = int(time.time())
+        values[STARTED] = now
+        values[UPDATED] = now
+        values[PID] = os.getpid()
+        return MetricsSlot(values)
+
+    def retire(self, index: int):
+        """工作进程退出后清零它的当前值，累计值保留在全局统计中"""
+        base = index * SLOT_FIELDS
+        for field in CURRENT_FIELDS:
+            self._values[base + field] = 0
+        self._values[base + PID] = 0
+
+    def read_slot(self, index: int) -> List[int]:
+        return self._values[index * SLOT_FIELDS:(index + 1) * SLOT_FIELDS].tolist()
+
+    def aggregate(self) -> Dict[str, object]:
+        """汇总所有槽位"""
+        totals = [0] * SLOT_FIELDS
+        workers = []
+        for index in range(self.slots):
+            values = self.read_slot(index)
+            if not values[STARTED]:
+                continue
+            for field in range(CLIENTS, SLOT_FIELDS):
+                totals[field] += values[field]
+            if values[PID]:
+                workers.append({
+                    'pid': values[PID],
+                    'clients': values[CLIENTS],
+                    'frames': values[FRAMES],
+                    'loop_lag_p99_ms': values[LOOP_LAG_P99_US] / 1000,
+                    'overload_level': values[OVERLOAD_LEVEL]
+                })
+        histogram = totals[LATENCY_HISTOGRAM:LATENCY_HISTOGRAM + len(LATENCY_BUCKETS_MS) + 1]
+        frames = totals[FRAMES]
+        return {
+            'workers': len(workers),
+            'clients': totals[CLIENTS],
+            'connections': totals[CONNECTIONS],
+            'frames': frames,
+            'bytes': totals[BYTES],
+            'error_rate': totals[ERRORS] / frames if frames else 0,
+            'latency': {
+                'average': totals[LATENCY_US] / frames / 1000 if frames else 0,
+                'p50': histogram_percentile(histogram, 0.50),
+                'p99': histogram_percentile(histogram, 0.99)
+            },
+            'rtt': {
+                'average': totals[RTT_US] / totals[RTT_SAMPLES] / 1000 if totals[RTT_SAMPLES] else 0
+            },
+            'compression': {
+                'saved_bytes': totals[COMPRESSED_IN] - totals[COMPRESSED_OUT],
+                'ratio': totals[COMPRESSED_OUT] / totals[COMPRESSED_IN] if totals[COMPRESSED_IN] else 1.0
+            },
+            'loop_lag_p99_ms': max((worker['loop_lag_p99_ms'] for worker in workers), default=0),
+            'per_worker': workers
+        }
+
+    def close(self):
+        self._values.release()
+        self._region.close()
@@ -0,0 +1,105 @@
+import logging
+import socket
+import sys
+from asyncio import sslproto
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class SocketProfile(NamedTuple):
+    """一组套接字调优参数"""
+    name: str
+    # 关闭Nagle算法，小帧立即发出；为False时内核把连续的小段合并后再发送
+    nodelay: bool
+    # 内核收发缓冲(字节)，None时交给内核自动调节
+    rcvbuf: Optional[int]
+    sndbuf: Optional[int]
+    # 内核中尚未发出的字节上限(TCP_NOTSENT_LOWAT)，超过时写出的数据留在进程内的发送队列，
+    # 积压才能按优先级重排；None时不限制
+    notsent_lowat: Optional[int]
+    # TCP保活: 空闲多少秒后开始探测、探测间隔和判定断开的探测次数，idle为0时不开启
+    keepalive_idle: int
+    keepalive_interval: int
+    keepalive_count: int
+    # 监听队列长度
+    backlog: int
+    # 接收缓冲的初始大小（也作为StreamReader的limit），连续读满时按倍数增长到max_read_size
+    read_size: int
+    max_read_size: int
+
+PROFILES = {
+    # 交互流量优先：小帧立即发出，缓冲由内核自动调节
+    'latency': SocketProfile('latency', nodelay=True, rcvbuf=None, sndbuf=None, notsent_lowat=64 * 1024,
+                             keepalive_idle=60, keepalive_interval=10, keepalive_count=3,
+                             backlog=1024, read_size=64 * 1024, max_read_size=256 * 1024),
+    # 高带宽时延积链路：固定大的内核缓冲，允许合并小段，读缓冲更大
+    'throughput': SocketProfile('throughput', nodelay=False, rcvbuf=4 * 1024 * 1024, sndbuf=4 * 1024 * 1024,
+                                notsent_lowat=None, keepalive_idle=120, keepalive_interval=30, keepalive_count=4,
+                                backlog=4096, read_size=256 * 1024, max_read_size=1024 * 1024),
+    # 连接数多、内存紧张：小的内核缓冲和读缓冲
+    'low-memory': SocketProfile('low-memory', nodelay=True, rcvbuf=32 * 1024, sndbuf=32 * 1024,
+                                notsent_lowat=None, keepalive_idle=60, keepalive_interval=10, keepalive_count=3,
+                                backlog=128, read_size=8 * 1024, max_read_size=64 * 1024)
+}
+
+DEFAULT_PROFILE = 'latency'
+
+def get_profile(name: Optional[str]) -> SocketProfile:
+    """按名称取调优档位"""
+    try:
+        return PROFILES[name or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f"Unknown socket profile: {name}") from None
+
+def set_tls_read_size(size: int) -> bool:
+    """设置asyncio TLS连接的读缓冲大小，返回是否生效
+
+    Python 3.11起SSLProtocol为每条连接预先分配max_size（默认256KiB）的读缓冲，是空闲连接内存的主要部分；
+    更早的版本没有这块常驻缓冲，不做处理。max_size是asyncio的私有类属性，修改是进程级的：
+    同一进程中之后创建的所有TLS连接（包括向外发起的连接）都使用这个大小。属性不存在或不是整数时保持默认
+    """
+    if sys.version_info < (3, 11):
+        return False
+    if not isinstance(getattr(sslproto.SSLProtocol, 'max_size', None), int):
+        logger.debug("asyncio SSLProtocol has no max_size, keeping the default TLS read buffer")
+        return False
+    sslproto.SSLProtocol.max_size = size
+    return True
+
+def _setsockopt(sock, level: int, option: int, value: int):
+    try:
+        sock.setsockopt(level, option, value)
+    except OSError as e:
+        # 部分平台不支持某些选项，不影响连接本身
+        logger.debug(f"setsockopt({level}, {option}, {value}) failed: {str(e)}")
+
+def tune_listener(sock, profile: SocketProfile):
+    """调整监听套接字
+
+    接受的连接继承监听套接字的收发缓冲，在这里设置才能在握手时通告足够的窗口扩大因子
+    """
+    if profile.rcvbuf:
+        _setsockopt(sock, socket.SOL_SOCKET, socket.SO_RCVBUF, profile.rcvbuf)
+    if profile.sndbuf:
+        _setsockopt(sock, socket.SOL_SOCKET, socket.SO_SNDBUF, profile.sndbuf)
+
+def tune_connection(sock, profile: SocketProfile):
+    """调整已建立的TCP连接，sock为None（如非TCP传输）时不做处理"""
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    _setsockopt(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY, int(profile.nodelay))
+    tune_listener(sock, profile)
+    # Linux 3.12起支持，其他平台没有这个选项
+    if profile.notsent_lowat and hasattr(socket, 'TCP_NOTSENT_LOWAT'):
+        _setsockopt(sock, socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, profile.notsent_lowat)
+    if not profile.keepalive_idle:
+        return
+    _setsockopt(sock, socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Linux和Windows为TCP_KEEPIDLE，macOS为TCP_KEEPALIVE
+    idle_option = getattr(socket, 'TCP_KEEPIDLE', getattr(socket, 'TCP_KEEPALIVE', None))
+    if idle_option is not None:
+        _setsockopt(sock, socket.IPPROTO_TCP, idle_option, profile.keepalive_idle)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        _setsockopt(sock, socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, profile.keepalive_interval)
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        _setsockopt(sock, socket.IPPROTO_TCP, socket.TCP_KEEPCNT, profile.keepalive_count)
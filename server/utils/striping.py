@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import struct
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 条带帧负载: 8字节会话内序号 + 加密数据；只有序号没有数据表示客户端放弃了这个序号
+STRIPE_HEADER = struct.Struct('!Q')
+
+class StripeSession:
+    """一个客户端会话的多条并行连接，按序号恢复帧的原始顺序"""
+    __slots__ = ('session_id', 'max_buffered', 'next_seq', 'buffered', 'members', 'lock')
+
+    def __init__(self, session_id: bytes, max_buffered: int = 4096):
+        self.session_id = session_id
+        self.max_buffered = max_buffered
+        self.next_seq = 0
+        self.buffered: Dict[int, Tuple[bytes, Any]] = {}
+        self.members: Set[str] = set()
+        # 按push顺序串行处理已就绪的帧
+        self.lock = asyncio.Lock()
+
+    def push(self, seq: int, data: Optional[bytes], writer) -> List[Tuple[int, bytes, Any]]:
+        """加入一帧，返回按序号排好、可以立即处理的帧
+
+        data为None表示客户端放弃了这个序号（发送它的连接已断开），只推进顺序，不返回给调用方；
+        原帧已经到达时以先到的为准
+        """
+        if seq < self.next_seq or seq in self.buffered:
+            if data is not None:
+                logger.warning(f"Dropping duplicate stripe frame {seq}")
+            return []
+        if len(self.buffered) >= self.max_buffered:
+            raise ValueError(f"Stripe reorder buffer overflow (waiting for {self.next_seq})")
+        self.buffered[seq] = (data, writer)
+        ready = []
+        while self.next_seq in self.buffered:
+            data, writer = self.buffered.pop(self.next_seq)
+            if data is not None:
+                ready.append((self.next_seq, data, writer))
+            self.next_seq += 1
+        return ready
+
+class StripeManager:
+    """按握手中的会话ID把多条连接归入同一个条带会话"""
+    def __init__(self):
+        self.sessions: Dict[bytes, StripeSession] = {}
+        self.client_sessions: Dict[str, StripeSession] = {}
+
+    def attach(self, client_id: str, session_id: bytes) -> StripeSession:
+        """把连接加入会话"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = StripeSession(session_id)
+        session.members.add(client_id)
+        self.client_sessions[client_id] = session
+        return session
+
+    def detach(self, client_id: str):
+        """连接断开时移出会话，会话没有成员后释放"""
+        session = self.client_sessions.pop(client_id, None)
+        if session is None:
+            return
+        session.members.discard(client_id)
+        if not session.members:
+            self.sessions.pop(session.session_id, None)
+
+    def get(self, client_id: str) -> Optional[StripeSession]:
+        """获取连接所属的会话"""
+        return self.client_sessions.get(client_id)
@@ -0,0 +1,92 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 文件头: 魔数、版本、记录大小、录制开始的墙上时间(微秒)、记录数，占满一个缓存行
+HEADER = struct.Struct('<4sHHQQ')
+HEADER_SIZE = 64
+COUNT_OFFSET = 16
+MAGIC = b'CYTR'
+VERSION = 1
+
+# 每条记录: 相对录制开始的微秒数、连接序号、帧负载长度、事件、帧类型，不含任何负载内容
+RECORD = struct.Struct('<QIIBBxx')
+
+# 事件类型
+EVENT_OPEN = 0
+EVENT_IN = 1
+EVENT_OUT = 2
+EVENT_CLOSE = 3
+
+class TraceRecorder:
+    """把每条连接的帧大小、方向和时间写入内存映射的二进制轨迹文件，用于离线重放
+
+    记录直接写进预先分配的映射区域，热路径上没有系统调用；写满max_bytes后停止记录。
+    文件头中的记录数随每条记录更新，进程异常退出时已写入的部分仍然可读
+    """
+    def __init__(self, path: Path, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.capacity = max(0, (max_bytes - HEADER_SIZE) // RECORD.size)
+        self.count = 0
+        self.dropped = 0
+        self.connections = 0
+        self._started = time.monotonic()
+        size = HEADER_SIZE + self.capacity * RECORD.size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w+b') as f:
+            f.truncate(size)
+            self._region = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(self._region, 0, MAGIC, VERSION, RECORD.size, int(time.time() * 1e6), 0)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def open_connection(self) -> int:
+        """分配连接序号并记录连接建立"""
+        self.connections += 1
+        self.record(self.connections, EVENT_OPEN)
+        return self.connections
+
+    def record(self, connection: int, event: int, frame_type: int = 0, size: int = 0):
+        if self._region is None:
+            return
+        if self.count >= self.capacity:
+            if not self.dropped:
+                logger.warning(f"Trace file {self.path} is full, recording stopped")
+            self.dropped += 1
+            return
+        elapsed_us = int((time.monotonic() - self._started) * 1e6)
+        RECORD.pack_into(self._region, HEADER_SIZE + self.count * RECORD.size,
+                         elapsed_us, connection, size, event, frame_type)
+        self.count += 1
+        struct.pack_into('<Q', self._region, COUNT_OFFSET, self.count)
+
+    def close(self):
+        """写回并把文件截断到实际记录的长度"""
+        if self._region is None:
+            return
+        self._region.flush()
+        self._region.close()
+        self._region = None
+        os.truncate(self.path, HEADER_SIZE + self.count * RECORD.size)
+        logger.info(f"Trace closed: {self.count} records from {self.connections} connections "
+                    f"({self.dropped} dropped) in {self.path}")
+
+def read_trace(path: Path) -> Iterator[Tuple[float, int, int, int, int]]:
+    """按写入顺序读取轨迹，产出(相对开始的秒数, 连接序号, 事件, 帧类型, 帧负载长度)"""
+    with open(path, 'rb') as f:
+        magic, version, record_size, _, count = HEADER.unpack(f.read(HEADER_SIZE)[:HEADER.size])
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"Not a trace file or incompatible version: {path}")
+        data = f.read(count * RECORD.size)
+    # 只读取完整的记录
+    data = data[:len(data) // RECORD.size * RECORD.size]
+    for elapsed_us, connection, size, event, frame_type in RECORD.iter_unpack(data):
+        yield elapsed_us / 1e6, connection, event, frame_type, size